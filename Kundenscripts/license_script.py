@@ -2,12 +2,29 @@ import os
 import requests
 import string
 from ctypes import windll
+import base64
 import json
+import time
+
+try:
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+except ImportError:
+    Ed25519PublicKey = None
 
 """
 Global url of the management portal which handles REST (POST) requests
 """
-URL = "http://localhost:8000/licenses/license-heartbeat"
+URL = "http://localhost:8000/licenses/v2/license-heartbeat"
+
+"""
+Global url of the management portal which sends the public keys to verify license tokens with
+"""
+KEYS_URL = "http://localhost:8000/licenses/v2/license-keys"
+
+"""
+Seconds before the license token expires when the management portal gets contacted again
+"""
+TOKEN_REFRESH = 24 * 60 * 60
 
 def search_files(dir: list, counter: int = 0):
     """
@@ -36,7 +53,7 @@ def search_files(dir: list, counter: int = 0):
         search_files("D:/", counter + 1)
 
     PARAMS = read_data(str(os.path.abspath(root)), abspath_config)
-    requests.post(url=URL, data=PARAMS)
+    check(PARAMS)
 
 def read_data(dir: str, abspath_config: str) -> dict:
     """
@@ -70,10 +87,34 @@ def direct_request(dir: str):
     Parameters:
     dir (str): directory to get data from
     """
-    PARAMS   = read_data(dir, "config.txt")
-    response = requests.post(url= URL, data= PARAMS)
-    save     = overwrite(response.json())
-    requests.post(url="http://localhost:8000/licenses/license-heartbeat/save", data=save)
+    PARAMS = read_data(dir, "config.txt")
+    check(PARAMS)
+
+def check(PARAMS: dict):
+    """
+    Sends a single request to the license heartbeat API.
+    It acknowledges a license switched to during the previous check and
+    replaces the license key in the config file if a new license exists.
+    The acknowledgement is dropped once it was accepted or the response doesn't ask for it anymore,
+    so a rejected one isn't sent again with every check.
+
+    Parameters:
+    PARAMS (dict): data with the license key
+    """
+    if not read_ack() and token_valid(PARAMS.get("key", "").strip()):
+        return
+
+    PARAMS["location"] = read_location()
+    PARAMS["ack"]      = read_ack()
+
+    response = requests.post(url=URL, data=PARAMS).json()
+    if PARAMS["ack"] and (response.get("acknowledged") or not response.get("exist") or response.get("ack", "") != PARAMS["ack"]):
+        write_ack("")
+    write_token(response.get("token", ""))
+
+    save = overwrite(response)
+    if save["new_exists"]:
+        write_ack(response["ack"])
 
 def get_drives() -> list:
     """
@@ -122,8 +163,9 @@ def overwrite(license: dict) -> dict:
     overwrite = False
     old       = ""
     new       = ""
+    location  = read_location()
 
-    if license["exist"] == True:
+    if license.get("exist") == True:
         try:
             config = open("./config.txt", "r")
             old    = config.read()
@@ -141,9 +183,143 @@ def overwrite(license: dict) -> dict:
     data = {
         "old"       : old,
         "new"       : new,
-        "new_exists": overwrite
+        "new_exists": overwrite,
+        "location"  : location,
     }
 
     return data
 
+def read_location() -> str:
+    """
+    Reads the id of the customer's location from 'location.txt' if it exists.
+    It lets the management portal count every location only once when a customer license gets replaced.
+
+    Returns:
+    str: location id
+    """
+    try:
+        location_file = open("./location.txt", "r")
+        location      = location_file.read().strip()
+        location_file.close()
+    except FileNotFoundError:
+        location = ""
+
+    return location
+
+def read_ack() -> str:
+    """
+    Reads the acknowledgement token of the previous check from 'ack.txt' if it exists.
+
+    Returns:
+    str: acknowledgement token
+    """
+    try:
+        ack_file = open("./ack.txt", "r")
+        ack      = ack_file.read().strip()
+        ack_file.close()
+    except FileNotFoundError:
+        ack = ""
+
+    return ack
+
+def write_ack(ack: str):
+    """
+    Saves the acknowledgement token to send it with the next check.
+    Pass an empty token after the management portal received the acknowledgement.
+
+    Parameters:
+    ack (str): acknowledgement token
+    """
+    ack_file = open("./ack.txt", "w")
+    ack_file.write(ack)
+    ack_file.close()
+
+def decode(data: str) -> bytes:
+    """
+    Decodes data encoded as base64 for URLs without padding.
+
+    Parameters:
+    data (str): data to decode
+
+    Returns:
+    bytes: decoded data
+    """
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+def token_valid(key: str) -> bool:
+    """
+    Verifies the license token of the previous check offline.
+    The token is only accepted if it is signed with Ed25519 by the management portal, belongs to the license key
+    and doesn't expire within the next day. Otherwise the management portal has to be contacted.
+
+    Parameters:
+    key (str): license key
+
+    Returns:
+    bool: if the token is valid
+    """
+    if not Ed25519PublicKey:
+        return False
+
+    try:
+        token_file = open("./token.txt", "r")
+        token      = token_file.read().strip()
+        token_file.close()
+
+        header, payload, signature = token.split(".")
+        kid     = json.loads(decode(header))["kid"]
+        public  = read_public_keys(kid)
+        if not public:
+            return False
+
+        # raises an exception if the signature is invalid
+        Ed25519PublicKey.from_public_bytes(base64.b64decode(public)).verify(
+            decode(signature),
+            (header + "." + payload).encode(),
+        )
+        payload = json.loads(decode(payload))
+    except Exception:
+        return False
+
+    return payload["key"] == key and payload["exp"] - TOKEN_REFRESH > time.time()
+
+def read_public_keys(kid: str) -> str:
+    """
+    Returns the public key with the given id from 'keys.json'.
+    If the key is unknown the public keys get loaded from the management portal.
+
+    Parameters:
+    kid (str): key id
+
+    Returns:
+    str: public key, empty if not found
+    """
+    try:
+        keys_file = open("./keys.json", "r")
+        keys      = json.load(keys_file)
+        keys_file.close()
+    except (FileNotFoundError, ValueError):
+        keys = {}
+
+    if kid not in keys:
+        response = requests.get(url=KEYS_URL).json()
+        keys     = {key["kid"]: key["public"] for key in response.get("keys", []) if key["algorithm"] == "EdDSA"}
+
+        keys_file = open("./keys.json", "w")
+        json.dump(keys, keys_file)
+        keys_file.close()
+
+    return keys.get(kid, "")
+
+def write_token(token: str):
+    """
+    Saves the license token to verify the license offline with the next checks.
+
+    Parameters:
+    token (str): license token
+    """
+    token_file = open("./token.txt", "w")
+    token_file.write(token)
+    token_file.close()
+
 execute()
@@ -6,6 +6,7 @@ customer_models = [
     models.Location,
     models.Person,
     models.ContactPerson,
+    models.Postcode,
 ]
 
 admin.site.register(customer_models)
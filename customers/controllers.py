@@ -1,8 +1,28 @@
-from .models import Customer, Location, ContactPerson, Person
-from licenses.models import CustomerLicense, UsedSoftwareProduct
-from itertools import chain
-from management_portal.constants import LIMIT
-from management_portal.general import Status, SaveStatus
+from .models import Customer, CustomerStats, Location, ContactPerson, Person, Postcode
+from heartbeat.models import Heartbeat
+from licenses.controllers import LicenseController, LicenseEventController, UsedSoftwareProductController
+from licenses.models import CustomerLicense, License, LocationLicense, UsedSoftwareProduct
+from datetime import datetime, timezone
+from django.core.cache import cache
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Prefetch, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from management_portal.constants import (
+    LIMIT, DATE_TYPE, DATETIME_TYPE, HEARTBEAT_DURATION, LICENSE_EXPIRE_WARNING, CUSTOMER_INDEX_CACHE_KEY, CUSTOMER_INDEX_CACHE_TIMEOUT, CUSTOMER_TREE_CACHE_TIMEOUT,
+    CUSTOMER_IMPORT_COLUMNS, CUSTOMER_IMPORT_BATCH_SIZE, CUSTOMER_PURGE_BATCH_SIZE, SEARCH_LIMIT, CONTACT_SEARCH_NGRAM_SIZE, CONTACT_SEARCH_WORD_SIZE,
+    CUSTOMER_STATS_BATCH_SIZE, POSTCODE_PREFIX_LENGTH, POSTCODE_IMPORT_BATCH_SIZE, NEARBY_RADIUS, EARTH_RADIUS,
+)
+from management_portal.general import Match, PurgeState, Status, SaveStatus
+import csv
+import hashlib
+import io
+import json
+import logging
+import math
+import re
+import unicodedata
+
+logger = logging.getLogger(__name__)
 
 class CustomerController:
     """
@@ -23,6 +43,226 @@ class CustomerController:
         """
         return Customer.objects.get(id = id)
     
+    @staticmethod
+    def get_customer_detail(id: int):
+        """
+        Returns a customer for a given id with everything shown on the customer page.
+        The locations with their contact persons (and their products), licenses and used products (with the latest heartbeat)
+        and the customer licenses are prefetched, so the amount of queries does not depend on the amount of locations.
+
+        Parameters:
+        id (int): id of the customer
+
+        Returns:
+        Customer: customer with 'locations' and 'customer_licenses' prefetched, each location with 'persons', 'licenses' and 'products'
+        """
+        licenses          = LocationLicense.objects.select_related('module__product').order_by('end_date')
+        latest_heartbeats = Heartbeat.objects.filter(used_product = OuterRef('pk')).order_by('-last_received')
+        used_products     = UsedSoftwareProduct.objects.select_related('product').annotate(
+            heartbeat_received = Subquery(latest_heartbeats.values('last_received')[:1]),
+            heartbeat_detail   = Subquery(latest_heartbeats.values('detail')[:1]),
+        ).order_by('product__name')
+
+        customer = Customer.objects.select_related('stats').prefetch_related(
+            Prefetch('locations', queryset = Location.objects.order_by('name')),
+            Prefetch('locations__contact_persons', queryset = ContactPerson.objects.prefetch_related('product'), to_attr = 'persons'),
+            Prefetch('locations__location_licenses', queryset = licenses, to_attr = 'licenses'),
+            Prefetch('locations__used_products', queryset = used_products, to_attr = 'products'),
+            Prefetch('customer_licenses', queryset = CustomerLicense.objects.select_related('module__product').order_by('end_date')),
+        ).get(id = id)
+
+        current_date = datetime.now(timezone.utc)
+        for location in customer.locations.all():
+            for used_product in location.products:
+                if not used_product.heartbeat_received:
+                    used_product.last_received = 'Noch nie'
+                    used_product.valid         = 0
+                    continue
+
+                used_product.last_received = used_product.heartbeat_received.strftime(DATETIME_TYPE)
+                if current_date - used_product.heartbeat_received > HEARTBEAT_DURATION:
+                    used_product.valid = 0
+                elif len(used_product.heartbeat_detail):
+                    used_product.valid = -1
+                else:
+                    used_product.valid = 1
+
+        return customer
+
+    @staticmethod
+    def get_tree(id: int) -> dict:
+        """
+        Returns a customer with its locations, contact persons, licenses and used products with heartbeat status as dictionary.
+        It is loaded by 'get_customer_detail', so the amount of queries does not depend on the amount of locations.
+
+        Parameters:
+        id (int): id of the customer
+
+        Returns:
+        dict: customer tree and the date when the first heartbeat status changes by time as 'valid_until'
+        """
+        customer    = CustomerController.get_customer_detail(id = id)
+        valid_until = None
+
+        def serialize_license(license) -> dict:
+            return {
+                'id'             : license.id,
+                'key'            : license.key,
+                'product'        : license.module.product.name,
+                'module'         : license.module.name,
+                'start_date'     : license.start_date.strftime(DATE_TYPE),
+                'end_date'       : license.end_date.strftime(DATE_TYPE),
+                'replace_license': license.replace_license_id,
+            }
+
+        locations = []
+        for location in customer.locations.all():
+            used_products = []
+            for used_product in location.products:
+                if used_product.valid:
+                    expires     = used_product.heartbeat_received + HEARTBEAT_DURATION
+                    valid_until = min(valid_until, expires) if valid_until else expires
+                used_products.append({
+                    'id'           : used_product.id,
+                    'product'      : used_product.product.name,
+                    'version'      : used_product.version,
+                    'last_version' : used_product.product.version,
+                    'last_received': used_product.heartbeat_received.strftime(DATETIME_TYPE) if used_product.heartbeat_received else None,
+                    'detail'       : used_product.heartbeat_detail,
+                    'valid'        : used_product.valid,
+                })
+
+            locations.append({
+                'id'             : location.id,
+                'name'           : location.name,
+                'email_address'  : location.email_address,
+                'phone_number'   : location.phone_number,
+                'street'         : location.street,
+                'house_number'   : location.house_number,
+                'postcode'       : location.postcode,
+                'city'           : location.city,
+                'contact_persons': [{
+                    'id'           : person.id,
+                    'first_name'   : person.first_name,
+                    'last_name'    : person.last_name,
+                    'email_address': person.email_address,
+                    'phone_number' : person.phone_number,
+                    'products'     : [product.name for product in person.product.all()],
+                } for person in location.persons],
+                'licenses'       : [serialize_license(license) for license in location.licenses],
+                'used_products'  : used_products,
+            })
+
+        return {
+            'customer'   : {
+                'id'             : customer.id,
+                'customer_number': customer.customer_number,
+                'name'           : customer.name,
+                'revision'       : customer.revision,
+                'licenses'       : [serialize_license(license) for license in customer.customer_licenses.all()],
+                'locations'      : locations,
+            },
+            'valid_until': valid_until,
+        }
+
+    @staticmethod
+    def get_tree_response(id: int, fields: str = ''):
+        """
+        Returns the customer tree encoded as JSON and its ETag.
+        The response is cached for the current revision of the customer, so it is outdated after any change of the customer.
+        With 'fields' only the given fields are returned, e.g. 'name,locations.name,locations.used_products'.
+
+        Parameters:
+        id     (int): id of the customer
+        fields (str): comma separated fields, nested fields separated by dots
+
+        Returns:
+        dict: JSON body and ETag of the customer tree or None if the customer does not exist
+        """
+        revision = Customer.objects.filter(id = id).values_list('revision', flat = True).first()
+        if revision is None:
+            return None
+
+        fields    = ','.join(sorted(field.strip() for field in fields.split(',') if field.strip()))
+        cache_key = 'customer_tree_' + str(id) + '_' + str(revision) + '_' + hashlib.md5(fields.encode()).hexdigest()
+        response  = cache.get(cache_key)
+        if response is None:
+            tree     = CustomerController.get_tree(id = id)
+            body     = json.dumps(CustomerController.__select_fields(tree['customer'], CustomerController.__parse_fields(fields)))
+            response = {
+                'body': body,
+                'etag': '"' + hashlib.md5(body.encode()).hexdigest() + '"',
+            }
+            timeout  = CUSTOMER_TREE_CACHE_TIMEOUT
+            if tree['valid_until']:
+                timeout = min(timeout, tree['valid_until'] - datetime.now(timezone.utc))
+            cache.set(cache_key, response, max(timeout.total_seconds(), 1))
+
+        return response
+
+    @staticmethod
+    def increment_revision(customer: int = 0, location: int = 0, used_product: int = 0):
+        """
+        Increments the revision of a customer by its id or the id of one of its locations or used products.
+        This outdates the cached customer tree.
+
+        Parameters:
+        customer     (int): id of the customer
+        location     (int): id of a location of the customer
+        used_product (int): id of a used product of the customer
+        """
+        if customer:
+            customers = Customer.objects.filter(id = customer)
+        elif location:
+            customers = Customer.objects.filter(location = location)
+        elif used_product:
+            customers = Customer.objects.filter(location__used_product = used_product)
+        else:
+            return
+
+        customers.update(revision = F('revision') + 1)
+
+    @staticmethod
+    def __parse_fields(fields: str) -> dict:
+        """
+        Parses comma separated fields with nested fields separated by dots into a tree of dictionaries.
+
+        Parameters:
+        fields (str): e.g. 'name,locations.name'
+
+        Returns:
+        dict: e.g. {'name': {}, 'locations': {'name': {}}}, empty for all fields
+        """
+        tree = {}
+        for field in fields.split(','):
+            node = tree
+            for name in field.split('.'):
+                if name:
+                    node = node.setdefault(name, {})
+
+        return tree
+
+    @staticmethod
+    def __select_fields(value, fields: dict):
+        """
+        Returns only the selected fields of a dictionary or of each dictionary in a list.
+
+        Parameters:
+        value  (dict|list): dictionary, list of dictionaries or plain value
+        fields (dict)     : selected fields as parsed by '__parse_fields', empty for all fields
+
+        Returns:
+        dict|list: value with the selected fields
+        """
+        if not fields:
+            return value
+        if isinstance(value, list):
+            return [CustomerController.__select_fields(item, fields) for item in value]
+        if isinstance(value, dict):
+            return {name: CustomerController.__select_fields(item, fields[name]) for name, item in value.items() if name in fields}
+
+        return value
+
     @staticmethod
     def get_customer_by_customer_number(customer_number: str):
         """
@@ -50,47 +290,141 @@ class CustomerController:
         return list(Customer.objects.all()[:limit].values('id', 'name'))
 
     @staticmethod
-    def get_filtered_customers(word: str, contains: bool = False) -> list:
+    def get_filtered_customers(word: str, contains: bool = False, limit: int = SEARCH_LIMIT) -> list:
         """
         Returns the filtered customers, filtering by customer number and name.
         Pass a word to filter. You can choose to filter "contains" or "is".
+        The customers are ranked: Exact matches first, then matches at the beginning, then the others.
 
         Parameters:
         word     (str) : word to filter by
         contains (bool): if contains or is
+        limit    (int) : Maximum number of objects to load (default: 100)
 
         Returns:
-        list: filtered customers
+        list: filtered customers in the shape of 'get_search_result'
         """
         if contains:
-            customers_by_number = Customer.objects.filter(customer_number__icontains = word).values('id', 'customer_number', 'name')
-            customers_by_name   = Customer.objects.filter(name__icontains = word).values('id', 'customer_number', 'name')
+            customers = Customer.objects.filter(Q(customer_number__icontains = word) | Q(name__icontains = word))
         else:
-            customers_by_number = Customer.objects.filter(customer_number__iexact = word).values('id', 'customer_number', 'name')
-            customers_by_name   = Customer.objects.filter(name__iexact = word).values('id', 'customer_number', 'name')
+            customers = Customer.objects.filter(Q(customer_number__iexact = word) | Q(name__iexact = word))
+
+        customers = customers.annotate(rank = Case(
+            When(Q(customer_number__iexact = word) | Q(name__iexact = word), then = Value(0)),
+            When(Q(customer_number__istartswith = word) | Q(name__istartswith = word), then = Value(1)),
+            default      = Value(2),
+            output_field = IntegerField(),
+        )).order_by('rank', 'name')[:limit]
+
+        return [
+            CustomerController.get_search_result(
+                id              = id,
+                name            = name,
+                customer_id     = id,
+                customer_number = customer_number,
+                customer        = name,
+            ) for id, name, customer_number in customers.values_list('id', 'name', 'customer_number')
+        ]
 
-        return list(chain(customers_by_name, customers_by_number))
+    @staticmethod
+    def get_search_result(id: int, name: str, customer_id: int, customer_number: str, customer: str,
+        postcode: str = '', city: str = '') -> dict:
+        """
+        Returns a customer or location search result, so both have the same shape.
+
+        Parameters:
+        id              (int): id of the customer or location
+        name            (str): name of the customer or location
+        customer_id     (int): id of the customer (of the location)
+        customer_number (str): customer number of the customer (of the location)
+        customer        (str): name of the customer (of the location)
+        postcode        (str): postcode of the location
+        city            (str): city of the location
+
+        Returns:
+        dict: search result
+        """
+        return {
+            'id'             : id,
+            'customer_id'    : customer_id,
+            'name'           : name,
+            'customer_number': customer_number,
+            'customer'       : customer,
+            'postcode'       : postcode,
+            'city'           : city,
+        }
 
     @staticmethod
-    def get_customers_for_each_letter() -> list:
+    def get_customers_for_each_letter(use_cache: bool = True) -> list:
         """
         Get customers for each letter as list of dictionaries.
+        All customers are loaded with their counts by one query and sorted into the letters by their first character, ignoring case and accents ('Ä' belongs to 'A').
+        Names starting with a digit are listed under '0-9', names starting with any other character under '#'.
+        The result is cached until a customer is saved or deleted.
+
+        Parameters:
+        use_cache (bool): if the cached result should be used
 
         Returns:
         list: customers for each letter
         """
-        customer_list = []
-        for i in range(65, 91):
-            char = chr(i)
-            customers = list(Customer.objects.filter(name__istartswith = char).values('id', 'name'))
-            obj = {
-                'letter'    : char,
-                'customers' : customers,
-            }
-            customer_list.append(obj)
-        
+        customer_list = cache.get(CUSTOMER_INDEX_CACHE_KEY) if use_cache else None
+        if customer_list is None:
+            letters   = {chr(i): [] for i in range(65, 91)}
+            digits    = []
+            others    = []
+            customers = sorted(
+                ((CustomerController.get_sort_name(customer['name']), customer) for customer in Customer.objects.values(
+                    'id', 'customer_number', 'name',
+                    locations          = F('stats__locations'),
+                    licenses           = F('stats__licenses'),
+                    expiring           = F('stats__expiring'),
+                    missing_heartbeats = F('stats__missing_heartbeats'),
+                )),
+                key = lambda item: item[0],
+            )
+            for sort_name, customer in customers:
+                letter = sort_name[:1].upper()
+                if letter in letters:
+                    letters[letter].append(customer)
+                elif letter.isdigit():
+                    digits.append(customer)
+                else:
+                    others.append(customer)
+
+            customer_list = [{'letter': letter, 'customers': customers} for letter, customers in letters.items()]
+            if digits:
+                customer_list.insert(0, {'letter': '0-9', 'customers': digits})
+            if others:
+                customer_list.append({'letter': '#', 'customers': others})
+
+            if use_cache:
+                cache.set(CUSTOMER_INDEX_CACHE_KEY, customer_list, CUSTOMER_INDEX_CACHE_TIMEOUT.total_seconds())
+
         return customer_list
-    
+
+    @staticmethod
+    def get_sort_name(name: str) -> str:
+        """
+        Returns the name of a customer as it is sorted: Without surplus spaces, case and accents.
+
+        Parameters:
+        name (str): name of the customer
+
+        Returns:
+        str: sort name
+        """
+        name = unicodedata.normalize('NFKD', ' '.join(name.split()).casefold())
+
+        return ''.join(char for char in name if not unicodedata.combining(char))
+
+    @staticmethod
+    def invalidate_customers_for_each_letter():
+        """
+        Removes the cached customers for each letter.
+        """
+        cache.delete(CUSTOMER_INDEX_CACHE_KEY)
+
     @staticmethod
     def get_customer_by_location_id(location_id: int):
         """
@@ -136,21 +470,14 @@ class CustomerController:
         Returns:
         Status: save status
         """
-        status = Status()
-        if not len(customer_number):
-            status.message = 'Bitte Kundennummer angeben.'
-        elif len(customer_number) > 32:
-            status.message = 'Kundennummer darf nur maximal 32 Zeichen lang sein.'
-        elif not len(name):
-            status.message = 'Bitte Name angeben.'
-        elif len(name) > 64:
-            status.message = 'Name darf nur maximal 64 Zeichen lang sein.'
-        else:
-            customers = CustomerController.read()
+        status = Status(False, CustomerController.get_validation_message(customer_number = customer_number, name = name))
+        if not status.message:
+            customers = Customer.all_objects.filter(customer_number = customer_number).exclude(id = id or 0)
             for customer in customers:
-                if customer_number == customer.customer_number and not id == str(customer.id):
+                if customer.deleted:
+                    status.message = 'Diese Kundennummer gehört zu einem Kunden, der gerade gelöscht wird.'
+                else:
                     status.message = 'Diese Kundennummer wird bereits verwendet.'
-                    break
 
             if not len(status.message):
                 if id:
@@ -167,6 +494,30 @@ class CustomerController:
 
         return status
 
+    @staticmethod
+    def get_validation_message(customer_number: str, name: str) -> str:
+        """
+        Checks the completeness and length of customer data to save.
+
+        Parameters:
+        customer_number (str): customer number
+        name            (str): customer name
+
+        Returns:
+        str: error message, empty if valid
+        """
+        message = ''
+        if not len(customer_number):
+            message = 'Bitte Kundennummer angeben.'
+        elif len(customer_number) > 32:
+            message = 'Kundennummer darf nur maximal 32 Zeichen lang sein.'
+        elif not len(name):
+            message = 'Bitte Name angeben.'
+        elif len(name) > 64:
+            message = 'Name darf nur maximal 64 Zeichen lang sein.'
+
+        return message
+
     @staticmethod
     def create(customer_number: str, name: str) -> Status:
         """
@@ -219,6 +570,8 @@ class CustomerController:
     def delete(id: int) -> Status:
         """
         Deletes a customer with the given id.
+        The customer is only marked as deleted and hidden immediately.
+        Its locations, contact persons, licenses, used products and heartbeats are purged in batches by 'purge_deleted'.
 
         Parameters:
         id (int): customer id of the customer to delete
@@ -228,15 +581,92 @@ class CustomerController:
         """
         status = Status(False, 'Der zu löschende Kunde wurde nicht gefunden.')
         try:
-            customer        = Customer.objects.get(id = id)
-            customer.delete()
-            status.status   = True
-            status.message  = 'Der Kunde "' + customer.name + '" wurde erfolgreich gelöscht.'
+            customer              = Customer.objects.get(id = id)
+            customer.deleted      = datetime.now(timezone.utc)
+            customer.delete_total = sum(queryset.count() for queryset in CustomerController.__get_purge_querysets(customer.id))
+            customer.save()
+            LicenseController.invalidate_customer_licenses(customer = customer.id)
+            status.status         = True
+            status.message        = 'Der Kunde "' + customer.name + '" wird gelöscht.'
         except:
             pass
         
         return status
 
+    @staticmethod
+    def purge_deleted(batch_size: int = CUSTOMER_PURGE_BATCH_SIZE) -> int:
+        """
+        Purges the deleted customers: First the heartbeats, then the used products, licenses, contact persons and locations and at last the customer.
+        Every batch is deleted in its own transaction, so the tables are never locked for long.
+        The receivers keeping caches, counts and revisions up to date skip the purged objects, the deleted licenses are recorded in bulk.
+
+        Parameters:
+        batch_size (int): amount of objects to delete per transaction
+
+        Returns:
+        int: amount of purged customers
+        """
+        count = 0
+        for customer in Customer.all_objects.filter(deleted__isnull = False).order_by('deleted').values_list('id', flat = True):
+            with PurgeState.purging():
+                for queryset in CustomerController.__get_purge_querysets(customer):
+                    while True:
+                        ids = list(queryset.values_list('id', flat = True)[:batch_size])
+                        if not ids:
+                            break
+                        with transaction.atomic():
+                            if queryset.model is License:
+                                LicenseEventController.record_purged(
+                                    customer = customer,
+                                    licenses = list(License.objects.filter(id__in = ids).values('id', 'key', 'end_date')),
+                                )
+                            queryset.model.objects.filter(id__in = ids).delete()
+
+                Customer.all_objects.filter(id = customer).delete()
+            count += 1
+
+        return count
+
+    @staticmethod
+    def get_delete_progress() -> list:
+        """
+        Returns the deleted customers which are not purged yet and how far the purge has progressed.
+
+        Returns:
+        list: id, name and progress in percent of the deleted customers
+        """
+        progress = []
+        for customer in Customer.all_objects.filter(deleted__isnull = False).order_by('deleted').values('id', 'name', 'delete_total'):
+            remaining = sum(queryset.count() for queryset in CustomerController.__get_purge_querysets(customer['id']))
+            progress.append({
+                'id'      : customer['id'],
+                'name'    : customer['name'],
+                'progress': 100 - int(100 * remaining / customer['delete_total']) if customer['delete_total'] else 100,
+            })
+
+        return progress
+
+    @staticmethod
+    def __get_purge_querysets(customer: int) -> list:
+        """
+        Returns the querysets of everything belonging to a customer in the order it gets purged.
+
+        Parameters:
+        customer (int): id of the customer
+
+        Returns:
+        list: querysets of heartbeats, used products, licenses, contact persons and locations
+        """
+        return [
+            Heartbeat.objects.filter(used_product__location__customer_id = customer),
+            UsedSoftwareProduct.objects.filter(location__customer_id = customer),
+            License.objects.filter(
+                Q(customerlicense__customer_id = customer) | Q(locationlicense__location__customer_id = customer),
+            ),
+            ContactPerson.objects.filter(location__customer_id = customer),
+            Location.objects.filter(customer_id = customer),
+        ]
+
 
 class LocationController:
     """
@@ -244,15 +674,6 @@ class LocationController:
     This includes things like read, save and delete functions which can be called from the view.
     """
 
-    @staticmethod
-    def get_locations_by_customer(customer_id: int, limit: int = LIMIT) -> list:
-        locations = Location.objects.filter(customer_id = customer_id)
-
-        for location in locations:
-            location.persons = ContactPerson.objects.filter(location_id = location.id)
-
-        return locations
-
     @staticmethod
     def get_location_names(limit: int = LIMIT) -> list:
         """
@@ -264,32 +685,202 @@ class LocationController:
         Returns:
         list: location names
         """
-        return list(Location.objects.all()[:limit].values('id', 'name'))
+        return list(Location.objects.filter(customer__deleted__isnull = True)[:limit].values('id', 'name'))
 
     @staticmethod
-    def get_locations_by_name(word: str, contains: bool = False) -> list:
+    def get_locations_by_name(word: str, contains: bool = False, limit: int = SEARCH_LIMIT) -> list:
         """
-        Returns the filtered locations, filtering by name.
-        Pass a word to filter. You can choose to filter "contains" or "is".
+        Returns the filtered locations, filtering by name, postcode and city.
+        Pass a word to filter. You can choose to filter "contains" or "is", postcode and city are filtered by their beginning for "contains".
+        The locations are ranked: Exact name matches first, then names starting with the word, then other names, then postcode and city matches.
+        The customer is loaded by a join.
 
         Parameters:
         word     (str) : word to filter by
         contains (bool): if contains or is
+        limit    (int) : Maximum number of objects to load (default: 100)
 
         Returns:
-        list: filtered locations
+        list: filtered locations in the shape of 'CustomerController.get_search_result'
         """
         if contains:
-            locations = Location.objects.filter(name__icontains = word).values('id', 'name', 'postcode', 'city', 'customer_id')
+            name_filter = Q(name__icontains = word)
+            locations   = Location.objects.filter(name_filter | Q(postcode__startswith = word) | Q(city__istartswith = word))
         else:
-            locations = Location.objects.filter(name__iexact = word).values('id', 'name', 'postcode', 'city', 'customer_id')
-        
-        for location in locations:
-            customer             = Customer.objects.get(id = location['customer_id'])
-            location['customer'] = customer.name
-
-        return list(locations)
+            name_filter = Q(name__iexact = word)
+            locations   = Location.objects.filter(name_filter | Q(postcode = word) | Q(city__iexact = word))
+
+        locations = locations.filter(customer__deleted__isnull = True).annotate(rank = Case(
+            When(name__iexact = word, then = Value(0)),
+            When(name__istartswith = word, then = Value(1)),
+            When(name_filter, then = Value(2)),
+            default      = Value(3),
+            output_field = IntegerField(),
+        )).order_by('rank', 'name')[:limit]
+
+        return [
+            CustomerController.get_search_result(
+                id              = id,
+                name            = name,
+                customer_id     = customer_id,
+                customer_number = customer_number,
+                customer        = customer,
+                postcode        = postcode,
+                city            = city,
+            ) for id, name, customer_id, customer_number, customer, postcode, city in locations.values_list(
+                'id', 'name', 'customer_id', 'customer__customer_number', 'customer__name', 'postcode', 'city',
+            )
+        ]
     
+    @staticmethod
+    def get_locations_nearby(postcode: str, radius: int = NEARBY_RADIUS, missing_heartbeats: bool = False, limit: int = SEARCH_LIMIT) -> dict:
+        """
+        Returns the locations within a radius around the position of a postcode, the nearest first.
+        The position is looked up in the postcode table. Only locations in the bounding box of the circle are loaded by the index of their position,
+        the corners of the box are removed by the exact distance afterwards.
+        With a radius of 0 the locations in the region of the postcode are returned instead, which are found by the postcode prefix.
+
+        Parameters:
+        postcode           (str) : postcode of the center
+        radius             (int) : radius in kilometres, 0 for the region of the postcode
+        missing_heartbeats (bool): if only locations with used products without a recent heartbeat should be returned
+        limit              (int) : Maximum number of locations to return (default: 100)
+
+        Returns:
+        dict: status, message and locations in the shape of 'CustomerController.get_search_result' with distance and missing heartbeats
+        """
+        normalized = LocationController.get_normalized_postcode(postcode)
+        if not normalized:
+            return {'status': False, 'message': 'Bitte Postleitzahl (PLZ) angeben.', 'locations': []}
+        center     = Postcode.objects.filter(postcode = normalized).values_list('latitude', 'longitude').first()
+        if radius and not center:
+            return {'status': False, 'message': 'Die Postleitzahl (PLZ) wurde nicht in der PLZ-Tabelle gefunden.', 'locations': []}
+
+        locations = Location.objects.filter(customer__deleted__isnull = True)
+        if radius:
+            latitude, longitude = center
+            delta_latitude      = math.degrees(radius / EARTH_RADIUS)
+            delta_longitude     = math.degrees(radius / (EARTH_RADIUS * max(math.cos(math.radians(latitude)), 0.01)))
+            locations           = locations.filter(
+                latitude__range  = (latitude - delta_latitude, latitude + delta_latitude),
+                longitude__range = (longitude - delta_longitude, longitude + delta_longitude),
+            )
+        else:
+            locations = locations.filter(postcode_prefix = normalized[:POSTCODE_PREFIX_LENGTH]).order_by('postcode', 'name')
+
+        results = []
+        for location in locations.values('id', 'name', 'customer_id', 'customer__customer_number', 'customer__name', 'postcode', 'city', 'latitude', 'longitude'):
+            distance = None
+            if center and location['latitude'] is not None:
+                distance = LocationController.get_distance(center[0], center[1], location['latitude'], location['longitude'])
+            if radius and distance > radius:
+                continue
+            result = CustomerController.get_search_result(
+                id              = location['id'],
+                name            = location['name'],
+                customer_id     = location['customer_id'],
+                customer_number = location['customer__customer_number'],
+                customer        = location['customer__name'],
+                postcode        = location['postcode'],
+                city            = location['city'],
+            )
+            result['distance'] = round(distance, 1) if distance is not None else None
+            results.append(result)
+
+        counts = LocationController.__get_missing_heartbeats([result['id'] for result in results])
+        for result in results:
+            result['missing_heartbeats'] = counts.get(result['id'], 0)
+        if missing_heartbeats:
+            results = [result for result in results if result['missing_heartbeats']]
+        if radius:
+            results.sort(key = lambda result: result['distance'])
+
+        return {'status': True, 'message': '', 'locations': results[:limit]}
+
+    @staticmethod
+    def get_distance(latitude: float, longitude: float, other_latitude: float, other_longitude: float) -> float:
+        """
+        Returns the great-circle distance between two positions.
+
+        Parameters:
+        latitude        (float): latitude of the first position
+        longitude       (float): longitude of the first position
+        other_latitude  (float): latitude of the second position
+        other_longitude (float): longitude of the second position
+
+        Returns:
+        float: distance in kilometres
+        """
+        latitude, longitude, other_latitude, other_longitude = map(math.radians, (latitude, longitude, other_latitude, other_longitude))
+        value = math.sin((other_latitude - latitude) / 2) ** 2 \
+            + math.cos(latitude) * math.cos(other_latitude) * math.sin((other_longitude - longitude) / 2) ** 2
+
+        return 2 * EARTH_RADIUS * math.asin(min(1, math.sqrt(value)))
+
+    @staticmethod
+    def get_normalized_postcode(postcode: str) -> str:
+        """
+        Normalizes a postcode: A country prefix like "D-" is removed, the rest is uppercased without spaces and separators.
+
+        Parameters:
+        postcode (str): postcode to normalize
+
+        Returns:
+        str: normalized postcode
+        """
+        postcode = re.sub(r'^[A-Za-z]{1,3}-', '', (postcode or '').strip())
+
+        return re.sub(r'[^0-9A-Z]', '', postcode.upper())
+
+    @staticmethod
+    def set_geo_positions(locations: list) -> list:
+        """
+        Sets the postcode prefix and the position of locations by their postcode, without saving them.
+        The positions are looked up in the postcode table by one query, locations with an unknown postcode get no position.
+
+        Parameters:
+        locations (list): locations to update
+
+        Returns:
+        list: updated locations
+        """
+        postcodes = [(location, LocationController.get_normalized_postcode(location.postcode)) for location in locations]
+        positions = {
+            postcode: (latitude, longitude)
+            for postcode, latitude, longitude in Postcode.objects.filter(
+                postcode__in = {postcode for location, postcode in postcodes},
+            ).values_list('postcode', 'latitude', 'longitude')
+        }
+        for location, postcode in postcodes:
+            location.postcode_prefix              = postcode[:POSTCODE_PREFIX_LENGTH]
+            location.latitude, location.longitude = positions.get(postcode, (None, None))
+
+        return locations
+
+    @staticmethod
+    def __get_missing_heartbeats(locations: list) -> dict:
+        """
+        Counts the used products without a recent heartbeat of locations.
+
+        Parameters:
+        locations (list): ids of the locations
+
+        Returns:
+        dict: amount of used products without a recent heartbeat per location id
+        """
+        current_date      = datetime.now(timezone.utc)
+        latest_heartbeats = Heartbeat.objects.filter(used_product = OuterRef('pk')).order_by('-last_received')
+        used_products     = UsedSoftwareProduct.objects.filter(location_id__in = locations).annotate(
+            heartbeat_received = Subquery(latest_heartbeats.values('last_received')[:1]),
+        ).values_list('location_id', 'heartbeat_received')
+
+        counts = {}
+        for location, heartbeat_received in used_products:
+            if not heartbeat_received or current_date - heartbeat_received > HEARTBEAT_DURATION:
+                counts[location] = counts.get(location, 0) + 1
+
+        return counts
+
     @staticmethod
     def get_location_by_id(id: int) -> list:
         """
@@ -397,10 +988,7 @@ class LocationController:
                 customer      = customer,
             )
             location.save()
-            up_status = LocationController.__create_used_products(
-                customer = customer,
-                location = location,
-            )
+            up_status = UsedSoftwareProductController.reconcile(customer = customer.id)
         except:
             status.set_unexpected()
 
@@ -470,10 +1058,10 @@ class LocationController:
         return status
 
     @staticmethod
-    def __check_validity(name: str, email_address: str, phone_number: str, street: str,
-        house_number: str, postcode: str, city: str, customer: int) -> SaveStatus:
+    def get_validation_message(name: str, email_address: str, phone_number: str, street: str,
+        house_number: str, postcode: str, city: str) -> str:
         """
-        Checks the completeness and validity of location data to save.
+        Checks the completeness and length of location data to save.
 
         Parameters:
         name          (str): location name
@@ -483,80 +1071,85 @@ class LocationController:
         house_number  (str): house number of the location's address
         postcode      (str): postcode of the location's address
         city          (str): city of the location's address
-        customer      (int): id for the customer the location belongs to
 
         Returns:
-        save_status: save status
+        str: error message, empty if valid
         """
-        instances = {
-            'customer': customer,
-        }
-        status = SaveStatus(instances = instances)
-
+        message = ''
         if not len(name):
-            status.message = 'Bitte Namen angeben.'
+            message = 'Bitte Namen angeben.'
         elif len(name) > 64:
-            status.message = 'Name darf nur maximal 64 Zeichen enthalten.'
+            message = 'Name darf nur maximal 64 Zeichen enthalten.'
         elif not len(email_address):
-            status.message = 'Bitte E-Mail-Adresse angeben.'
+            message = 'Bitte E-Mail-Adresse angeben.'
         elif len(email_address) > 64:
-            status.message = 'E-Mail-Adresse darf nur maximal 64 Zeichen enthalten.'
+            message = 'E-Mail-Adresse darf nur maximal 64 Zeichen enthalten.'
         elif not len(phone_number):
-            status.message = 'Bitte Telefonnummer angeben.'
+            message = 'Bitte Telefonnummer angeben.'
         elif len(phone_number) > 64:
-            status.message = 'Telefonnummer darf nur maximal 64 Zeichen enthalten.'
+            message = 'Telefonnummer darf nur maximal 64 Zeichen enthalten.'
         elif not len(street):
-            status.message = 'Bitte Straße angeben.'
+            message = 'Bitte Straße angeben.'
         elif len(street) > 64:
-            status.message = 'Straße darf nur maximal 64 Zeichen enthalten.'
+            message = 'Straße darf nur maximal 64 Zeichen enthalten.'
         elif not len(house_number):
-            status.message = 'Bitte Hausnummer angeben.'
+            message = 'Bitte Hausnummer angeben.'
         elif len(house_number) > 8:
-            status.message = 'Hausnummer darf nur maximal 8 Zeichen enthalten.'
+            message = 'Hausnummer darf nur maximal 8 Zeichen enthalten.'
         elif not len(postcode):
-            status.message = 'Bitte Postleitzahl (PLZ) angeben.'
+            message = 'Bitte Postleitzahl (PLZ) angeben.'
         elif len(postcode) > 16:
-            status.message = 'Postleitzahl (PLZ) darf nur maximal 16 Zeichen enthalten.'
+            message = 'Postleitzahl (PLZ) darf nur maximal 16 Zeichen enthalten.'
         elif not len(city):
-            status.message = 'Bitte Ort angeben.'
+            message = 'Bitte Ort angeben.'
         elif len(city) > 64:
-            status.message = 'Ort darf nur maximal 64 Zeichen enthalten.'
-        elif not customer:
-            status.message = 'Bitte Kunden zuweisen.'
-        else:
-            try:
-                status.instances['customer'] = Customer.objects.get(id = customer)
-                status.status                = True
-            except:
-                status.message = 'Zugewiesenes Modul nicht gefunden.'
+            message = 'Ort darf nur maximal 64 Zeichen enthalten.'
 
-        return status
+        return message
 
     @staticmethod
-    def __create_used_products(customer, location) -> Status:
+    def __check_validity(name: str, email_address: str, phone_number: str, street: str,
+        house_number: str, postcode: str, city: str, customer: int) -> SaveStatus:
         """
-        Creates used products for given location if the given customer has customer licenses.
+        Checks the completeness and validity of location data to save.
 
         Parameters:
-        customer (Customer): customer to check licenses for
-        location (Location): location to create used products for
+        name          (str): location name
+        email_address (str): email address of the location
+        phone_number  (str): phone number of the location
+        street        (str): street of the location's address
+        house_number  (str): house number of the location's address
+        postcode      (str): postcode of the location's address
+        city          (str): city of the location's address
+        customer      (int): id for the customer the location belongs to
 
         Returns:
-        Status: create status
+        save_status: save status
         """
-        status = Status(True)
-        try:
-            licenses = CustomerLicense.objects.filter(customer = customer)
-            for license in licenses:
-                used_product = UsedSoftwareProduct(
-                    location = location,
-                    product  = license.module.product,
-                    version  = license.module.product.version,
-                )
-                used_product.save()
-        except:
-            status.status = False
-        
+        instances = {
+            'customer': customer,
+        }
+        status = SaveStatus(instances = instances)
+
+        status.message = LocationController.get_validation_message(
+            name          = name,
+            email_address = email_address,
+            phone_number  = phone_number,
+            street        = street,
+            house_number  = house_number,
+            postcode      = postcode,
+            city          = city,
+        )
+        if not status.message:
+            if not customer:
+                status.message = 'Bitte Kunden zuweisen.'
+            else:
+                try:
+                    status.instances['customer'] = Customer.objects.get(id = customer)
+                    status.status                = True
+                except:
+                    status.message = 'Zugewiesenes Modul nicht gefunden.'
+
         return status
 
 
@@ -599,11 +1192,41 @@ class ContactPersonController:
         contact_persons = ContactPerson.objects.filter(location__id = location_id).values('id', 'first_name', 'last_name', 'email_address', 'phone_number')
         return list(contact_persons)
 
+    @staticmethod
+    def get_responsible_contacts(used_products: list) -> dict:
+        """
+        Returns the contact persons responsible for used products: The contact persons of the used product's location with its product assigned.
+        All used products are answered by one query, which joins the contact persons' products with the used products of their location.
+
+        Parameters:
+        used_products (list): ids of the used products
+
+        Returns:
+        dict: contact persons per used product id
+        """
+        contact_persons = ContactPerson.objects.filter(
+            location__used_product__in = used_products,
+            product                    = F('location__used_product__product'),
+        ).order_by('last_name', 'first_name').values(
+            'location__used_product', 'id', 'first_name', 'last_name', 'email_address', 'phone_number',
+        )
+
+        contacts = {}
+        for contact_person in contact_persons:
+            contacts.setdefault(contact_person.pop('location__used_product'), []).append(contact_person)
+
+        return contacts
+
     @staticmethod
     def get_contact_persons_by_name(word: str, contains: bool = False) -> list:
         """
         Returns the filtered contact persons, filtering by first name and last name.
         Pass a word to filter. You can choose to filter "contains" or "is".
+        Every part of the word has to be found in the full name, in any order and ignoring case and accents.
+        The contact persons are filtered by their 'search_name' in a single query.
+        The FULLTEXT index of MySQL uses the ngram parser, which finds the parts anywhere in the name, so both ways are served by it.
+        MariaDB has no ngram parser, its index of whole words only serves "is", "contains" scans the contact persons.
+        The found contact persons are checked by the exact parts, which also covers parts too short for the index.
 
         Parameters:
         word     (str) : word to filter by
@@ -612,64 +1235,44 @@ class ContactPersonController:
         Returns:
         list: filtered contact persons
         """
-        words = word.split(' ')
-
-        if contains:
-            if len(words) == 2:
-                contacts_one = ContactPerson.objects.filter(first_name__icontains = words[0], last_name__icontains = words[1]).values(
-                    'id', 'first_name', 'last_name', 'location__name', 'location__customer__name', 'location__customer__id', 'product__name',
-                )
-                contacts_two = ContactPerson.objects.filter(first_name__icontains = words[1], last_name__icontains = words[0]).values(
-                    'id', 'first_name', 'last_name', 'location__name', 'location__customer__name', 'location__customer__id', 'product__name',
-                )
-                contacts     = list(chain(contacts_one, contacts_two))
-            elif len(words) == 3:
-                contacts_one = ContactPerson.objects.filter(first_name__icontains = words[0] + words[1], last_name__icontains = words[2]).values(
-                    'id', 'first_name', 'last_name', 'location__name', 'location__customer__name', 'location__customer__id', 'product__name',
-                )
-                contacts_two = ContactPerson.objects.filter(first_name__icontains = words[1] + words[2], last_name__icontains = words[0]).values(
-                    'id', 'first_name', 'last_name', 'location__name', 'location__customer__name', 'location__customer__id', 'product__name',
-                )
-                contacts     = list(chain(contacts_one, contacts_two))
-            else:
-                contacts_by_first_name = ContactPerson.objects.filter(first_name__icontains = word).values(
-                    'id', 'first_name', 'last_name', 'location__name', 'location__customer__name', 'location__customer__id', 'product__name',
-                )
-                contacts_by_last_name  = ContactPerson.objects.filter(last_name__icontains  = word).values(
-                    'id', 'first_name', 'last_name', 'location__name', 'location__customer__name', 'location__customer__id', 'product__name',
-                )
-                contacts               = list(chain(contacts_by_first_name, contacts_by_last_name))
-        else:
-            if len(words) == 2:
-                contacts_one = ContactPerson.objects.filter(first_name__iexact = words[0], last_name__iexact = words[1]).values(
-                    'id', 'first_name', 'last_name', 'location__name', 'location__customer__name', 'location__customer__id', 'product__name',
-                )
-                contacts_two = ContactPerson.objects.filter(first_name__iexact = words[1], last_name__iexact = words[0]).values(
-                    'id', 'first_name', 'last_name', 'location__name', 'location__customer__name', 'location__customer__id', 'product__name',
-                )
-                contacts     = list(chain(contacts_one, contacts_two))
-            elif len(words) == 3:
-                contacts_one = ContactPerson.objects.filter(first_name__iexact = words[0] + words[1], last_name__iexact = words[2]).values(
-                    'id', 'first_name', 'last_name', 'location__name', 'location__customer__name', 'location__customer__id', 'product__name',
-                )
-                contacts_two = ContactPerson.objects.filter(first_name__iexact = words[1] + words[2], last_name__iexact = words[0]).values(
-                    'id', 'first_name', 'last_name', 'location__name', 'location__customer__name', 'location__customer__id', 'product__name',
-                )
-                contacts     = list(chain(contacts_one, contacts_two))
+        contacts = ContactPerson.objects.filter(location__customer__deleted__isnull = True)
+        parts    = CustomerController.get_sort_name(word).split(' ')
+        if connection.vendor == 'mysql' and not (contains and connection.mysql_is_mariadb):
+            size   = CONTACT_SEARCH_WORD_SIZE if connection.mysql_is_mariadb else CONTACT_SEARCH_NGRAM_SIZE
+            search = ' '.join('+"' + part + '"' for part in parts if len(part) >= size and re.fullmatch(r'\w+', part))
+            if search:
+                contacts = contacts.filter(Match(F('search_name'), Value(search)))
+        for part in parts:
+            if contains:
+                contacts = contacts.filter(search_name__contains = part)
             else:
-                contacts_by_first_name = ContactPerson.objects.filter(first_name__iexact = word).values(
-                    'id', 'first_name', 'last_name', 'location__name', 'location__customer__name', 'location__customer__id', 'product__name',
-                )
-                contacts_by_last_name  = ContactPerson.objects.filter(last_name__iexact  = word).values(
-                    'id', 'first_name', 'last_name', 'location__name', 'location__customer__name', 'location__customer__id', 'product__name',
-                )
-                contacts               = list(chain(contacts_by_first_name, contacts_by_last_name))
+                contacts = contacts.filter(search_name__contains = ' ' + part + ' ')
 
+        contacts = list(contacts.values(
+            'id', 'first_name', 'last_name', 'location__name', 'location__customer__name', 'location__customer__id', 'product__name',
+        ))
         for contact in contacts:
             if not contact['product__name']:
                 contact['product__name'] = 'Nicht zugewiesen'
 
-        return list(contacts)
+        return contacts
+
+    @staticmethod
+    def get_search_name(first_name: str, last_name: str) -> str:
+        """
+        Returns the full name of a contact person in both orders, lowercased and without accents, to search by.
+
+        Parameters:
+        first_name (str): contact person first name
+        last_name  (str): contact person last name
+
+        Returns:
+        str: search name, e.g. ' max mustermann | mustermann max '
+        """
+        first_name = CustomerController.get_sort_name(first_name)
+        last_name  = CustomerController.get_sort_name(last_name)
+
+        return (' ' + first_name + ' ' + last_name + ' | ' + last_name + ' ' + first_name + ' ')[:263]
 
     @staticmethod
     def save(first_name: str, last_name: str, email_address: str, phone_number: str, location: int, id: int = 0) -> Status:
@@ -800,40 +1403,510 @@ class ContactPersonController:
         return status
 
     @staticmethod
-    def __check_validity(first_name: str, last_name: str, email_address: str, phone_number: str, location: int) -> Status:
+    def get_validation_message(first_name: str, last_name: str, email_address: str, phone_number: str) -> str:
         """
-        Saves a location's contact person.
+        Checks the completeness and length of contact person data to save.
 
         Parameters:
-        first_name    (str)     : contact person first name
-        last_name     (str)     : contact person last name
-        email_address (str)     : email address of the contact person
-        phone_number  (str)     : phone number of the contact person
-        location      (Location): belonging location
+        first_name    (str): contact person first name
+        last_name     (str): contact person last name
+        email_address (str): email address of the contact person
+        phone_number  (str): phone number of the contact person
 
         Returns:
-        Status: status
+        str: error message, empty if valid
         """
-        status = Status()
+        message = ''
         if not len(first_name):
-            status.message = 'Bitte Vornamen angeben.'
+            message = 'Bitte Vornamen angeben.'
         elif not len(last_name):
-            status.message = 'Bitte Nachnamen angeben.'
+            message = 'Bitte Nachnamen angeben.'
         elif not len(email_address):
-            status.message = 'Bitte E-Mail-Adresse angeben.'
+            message = 'Bitte E-Mail-Adresse angeben.'
         elif not len(phone_number):
-            status.message = 'Bitte Telefonnummer angeben.'
+            message = 'Bitte Telefonnummer angeben.'
         elif len(first_name) > 64:
-            status.message = 'Vorname darf maximal 64 Zeichen lang sein.'
+            message = 'Vorname darf maximal 64 Zeichen lang sein.'
         elif len(last_name) > 64:
-            status.message = 'Nachname darf maximal 64 Zeichen lang sein.'
+            message = 'Nachname darf maximal 64 Zeichen lang sein.'
         elif len(email_address) > 64:
-            status.message = 'E-Mail-Adresse darf maximal 64 Zeichen lang sein.'
+            message = 'E-Mail-Adresse darf maximal 64 Zeichen lang sein.'
         elif len(phone_number) > 64:
-            status.message = 'Telefonnummer darf maximal 64 Zeichen lang sein.'
-        elif not location:
-            status.message = 'Bitte Standort zuweisen.'
-        else:
-            status.status = True
+            message = 'Telefonnummer darf maximal 64 Zeichen lang sein.'
+
+        return message
+
+    @staticmethod
+    def __check_validity(first_name: str, last_name: str, email_address: str, phone_number: str, location: int) -> Status:
+        """
+        Saves a location's contact person.
+
+        Parameters:
+        first_name    (str)     : contact person first name
+        last_name     (str)     : contact person last name
+        email_address (str)     : email address of the contact person
+        phone_number  (str)     : phone number of the contact person
+        location      (Location): belonging location
+
+        Returns:
+        Status: status
+        """
+        status = Status(False, ContactPersonController.get_validation_message(
+            first_name    = first_name,
+            last_name     = last_name,
+            email_address = email_address,
+            phone_number  = phone_number,
+        ))
+        if not status.message:
+            if not location:
+                status.message = 'Bitte Standort zuweisen.'
+            else:
+                status.status = True
 
         return status
+
+
+class CustomerImportController:
+    """
+    The 'CustomerImportController' imports customers, locations and contact persons from CSV or JSON files.
+    Every row contains a customer and optionally a location of the customer and a contact person of the location.
+    """
+
+    @staticmethod
+    def read_rows(file, filename: str = '') -> list:
+        """
+        Reads the rows of an uploaded CSV (separated by semicolons) or JSON file (list of objects) as dictionaries.
+
+        Parameters:
+        file     (File): uploaded file
+        filename (str) : name of the file, JSON if it ends with '.json'
+
+        Returns:
+        list: rows as dictionaries with the keys of CUSTOMER_IMPORT_COLUMNS
+        """
+        if filename.lower().endswith('.json'):
+            rows = json.load(io.TextIOWrapper(file, encoding = 'utf-8-sig'))
+        else:
+            rows = csv.DictReader(io.TextIOWrapper(file, encoding = 'utf-8-sig'), delimiter = ';')
+
+        return [{column: str(row.get(column) or '').strip() for column in CUSTOMER_IMPORT_COLUMNS} for row in rows]
+
+    @staticmethod
+    def run(rows: list, batch_size: int = CUSTOMER_IMPORT_BATCH_SIZE) -> dict:
+        """
+        Imports customers, locations and contact persons.
+        All rows are validated in memory against the existing customer numbers, customer names and locations, which are loaded once.
+        Rows with errors are skipped, the others are inserted in chunks: first the customers, then the locations, then the contact persons.
+        Locations are identified by customer and name, contact persons by location and name or email address.
+        Existing customers, locations and contact persons are reused.
+        If saving fails, nothing is imported and the message names the chunk or row which failed.
+        After that the used software products of existing customers with new locations are reconciled with their customer licenses.
+
+        Parameters:
+        rows       (list): rows as returned by 'read_rows'
+        batch_size (int) : amount of objects to insert per query
+
+        Returns:
+        dict: status, amount of created customers, locations and contact persons and the error message per row number
+        """
+        numbers            = {row['customer_number'] for row in rows}
+        existing_customers = dict(Customer.objects.filter(customer_number__in = numbers).values_list('customer_number', 'name'))
+        deleted_customers  = set(Customer.all_objects.filter(customer_number__in = numbers, deleted__isnull = False).values_list('customer_number', flat = True))
+        existing_locations = {
+            (location['customer__customer_number'], location['name'].lower()): location['id']
+            for location in Location.objects.filter(customer__customer_number__in = numbers).values('id', 'name', 'customer__customer_number')
+        }
+        location_keys      = {id: location_key for location_key, id in existing_locations.items()}
+        existing_persons   = set()
+        for person in ContactPerson.objects.filter(location_id__in = location_keys).values('location_id', 'search_name', 'email_address'):
+            existing_persons.update(CustomerImportController.__get_person_keys(
+                location_key  = location_keys[person['location_id']],
+                search_name   = person['search_name'],
+                email_address = person['email_address'],
+            ))
+
+        customers = {}
+        locations = {}
+        persons   = []
+        errors    = []
+        for number, row in enumerate(rows, start = 1):
+            message = CustomerImportController.__check_row(row, existing_customers, customers)
+            if not message and row['customer_number'] in deleted_customers:
+                message = 'Diese Kundennummer gehört zu einem Kunden, der gerade gelöscht wird.'
+            if message:
+                errors.append({'row': number, 'message': message})
+                continue
+
+            if row['customer_number'] not in existing_customers and row['customer_number'] not in customers:
+                customers[row['customer_number']] = row['customer_name']
+
+            location_key = (row['customer_number'], row['location_name'].lower())
+            if row['location_name'] and location_key not in existing_locations and location_key not in locations:
+                locations[location_key] = Location(
+                    name          = row['location_name'],
+                    email_address = row['location_email_address'],
+                    phone_number  = row['location_phone_number'],
+                    street        = row['street'],
+                    house_number  = row['house_number'],
+                    postcode      = row['postcode'],
+                    city          = row['city'],
+                )
+
+            # contact persons already existing at the location are matched by name or email address, so a re-import doesn't duplicate them
+            person_keys = CustomerImportController.__get_person_keys(
+                location_key  = location_key,
+                search_name   = ContactPersonController.get_search_name(first_name = row['first_name'], last_name = row['last_name']),
+                email_address = row['contact_email_address'],
+            )
+            if (row['first_name'] or row['last_name']) and not person_keys & existing_persons:
+                existing_persons.update(person_keys)
+                persons.append((number, location_key, ContactPerson(
+                    first_name    = row['first_name'],
+                    last_name     = row['last_name'],
+                    email_address = row['contact_email_address'],
+                    phone_number  = row['contact_phone_number'],
+                )))
+
+        status = Status(True, 'Der Import wurde erfolgreich abgeschlossen.')
+        step   = ''
+        try:
+            with transaction.atomic():
+                new_customers = [Customer(customer_number = customer_number, name = name) for customer_number, name in customers.items()]
+                for start in range(0, len(new_customers), batch_size):
+                    step = 'der Kunden ' + str(start + 1) + ' bis ' + str(min(start + batch_size, len(new_customers)))
+                    Customer.objects.bulk_create(new_customers[start:start + batch_size])
+                customer_ids = dict(Customer.objects.filter(customer_number__in = numbers).values_list('customer_number', 'id'))
+
+                for (customer_number, name), location in locations.items():
+                    location.customer_id = customer_ids[customer_number]
+                new_locations = list(locations.values())
+                LocationController.set_geo_positions(new_locations)
+                for start in range(0, len(new_locations), batch_size):
+                    step = 'der Standorte ' + str(start + 1) + ' bis ' + str(min(start + batch_size, len(new_locations)))
+                    Location.objects.bulk_create(new_locations[start:start + batch_size])
+                location_ids = dict(existing_locations)
+                for location in Location.objects.filter(customer_id__in = customer_ids.values()).exclude(
+                    id__in = existing_locations.values(),
+                ).values('id', 'name', 'customer__customer_number'):
+                    location_ids[(location['customer__customer_number'], location['name'].lower())] = location['id']
+
+                # Contact persons inherit from persons, which Django can't insert in bulk. They are saved one by one instead.
+                for number, location_key, person in persons:
+                    step               = 'des Ansprechpartners aus Zeile ' + str(number)
+                    person.location_id = location_ids[location_key]
+                    person.save()
+
+                step          = 'der Softwareprodukte'
+                new_customers = {customer_ids[customer_number] for customer_number in customers}
+                touched       = {customer_ids[customer_number] for customer_number, name in locations} - new_customers
+                Customer.objects.filter(id__in = touched).update(revision = F('revision') + 1)
+                reconcile_status = UsedSoftwareProductController.reconcile_customers(customers = touched)
+                if reconcile_status.status:
+                    step = 'der Kundenstatistik'
+                    CustomerStatsController.update(customers = touched | new_customers)
+                else:
+                    transaction.set_rollback(True)
+                    status.set_unexpected(reconcile_status.message)
+        except DatabaseError:
+            logger.exception('Customer import failed while saving %s.', step)
+            status.set_unexpected('Der Import ist beim Speichern ' + step + ' fehlgeschlagen. Es wurde nichts importiert.')
+
+        if not status.status:
+            customers, locations, persons = {}, {}, []
+
+        if customers:
+            CustomerController.invalidate_customers_for_each_letter()
+        if errors and status.status:
+            status.message = 'Der Import wurde mit Fehlern abgeschlossen. Fehlerhafte Zeilen wurden übersprungen.'
+
+        return {
+            'status'         : status.status,
+            'message'        : status.message,
+            'customers'      : len(customers),
+            'locations'      : len(locations),
+            'contact_persons': len(persons),
+            'errors'         : errors,
+        }
+
+    @staticmethod
+    def __get_person_keys(location_key: tuple, search_name: str, email_address: str) -> set:
+        """
+        Returns the keys a contact person of a location is matched by: the normalized name and, if given, the email address.
+
+        Parameters:
+        location_key  (tuple): customer number and lowercased name of the location
+        search_name   (str)  : search name of the contact person
+        email_address (str)  : email address of the contact person
+
+        Returns:
+        set: keys of the contact person
+        """
+        keys = {(location_key, 'name', search_name)}
+        if email_address:
+            keys.add((location_key, 'email', email_address.strip().lower()))
+
+        return keys
+
+    @staticmethod
+    def __check_row(row: dict, existing_customers: dict, customers: dict) -> str:
+        """
+        Checks the completeness and validity of an import row.
+
+        Parameters:
+        row                (dict): row to check
+        existing_customers (dict): names of the existing customers by customer number
+        customers          (dict): names of the customers to create by customer number
+
+        Returns:
+        str: error message, empty if valid
+        """
+        message = CustomerController.get_validation_message(customer_number = row['customer_number'], name = row['customer_name'])
+        if message:
+            return message
+
+        name = existing_customers.get(row['customer_number'], customers.get(row['customer_number'], row['customer_name']))
+        if name != row['customer_name']:
+            return 'Die Kundennummer ' + row['customer_number'] + ' gehört zum Kunden "' + name + '".'
+
+        if row['location_name']:
+            message = LocationController.get_validation_message(
+                name          = row['location_name'],
+                email_address = row['location_email_address'],
+                phone_number  = row['location_phone_number'],
+                street        = row['street'],
+                house_number  = row['house_number'],
+                postcode      = row['postcode'],
+                city          = row['city'],
+            )
+        if not message and (row['first_name'] or row['last_name']):
+            if not row['location_name']:
+                message = 'Bitte Standort zuweisen.'
+            else:
+                message = ContactPersonController.get_validation_message(
+                    first_name    = row['first_name'],
+                    last_name     = row['last_name'],
+                    email_address = row['contact_email_address'],
+                    phone_number  = row['contact_phone_number'],
+                )
+
+        return message
+
+
+class CustomerStatsController:
+    """
+    The 'CustomerStatsController' manages the precomputed counts of the customers.
+    """
+
+    @staticmethod
+    def update(customers: list = None, batch_size: int = CUSTOMER_STATS_BATCH_SIZE) -> int:
+        """
+        Recomputes the amount of locations, current licenses, expiring licenses and missing heartbeats of customers.
+        Only changed counts are saved. Because the counts are shown in the customer list, its cache is removed if anything changed.
+
+        Parameters:
+        customers  (list): ids of the customers to update, all customers if not given
+        batch_size (int) : amount of counts to save per query
+
+        Returns:
+        int: amount of customers with changed counts
+        """
+        current_date = datetime.now(timezone.utc)
+        warning_date = current_date + LICENSE_EXPIRE_WARNING
+        active       = Customer.objects.all()
+        if customers is not None:
+            active = active.filter(id__in = customers)
+        counts       = {id: {'locations': 0, 'licenses': 0, 'expiring': 0, 'missing_heartbeats': 0} for id in active.values_list('id', flat = True)}
+        if not counts:
+            return 0
+
+        locations = Location.objects.filter(customer__in = active).values('customer_id').annotate(count = Count('id'))
+        for location in locations:
+            counts[location['customer_id']]['locations'] = location['count']
+
+        licenses = License.objects.filter(replace_license__isnull = True).annotate(
+            owner = Coalesce('customerlicense__customer_id', 'locationlicense__location__customer_id'),
+        ).filter(owner__in = active.values('id')).values('owner').annotate(
+            count    = Count('id', distinct = True),
+            expiring = Count('id', distinct = True, filter = Q(license__isnull = True, end_date__gt = current_date, end_date__lte = warning_date)),
+        )
+        for license in licenses:
+            counts[license['owner']]['licenses'] = license['count']
+            counts[license['owner']]['expiring'] = license['expiring']
+
+        latest_heartbeats = Heartbeat.objects.filter(used_product = OuterRef('pk')).order_by('-last_received')
+        used_products     = UsedSoftwareProduct.objects.filter(location__customer__in = active).annotate(
+            heartbeat_received = Subquery(latest_heartbeats.values('last_received')[:1]),
+        ).values_list('location__customer_id', 'heartbeat_received')
+        for customer, heartbeat_received in used_products:
+            if not heartbeat_received or current_date - heartbeat_received > HEARTBEAT_DURATION:
+                counts[customer]['missing_heartbeats'] += 1
+
+        existing = {stats.customer_id: stats for stats in CustomerStats.objects.filter(customer_id__in = counts.keys())}
+        changed  = []
+        created  = []
+        for customer, values in counts.items():
+            stats = existing.get(customer)
+            if not stats:
+                created.append(CustomerStats(customer_id = customer, updated = current_date, **values))
+            elif any(getattr(stats, field) != value for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(stats, field, value)
+                stats.updated = current_date
+                changed.append(stats)
+
+        CustomerStats.objects.bulk_create(created, batch_size = batch_size)
+        CustomerStats.objects.bulk_update(changed, fields = ['locations', 'licenses', 'expiring', 'missing_heartbeats', 'updated'], batch_size = batch_size)
+        if created or changed:
+            CustomerController.invalidate_customers_for_each_letter()
+
+        return len(created) + len(changed)
+
+
+    @staticmethod
+    def add(customer: int = 0, location: int = 0, used_product: int = 0, locations: int = 0, licenses: int = 0, missing_heartbeats: int = 0):
+        """
+        Adds changed amounts to the counts of a customer by its id or the id of one of its locations or used products.
+        Expiring licenses and heartbeats getting missing change by time, so they are left to the periodic recomputation by 'update'.
+
+        Parameters:
+        customer           (int): id of the customer
+        location           (int): id of a location of the customer
+        used_product       (int): id of a used product of the customer
+        locations          (int): change of the amount of locations
+        licenses           (int): change of the amount of current licenses
+        missing_heartbeats (int): change of the amount of used products without a recent heartbeat
+        """
+        if not locations and not licenses and not missing_heartbeats:
+            return
+        if customer:
+            stats = CustomerStats.objects.filter(customer_id = customer)
+        elif location:
+            stats = CustomerStats.objects.filter(customer__location = location)
+        elif used_product:
+            stats = CustomerStats.objects.filter(customer__location__used_product = used_product)
+        else:
+            return
+
+        if stats.update(
+            locations          = F('locations') + locations,
+            licenses           = F('licenses') + licenses,
+            missing_heartbeats = F('missing_heartbeats') + missing_heartbeats,
+        ):
+            CustomerController.invalidate_customers_for_each_letter()
+
+    @staticmethod
+    def is_heartbeat_missing(used_product: int, exclude: int = 0) -> bool:
+        """
+        Returns if a used product has no heartbeat received within HEARTBEAT_DURATION.
+
+        Parameters:
+        used_product (int): id of the used product
+        exclude      (int): id of a heartbeat to ignore, e.g. the one just received
+
+        Returns:
+        bool: if the heartbeat is missing
+        """
+        heartbeats = Heartbeat.objects.filter(
+            used_product_id    = used_product,
+            last_received__gte = datetime.now(timezone.utc) - HEARTBEAT_DURATION,
+        )
+
+        return not heartbeats.exclude(id = exclude).exists()
+
+
+class PostcodeController:
+    """
+    The 'PostcodeController' manages the offline postcode table, which is used to look up the positions of locations.
+    """
+
+    @staticmethod
+    def read_rows(file) -> list:
+        """
+        Reads the rows of a postcode file.
+        It is a CSV file separated by semicolons or commas with the columns 'postcode', 'city', 'latitude' and 'longitude' in the header.
+
+        Parameters:
+        file (file): uploaded or opened file
+
+        Returns:
+        list: rows as dicts
+        """
+        content = file.read()
+        if isinstance(content, bytes):
+            content = content.decode('utf-8-sig')
+        delimiter = ';' if content.split('\n', 1)[0].count(';') else ','
+
+        return list(csv.DictReader(io.StringIO(content), delimiter = delimiter))
+
+    @staticmethod
+    def run(rows: list, batch_size: int = POSTCODE_IMPORT_BATCH_SIZE) -> dict:
+        """
+        Replaces the postcode table by the given rows and updates the positions of all locations.
+        Rows with an empty postcode or invalid coordinates are skipped, a postcode given twice is imported once.
+
+        Parameters:
+        rows       (list): rows as returned by 'read_rows'
+        batch_size (int) : amount of objects to insert or update per query
+
+        Returns:
+        dict: amount of imported postcodes, skipped rows and updated locations
+        """
+        postcodes = {}
+        skipped   = 0
+        for row in rows:
+            postcode = LocationController.get_normalized_postcode(row.get('postcode'))
+            try:
+                latitude  = float(row.get('latitude', '').replace(',', '.'))
+                longitude = float(row.get('longitude', '').replace(',', '.'))
+            except:
+                latitude = longitude = None
+            if not postcode or latitude is None or not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+                skipped += 1
+                continue
+            postcodes[postcode] = Postcode(
+                postcode  = postcode,
+                city      = (row.get('city') or '')[:64],
+                latitude  = latitude,
+                longitude = longitude,
+            )
+
+        with transaction.atomic():
+            Postcode.objects.all().delete()
+            Postcode.objects.bulk_create(postcodes.values(), batch_size = batch_size)
+
+        return {
+            'postcodes': len(postcodes),
+            'skipped'  : skipped,
+            'locations': PostcodeController.update_locations(batch_size = batch_size),
+        }
+
+    @staticmethod
+    def update_locations(batch_size: int = POSTCODE_IMPORT_BATCH_SIZE) -> int:
+        """
+        Updates the postcode prefix and the position of all locations by their postcode.
+        Only changed locations are saved.
+
+        Parameters:
+        batch_size (int): amount of locations to load and save per query
+
+        Returns:
+        int: amount of updated locations
+        """
+        count     = 0
+        locations = Location.objects.only('id', 'postcode', 'postcode_prefix', 'latitude', 'longitude').order_by('id')
+        last_id   = 0
+        while True:
+            batch = list(locations.filter(id__gt = last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            before  = {location.id: (location.postcode_prefix, location.latitude, location.longitude) for location in batch}
+            changed = [
+                location for location in LocationController.set_geo_positions(batch)
+                if before[location.id] != (location.postcode_prefix, location.latitude, location.longitude)
+            ]
+            Location.objects.bulk_update(changed, fields = ['postcode_prefix', 'latitude', 'longitude'])
+            count  += len(changed)
+
+        return count
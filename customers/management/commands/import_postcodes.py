@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from customers.controllers import PostcodeController
+from management_portal.constants import POSTCODE_IMPORT_BATCH_SIZE
+
+class Command(BaseCommand):
+    """
+    Replaces the offline postcode table by a CSV file and updates the positions of all locations.
+    The file needs the columns 'postcode', 'city', 'latitude' and 'longitude', separated by semicolons or commas.
+    """
+    help = 'Imports the postcode table from a CSV file and updates the positions of all locations.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help = 'CSV file with the columns postcode, city, latitude and longitude')
+        parser.add_argument(
+            '--batch-size',
+            type    = int,
+            default = POSTCODE_IMPORT_BATCH_SIZE,
+            help    = 'Amount of postcodes and locations to save per query',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['file'], encoding = 'utf-8-sig') as file:
+                rows = PostcodeController.read_rows(file)
+        except OSError as error:
+            raise CommandError('Die Datei konnte nicht gelesen werden: {}'.format(error))
+
+        result = PostcodeController.run(rows, batch_size = options['batch_size'])
+        self.stdout.write('{} Postleitzahlen wurden importiert, {} Zeilen übersprungen und {} Standorte aktualisiert.'.format(
+            result['postcodes'], result['skipped'], result['locations'],
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from customers.controllers import CustomerController
+from management_portal.constants import CUSTOMER_PURGE_BATCH_SIZE
+
+class Command(BaseCommand):
+    """
+    Purges the deleted customers with their locations, contact persons, licenses, used products and heartbeats.
+    Should be executed periodically, e.g. every few minutes by cron.
+    """
+    help = 'Purges the deleted customers with everything belonging to them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type    = int,
+            default = CUSTOMER_PURGE_BATCH_SIZE,
+            help    = 'Amount of objects to delete per transaction',
+        )
+
+    def handle(self, *args, **options):
+        count = CustomerController.purge_deleted(batch_size = options['batch_size'])
+        self.stdout.write('{} Kunden wurden endgültig gelöscht.'.format(count))
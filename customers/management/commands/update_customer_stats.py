@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from customers.controllers import CustomerStatsController
+from management_portal.constants import CUSTOMER_STATS_BATCH_SIZE
+
+class Command(BaseCommand):
+    """
+    Recomputes the counts of all customers.
+    They change by time (expiring licenses, missing heartbeats) and can drift by bulk changes, so it should be executed periodically, e.g. once an hour by cron.
+    """
+    help = 'Recomputes the counts of all customers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type    = int,
+            default = CUSTOMER_STATS_BATCH_SIZE,
+            help    = 'Amount of counts to save per query',
+        )
+
+    def handle(self, *args, **options):
+        count = CustomerStatsController.update(batch_size = options['batch_size'])
+        self.stdout.write('Die Kennzahlen von {} Kunden wurden aktualisiert.'.format(count))
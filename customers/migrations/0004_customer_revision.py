@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-18 22:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0003_auto_20201215_1118'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='revision',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.1.14 on 2026-10-18 22:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0004_customer_revision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='delete_total',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='deleted',
+            field=models.DateTimeField(db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.1.14 on 2026-10-18 22:32
+
+from django.db import migrations, models
+import unicodedata
+
+
+def normalize(name):
+    name = unicodedata.normalize('NFKD', ' '.join(name.split()).casefold())
+    return ''.join(char for char in name if not unicodedata.combining(char))
+
+
+def fill_search_names(apps, schema_editor):
+    ContactPerson = apps.get_model('customers', 'ContactPerson')
+    for person in ContactPerson.objects.all().iterator():
+        first_name         = normalize(person.first_name)
+        last_name          = normalize(person.last_name)
+        person.search_name = (' ' + first_name + ' ' + last_name + ' | ' + last_name + ' ' + first_name + ' ')[:263]
+        person.save(update_fields = ['search_name'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0005_customer_deleted'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contactperson',
+            name='search_name',
+            field=models.CharField(db_index=True, default='', max_length=263),
+        ),
+        migrations.RunPython(fill_search_names, migrations.RunPython.noop),
+    ]
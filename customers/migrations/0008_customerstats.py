@@ -0,0 +1,25 @@
+# Generated by Django 3.1.14 on 2026-10-18 22:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0007_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerStats',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', related_query_name='stats', serialize=False, to='customers.customer')),
+                ('locations', models.IntegerField(default=0)),
+                ('licenses', models.IntegerField(default=0)),
+                ('expiring', models.IntegerField(default=0)),
+                ('missing_heartbeats', models.IntegerField(default=0)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
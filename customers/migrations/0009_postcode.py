@@ -0,0 +1,52 @@
+# Generated by Django 3.1.14 on 2026-10-18 22:37
+
+from django.db import migrations, models
+import re
+
+
+def fill_postcode_prefixes(apps, schema_editor):
+    Location = apps.get_model('customers', 'Location')
+    for location in Location.objects.all().iterator():
+        postcode                 = re.sub(r'[^0-9A-Z]', '', re.sub(r'^[A-Za-z]{1,3}-', '', location.postcode.strip()).upper())
+        location.postcode_prefix = postcode[:2]
+        location.save(update_fields = ['postcode_prefix'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0008_customerstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Postcode',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('postcode', models.CharField(max_length=16, unique=True)),
+                ('city', models.CharField(max_length=64)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='latitude',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='longitude',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='postcode_prefix',
+            field=models.CharField(db_index=True, default='', max_length=2),
+        ),
+        migrations.AddIndex(
+            model_name='location',
+            index=models.Index(fields=['latitude', 'longitude'], name='customers_l_latitud_043aa8_idx'),
+        ),
+        migrations.RunPython(fill_postcode_prefixes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-18 23:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0009_postcode'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='contactperson',
+            name='search_name',
+            field=models.CharField(default='', max_length=263),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.1.14 on 2026-10-18 23:40
+
+from django.db import migrations
+
+
+def fill_customer_stats(apps, schema_editor):
+    # the counts of existing customers are needed before changes can be added to them, so they are computed once here
+    from customers.controllers import CustomerStatsController
+    CustomerStatsController.update()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0010_contactperson_search_name_no_index'),
+        ('heartbeat', '0002_heartbeat_unknown_location'),
+        ('licenses', '0011_license_status_snapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_customer_stats, migrations.RunPython.noop),
+    ]
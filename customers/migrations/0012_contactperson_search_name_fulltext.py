@@ -0,0 +1,30 @@
+# Generated by Django 3.1.14 on 2026-10-18 23:55
+
+from django.db import migrations
+
+
+def add_fulltext_index(apps, schema_editor):
+    # MySQL's ngram parser finds parts anywhere in the name, MariaDB has none and indexes whole words,
+    # stopwords are disabled because they would exclude every ngram containing them
+    connection = schema_editor.connection
+    if connection.vendor == 'mysql':
+        parser = '' if connection.mysql_is_mariadb else ' WITH PARSER ngram'
+        schema_editor.execute('SET SESSION innodb_ft_enable_stopword = OFF')
+        schema_editor.execute('CREATE FULLTEXT INDEX customers_contactperson_search_name_ft ON customers_contactperson (search_name)' + parser)
+        schema_editor.execute('SET SESSION innodb_ft_enable_stopword = DEFAULT')
+
+
+def remove_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute('DROP INDEX customers_contactperson_search_name_ft ON customers_contactperson')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0011_customerstats_backfill'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_fulltext_index, remove_fulltext_index),
+    ]
@@ -1,33 +1,63 @@
 from django.db import models
 
+class CustomerManager(models.Manager):
+    """
+    The default manager of customers. It hides deleted customers, which are still purged in the background.
+    """
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted__isnull = True)
+
 class Customer(models.Model):
     """
     The model 'Customer' is the owner of locations and has a contract with aubex.
 
     Attributes:
-    customer_number (str): The unique identification number 
-    name            (str): The name of the customer
+    customer_number (str)     : The unique identification number 
+    name            (str)     : The name of the customer
+    revision        (int)     : The counter of changes of the customer and everything belonging to it
+    deleted         (datetime): The date when the customer was deleted, its data is purged in the background
+    delete_total    (int)     : The amount of objects belonging to the customer when it was deleted
     """
     customer_number = models.CharField(max_length = 32, unique = True)
-    name            = models.CharField(max_length = 64)
+    name            = models.CharField(max_length = 64, db_index = True)
+    revision        = models.IntegerField(default = 0)
+    deleted         = models.DateTimeField(null = True, db_index = True)
+    delete_total    = models.IntegerField(default = 0)
+
+    objects         = CustomerManager()
+    all_objects     = models.Manager()
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        """
+        Saves the customer without its revision. The revision is only incremented in the database,
+        so a customer loaded before a change of its locations or licenses doesn't write back an old revision.
+        """
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields if not field.primary_key and field.name != 'revision'
+            ]
+        super().save(*args, **kwargs)
+
 
 class Location(models.Model):
     """
     The model 'Location' is a subsidiary of a customer.
 
     Attributes:
-    name            (str): The name of the location
-    email_address   (str): The email address of the location
-    phone_number    (str): The phone number of the location
-    street          (str): The street where it's located
-    house_number    (str): The house number of the location street
-    postcode        (str): The postal code of the city where it's located
-    city            (str): The city where it's located
-    customer        (int): Foreign key for the customer the location belongs to
+    name            (str)  : The name of the location
+    email_address   (str)  : The email address of the location
+    phone_number    (str)  : The phone number of the location
+    street          (str)  : The street where it's located
+    house_number    (str)  : The house number of the location street
+    postcode        (str)  : The postal code of the city where it's located
+    city            (str)  : The city where it's located
+    customer        (int)  : Foreign key for the customer the location belongs to
+    postcode_prefix (str)  : The first digits of the normalized postcode, the region of the location
+    latitude        (float): The latitude of the postcode, if it is in the postcode table
+    longitude       (float): The longitude of the postcode, if it is in the postcode table
     """
     name            = models.CharField(max_length = 64)
     email_address   = models.CharField(max_length = 64)
@@ -43,6 +73,17 @@ class Location(models.Model):
         related_query_name  = 'location',
         null                = False,
     )
+    postcode_prefix = models.CharField(max_length = 2, default = '', db_index = True)
+    latitude        = models.FloatField(null = True)
+    longitude       = models.FloatField(null = True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields = ['name']),
+            models.Index(fields = ['postcode']),
+            models.Index(fields = ['city']),
+            models.Index(fields = ['latitude', 'longitude']),
+        ]
 
     def __str__(self):
         return self.name
@@ -73,19 +114,65 @@ class ContactPerson(Person):
     He is part of a customer's location and the contact person for aubex.
 
     Attributes:
-    person_ptr (int): The primary key identifier for all persons
-    product    (int): The foreign keys for the products the contact person is responsible for
-    location   (int): The foreign key for the customer's location the contact person is from
+    person_ptr  (int): The primary key identifier for all persons
+    product     (int): The foreign keys for the products the contact person is responsible for
+    location    (int): The foreign key for the customer's location the contact person is from
+    search_name (str): The full name in both orders, lowercased and without accents, to search by, FULLTEXT indexed on MySQL and MariaDB
     """
-    product    = models.ManyToManyField(
+    product     = models.ManyToManyField(
         to                  = 'licenses.SoftwareProduct',
         related_name        = 'contact_persons',
         related_query_name  = 'contact_person',
     )
-    location   = models.ForeignKey(
+    location    = models.ForeignKey(
         to                  = 'Location',
         on_delete           = models.CASCADE,
         related_name        = 'contact_persons',
         related_query_name  = 'contact_person',
         null                = False,
     )
+    search_name = models.CharField(max_length = 263, default = '')
+
+
+class CustomerStats(models.Model):
+    """
+    The model 'CustomerStats' is the precomputed amount of locations, licenses and problems of a customer.
+    The amounts of locations, licenses and missing heartbeats are updated after changes, all counts are recomputed periodically.
+
+    Attributes:
+    customer           (int)     : Foreign key for the customer the counts belong to
+    locations          (int)     : The amount of locations
+    licenses           (int)     : The amount of current licenses
+    expiring           (int)     : The amount of current licenses expiring soon without a future license
+    missing_heartbeats (int)     : The amount of used products without a recent heartbeat
+    updated            (datetime): The date when the counts were computed
+    """
+    customer           = models.OneToOneField(
+        to                  = 'Customer',
+        on_delete           = models.CASCADE,
+        primary_key         = True,
+        related_name        = 'stats',
+        related_query_name  = 'stats',
+    )
+    locations          = models.IntegerField(default = 0)
+    licenses           = models.IntegerField(default = 0)
+    expiring           = models.IntegerField(default = 0)
+    missing_heartbeats = models.IntegerField(default = 0)
+    updated            = models.DateTimeField(auto_now = True)
+
+
+class Postcode(models.Model):
+    """
+    The model 'Postcode' is an entry of the offline postcode table, which is imported from a file.
+    It is used to look up the position of locations.
+
+    Attributes:
+    postcode  (str)  : The normalized postcode
+    city      (str)  : The city of the postcode
+    latitude  (float): The latitude of the center of the postcode area
+    longitude (float): The longitude of the center of the postcode area
+    """
+    postcode  = models.CharField(max_length = 16, unique = True)
+    city      = models.CharField(max_length = 64)
+    latitude  = models.FloatField()
+    longitude = models.FloatField()
@@ -0,0 +1,220 @@
+from django.db.models.signals import m2m_changed, pre_delete, pre_save, post_save, post_delete
+from django.dispatch import receiver
+from heartbeat.models import Heartbeat
+from licenses.models import CustomerLicense, LocationLicense, UsedSoftwareProduct
+from management_portal.general import PurgeState
+from .controllers import ContactPersonController, CustomerController, CustomerStatsController, LocationController
+from .models import ContactPerson, Customer, CustomerStats, Location
+
+
+@receiver(post_save, sender = Customer)
+@receiver(post_delete, sender = Customer)
+def invalidate_customers_for_each_letter(sender, instance, **kwargs):
+    """
+    Removes the cached customers for each letter after a customer got saved or deleted.
+
+    Parameters:
+    sender   (type)    : model class of the saved or deleted instance
+    instance (Customer): saved or deleted customer
+    """
+    CustomerController.invalidate_customers_for_each_letter()
+
+@receiver([post_save, post_delete], sender = Customer)
+def increment_revision(sender, instance, **kwargs):
+    """
+    Increments the revision of a saved or deleted customer.
+
+    Parameters:
+    sender   (type)    : model class of the saved or deleted instance
+    instance (Customer): saved or deleted customer
+    """
+    if PurgeState.is_purging():
+        return
+    CustomerController.increment_revision(customer = instance.id)
+
+@receiver([post_save, post_delete], sender = Location)
+@receiver([post_save, post_delete], sender = CustomerLicense)
+def increment_customer_revision(sender, instance, **kwargs):
+    """
+    Increments the revision of the customer a saved or deleted location or customer license belongs to.
+
+    Parameters:
+    sender   (type) : model class of the saved or deleted instance
+    instance (Model): saved or deleted location or customer license
+    """
+    if PurgeState.is_purging():
+        return
+    CustomerController.increment_revision(customer = instance.customer_id)
+
+@receiver([post_save, post_delete], sender = ContactPerson)
+@receiver([post_save, post_delete], sender = LocationLicense)
+@receiver([post_save, post_delete], sender = UsedSoftwareProduct)
+def increment_customer_revision_by_location(sender, instance, **kwargs):
+    """
+    Increments the revision of the customer a saved or deleted contact person, location license or used product belongs to.
+
+    Parameters:
+    sender   (type) : model class of the saved or deleted instance
+    instance (Model): saved or deleted contact person, location license or used product
+    """
+    if PurgeState.is_purging():
+        return
+    CustomerController.increment_revision(location = instance.location_id)
+
+@receiver(post_save, sender = Heartbeat)
+def increment_customer_revision_by_heartbeat(sender, instance, **kwargs):
+    """
+    Increments the revision of the customer a saved heartbeat belongs to.
+    Heartbeats are only deleted together with their used product, which increments the revision already.
+
+    Parameters:
+    sender   (type)     : model class of the saved instance
+    instance (Heartbeat): saved heartbeat
+    """
+    CustomerController.increment_revision(used_product = instance.used_product_id)
+
+@receiver(m2m_changed, sender = ContactPerson.product.through)
+def increment_customer_revision_for_products(sender, instance, action, **kwargs):
+    """
+    Increments the revision of the customer after the products of a contact person changed.
+
+    Parameters:
+    sender   (type)         : intermediate model of contact persons and products
+    instance (ContactPerson): changed contact person
+    action   (str)          : kind of the change
+    """
+    if action in ('post_add', 'post_remove', 'post_clear') and isinstance(instance, ContactPerson):
+        CustomerController.increment_revision(location = instance.location_id)
+
+@receiver(pre_save, sender = ContactPerson)
+def set_search_name(sender, instance, **kwargs):
+    """
+    Updates the search name of a contact person before saving it.
+
+    Parameters:
+    sender   (type)         : model class of the saved instance
+    instance (ContactPerson): contact person to save
+    """
+    instance.search_name = ContactPersonController.get_search_name(first_name = instance.first_name, last_name = instance.last_name)
+
+@receiver(pre_save, sender = Location)
+def set_geo_position(sender, instance, **kwargs):
+    """
+    Updates the postcode prefix and the position of a location by its postcode before saving it.
+
+    Parameters:
+    sender   (type)    : model class of the saved instance
+    instance (Location): location to save
+    """
+    LocationController.set_geo_positions([instance])
+
+@receiver(post_save, sender = Customer)
+def create_customer_stats(sender, instance, created, **kwargs):
+    """
+    Creates the empty counts of a created customer, so changes of its locations and licenses can be added to them.
+
+    Parameters:
+    sender   (type)    : model class of the saved instance
+    instance (Customer): saved customer
+    created  (bool)    : if the customer was created
+    """
+    if created:
+        CustomerStats.objects.get_or_create(customer_id = instance.id)
+
+@receiver([post_save, post_delete], sender = Location)
+def count_customer_locations(sender, instance, created = False, **kwargs):
+    """
+    Adds a created or deleted location to the counts of its customer.
+
+    Parameters:
+    sender   (type)    : model class of the saved or deleted instance
+    instance (Location): saved or deleted location
+    created  (bool)    : if the location was created
+    """
+    if PurgeState.is_purging():
+        return
+    if kwargs['signal'] is post_delete:
+        CustomerStatsController.add(customer = instance.customer_id, locations = -1)
+    elif created:
+        CustomerStatsController.add(customer = instance.customer_id, locations = 1)
+
+@receiver([post_save, post_delete], sender = CustomerLicense)
+@receiver([post_save, post_delete], sender = LocationLicense)
+def count_customer_licenses(sender, instance, created = False, **kwargs):
+    """
+    Adds a created or deleted current license, or a license which became a future license or stopped being one, to the counts of its customer.
+    Licenses saved as 'License' (e.g. by the rollover) keep being current licenses, so the parent model isn't connected.
+
+    Parameters:
+    sender   (type)   : model class of the saved or deleted instance
+    instance (License): saved or deleted customer or location license
+    created  (bool)   : if the license was created
+    """
+    if PurgeState.is_purging():
+        return
+    current = 0 if instance.replace_license_id else 1
+    if kwargs['signal'] is post_delete:
+        licenses = -current
+    elif created:
+        licenses = current
+    else:
+        licenses = current - (0 if getattr(instance, '_loaded_replace_license_id', instance.replace_license_id) else 1)
+
+    if sender is CustomerLicense:
+        CustomerStatsController.add(customer = instance.customer_id, licenses = licenses)
+    else:
+        CustomerStatsController.add(location = instance.location_id, licenses = licenses)
+
+@receiver(post_save, sender = UsedSoftwareProduct)
+def count_created_used_product(sender, instance, created, **kwargs):
+    """
+    Adds a created used product, which has no heartbeat yet, to the missing heartbeats of its customer.
+
+    Parameters:
+    sender   (type)               : model class of the saved instance
+    instance (UsedSoftwareProduct): saved used product
+    created  (bool)               : if the used product was created
+    """
+    if created:
+        CustomerStatsController.add(location = instance.location_id, missing_heartbeats = 1)
+
+@receiver(pre_delete, sender = UsedSoftwareProduct)
+def remember_missing_heartbeat(sender, instance, **kwargs):
+    """
+    Remembers the customer of a used product without a recent heartbeat before it and its heartbeats get deleted.
+
+    Parameters:
+    sender   (type)               : model class of the deleted instance
+    instance (UsedSoftwareProduct): used product to delete
+    """
+    if PurgeState.is_purging():
+        return
+    if CustomerStatsController.is_heartbeat_missing(used_product = instance.id):
+        instance._missing_heartbeat_customer = Location.objects.filter(id = instance.location_id).values_list('customer_id', flat = True).first()
+
+@receiver(post_delete, sender = UsedSoftwareProduct)
+def count_deleted_used_product(sender, instance, **kwargs):
+    """
+    Removes a deleted used product without a recent heartbeat from the missing heartbeats of its customer.
+
+    Parameters:
+    sender   (type)               : model class of the deleted instance
+    instance (UsedSoftwareProduct): deleted used product
+    """
+    customer = getattr(instance, '_missing_heartbeat_customer', None)
+    if customer:
+        CustomerStatsController.add(customer = customer, missing_heartbeats = -1)
+
+@receiver(post_save, sender = Heartbeat)
+def count_received_heartbeat(sender, instance, created, **kwargs):
+    """
+    Removes a used product from the missing heartbeats of its customer, if its previous heartbeat was older than HEARTBEAT_DURATION.
+    Heartbeats getting older than that are left to the periodic recomputation.
+
+    Parameters:
+    sender   (type)     : model class of the saved instance
+    instance (Heartbeat): saved heartbeat
+    created  (bool)     : if the heartbeat was created
+    """
+    if created and instance.used_product_id and CustomerStatsController.is_heartbeat_missing(used_product = instance.used_product_id, exclude = instance.id):
+        CustomerStatsController.add(used_product = instance.used_product_id, missing_heartbeats = -1)
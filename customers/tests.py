@@ -1,3 +1,257 @@
+from django.db import IntegrityError, connection
+from django.db.models import F, Value
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from unittest import mock
+from datetime import datetime, timezone
+import json
 
-# Create your tests here.
+from heartbeat.models import Heartbeat
+from licenses.controllers import UsedSoftwareProductController
+from licenses.models import SoftwareProduct, UsedSoftwareProduct
+from licenses.tests import create_customer_licenses, create_location_license
+from management_portal.constants import CUSTOMER_IMPORT_COLUMNS
+from management_portal.general import Match
+from .controllers import ContactPersonController, CustomerController, CustomerImportController, CustomerStatsController, LocationController
+from .models import ContactPerson, Customer, CustomerStats, Location, Postcode
+
+
+class CustomersForEachLetterTest(TestCase):
+
+    def test_letters_digits_and_umlauts(self):
+        for number, name in enumerate(['Zahnarzt', 'ärztehaus', 'Apotheke', '3D Druck', '_Intern']):
+            Customer.objects.create(customer_number = str(number), name = name)
+
+        customer_list = CustomerController.get_customers_for_each_letter(use_cache = False)
+        letters       = {letter['letter']: [customer['name'] for customer in letter['customers']] for letter in customer_list}
+
+        self.assertEqual(customer_list[0]['letter'], '0-9')
+        self.assertEqual(customer_list[-1]['letter'], '#')
+        self.assertEqual(letters['A'], ['Apotheke', 'ärztehaus'])
+        self.assertEqual(letters['Z'], ['Zahnarzt'])
+        self.assertEqual(letters['0-9'], ['3D Druck'])
+        self.assertEqual(letters['#'], ['_Intern'])
+
+    def test_cache_invalidated_on_save(self):
+        CustomerController.get_customers_for_each_letter()
+        Customer.objects.create(customer_number = '1', name = 'Bäckerei')
+
+        customer_list = CustomerController.get_customers_for_each_letter()
+        letters       = {letter['letter']: letter['customers'] for letter in customer_list}
+
+        self.assertEqual(len(letters['B']), 1)
+
+
+class CustomerDetailTest(TestCase):
+
+    def test_query_count_independent_of_locations(self):
+        customer = create_customer_licenses(location_count = 5)
+        product  = SoftwareProduct.objects.get()
+        for location in Location.objects.all():
+            person = ContactPerson.objects.create(first_name = 'A', last_name = 'B', email_address = 'a@b.de', phone_number = '1', location = location)
+            person.product.add(product)
+            used_product = UsedSoftwareProduct.objects.create(location = location, product = product, version = '1.0')
+            Heartbeat.objects.create(used_product = used_product, message = 'OK', detail = '')
+
+        with self.assertNumQueries(7):
+            customer = CustomerController.get_customer_detail(id = customer.id)
+            for location in customer.locations.all():
+                self.assertEqual([product.name for person in location.persons for product in person.product.all()], ['Produkt'])
+                self.assertEqual([used_product.valid for used_product in location.products], [1])
+            self.assertEqual(len(customer.customer_licenses.all()), 2)
+
+
+class CustomerTreeTest(TestCase):
+
+    def test_fields_and_revision(self):
+        customer = create_customer_licenses(location_count = 2)
+        response = CustomerController.get_tree_response(id = customer.id, fields = 'name,locations.name')
+
+        self.assertEqual(json.loads(response['body']), {
+            'name'     : 'Kunde',
+            'locations': [{'name': 'Standort 0'}, {'name': 'Standort 1'}],
+        })
+
+        Location.objects.filter(customer = customer).first().delete()
+        self.assertNotEqual(CustomerController.get_tree_response(id = customer.id, fields = 'name,locations.name')['etag'], response['etag'])
+        self.assertIsNone(CustomerController.get_tree_response(id = 0))
+
+    def test_saving_loaded_customer_keeps_revision(self):
+        customer = create_customer_licenses(location_count = 1)
+        customer = Customer.objects.get(id = customer.id)
+        Location.objects.get(customer = customer).delete()
+        revision = Customer.objects.get(id = customer.id).revision
+
+        customer.name = 'Umbenannt'
+        customer.save()
+        self.assertEqual(Customer.objects.get(id = customer.id).revision, revision + 1)
+        self.assertEqual(Customer.objects.get(id = customer.id).name, 'Umbenannt')
+
+
+class CustomerImportTest(TestCase):
+
+    def test_import_reuses_customers_and_reports_errors(self):
+        create_customer_licenses(location_count = 1)
+        location = {'location_email_address': 'a@b.de', 'location_phone_number': '1', 'street': 'Straße', 'house_number': '1', 'postcode': '12345', 'city': 'Stadt'}
+        rows     = [
+            dict(location, customer_number = '1', customer_name = 'Kunde', location_name = 'Neu', first_name = 'Max', last_name = 'M', contact_email_address = 'm@b.de', contact_phone_number = '2'),
+            dict(location, customer_number = '1', customer_name = 'Anders', location_name = 'Neu'),
+            dict(location, customer_number = '2', customer_name = 'Zwei', location_name = 'Haupt'),
+        ]
+        rows     = [{column: row.get(column, '') for column in CUSTOMER_IMPORT_COLUMNS} for row in rows]
+
+        result = CustomerImportController.run(rows = rows)
+
+        self.assertTrue(result['status'])
+        self.assertEqual((result['customers'], result['locations'], result['contact_persons']), (1, 2, 1))
+        self.assertEqual([error['row'] for error in result['errors']], [2])
+        self.assertEqual(ContactPerson.objects.get().location.name, 'Neu')
+        self.assertTrue(UsedSoftwareProduct.objects.filter(location__name = 'Neu').exists())
+
+        rows[0]['first_name'], rows[0]['last_name'] = 'max', 'm'
+        rows.append(dict(rows[0], first_name = 'Erika', last_name = 'M'))
+        result = CustomerImportController.run(rows = rows)
+        self.assertEqual((result['customers'], result['locations'], result['contact_persons']), (0, 0, 0))
+        self.assertEqual(ContactPerson.objects.count(), 1)
+
+    def test_failing_chunk_is_reported(self):
+        rows = [{column: '' for column in CUSTOMER_IMPORT_COLUMNS} for number in range(3)]
+        for number, row in enumerate(rows):
+            row.update(customer_number = str(number), customer_name = 'Kunde ' + str(number))
+
+        with mock.patch.object(Customer.objects, 'bulk_create', side_effect = [[], IntegrityError('duplicate')]), \
+            self.assertLogs('customers.controllers', level = 'ERROR'):
+            result = CustomerImportController.run(rows = rows, batch_size = 2)
+        self.assertFalse(result['status'])
+        self.assertIn('Kunden 3 bis 3', result['message'])
+        self.assertEqual(result['customers'], 0)
+
+
+class PurgeDeletedCustomerTest(TestCase):
+
+    def test_delete_hides_and_purge_removes(self):
+        customer     = create_customer_licenses(location_count = 3)
+        used_product = UsedSoftwareProduct.objects.create(location = Location.objects.first(), product = SoftwareProduct.objects.get(), version = '1.0')
+        Heartbeat.objects.create(used_product = used_product, message = 'OK', detail = '')
+
+        self.assertTrue(CustomerController.delete(id = customer.id).status)
+        self.assertFalse(Customer.objects.exists())
+        self.assertEqual(CustomerController.get_delete_progress()[0]['progress'], 0)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(CustomerController.purge_deleted(batch_size = 2), 1)
+        # the receivers skip the purged objects, only the deletion itself runs queries
+        self.assertFalse([query for query in queries.captured_queries if query['sql'].startswith('UPDATE "customers_customer"')])
+        self.assertLess(len(queries.captured_queries), 60)
+        self.assertFalse(Customer.all_objects.exists())
+        self.assertFalse(Location.objects.exists())
+        self.assertFalse(Heartbeat.objects.exists())
+        self.assertEqual(CustomerController.get_delete_progress(), [])
+
+
+class ContactPersonSearchTest(TestCase):
+
+    def test_any_order_case_and_accents(self):
+        location = Location.objects.get(customer = create_customer_licenses(location_count = 1))
+        ContactPerson.objects.create(first_name = 'Anna Maria', last_name = 'Müller', email_address = 'a@b.de', phone_number = '1', location = location)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(len(ContactPersonController.get_contact_persons_by_name(word = 'MULLER anna maria')), 1)
+        self.assertEqual(len(ContactPersonController.get_contact_persons_by_name(word = 'mül mar', contains = True)), 1)
+        self.assertEqual(len(ContactPersonController.get_contact_persons_by_name(word = 'mar')), 0)
+
+    def test_fulltext_match(self):
+        query = str(ContactPerson.objects.filter(Match(F('search_name'), Value('+"muller"'))).query)
+
+        self.assertIn('WHERE MATCH ("customers_contactperson"."search_name") AGAINST (+"muller" IN BOOLEAN MODE)', query)
+
+
+class LocationSearchTest(TestCase):
+
+    def test_ranked_join_search(self):
+        create_customer_licenses(location_count = 20)
+        Location.objects.filter(name = 'Standort 7').update(name = 'Standort', city = 'Berlin')
+
+        with self.assertNumQueries(1):
+            locations = LocationController.get_locations_by_name(word = 'standort', contains = True, limit = 5)
+
+        self.assertEqual(len(locations), 5)
+        self.assertEqual((locations[0]['name'], locations[0]['customer']), ('Standort', 'Kunde'))
+        self.assertEqual(set(locations[0]), set(CustomerController.get_filtered_customers(word = 'kunde')[0]))
+        self.assertEqual(len(LocationController.get_locations_by_name(word = 'ber', contains = True)), 1)
+
+
+class CustomerStatsTest(TestCase):
+
+    def test_update_counts(self):
+        customer = create_customer_licenses(location_count = 2)
+        UsedSoftwareProduct.objects.create(location = Location.objects.first(), product = SoftwareProduct.objects.get(), version = '1.0')
+        CustomerStats.objects.update(locations = 0, licenses = 0, missing_heartbeats = 0)
+
+        self.assertEqual(CustomerStatsController.update(), 1)
+        stats = CustomerStats.objects.get(customer = customer)
+        self.assertEqual((stats.locations, stats.licenses, stats.expiring, stats.missing_heartbeats), (2, 1, 0, 1))
+        self.assertEqual(CustomerStatsController.update(customers = [customer.id]), 0)
+
+    def test_changes_are_added(self):
+        customer = create_customer_licenses(location_count = 2)
+        location = Location.objects.filter(customer = customer).first()
+        create_location_license(location, 'STANDORT', datetime(2099, 1, 1, tzinfo = timezone.utc))
+        stats    = CustomerStats.objects.get(customer = customer)
+        self.assertEqual((stats.locations, stats.licenses), (2, 2))
+
+        location.delete()
+        stats = CustomerStats.objects.get(customer = customer)
+        self.assertEqual((stats.locations, stats.licenses), (1, 1))
+
+    def test_missing_heartbeats_are_added(self):
+        customer = create_customer_licenses(location_count = 1)
+        location = Location.objects.get(customer = customer)
+        CustomerStatsController.update()
+
+        used_product = UsedSoftwareProduct.objects.create(location = location, product = SoftwareProduct.objects.get(), version = '1.0')
+        self.assertEqual(CustomerStats.objects.get(customer = customer).missing_heartbeats, 1)
+
+        Heartbeat.objects.create(used_product = used_product, message = 'OK', detail = '')
+        self.assertEqual(CustomerStats.objects.get(customer = customer).missing_heartbeats, 0)
+        with CaptureQueriesContext(connection) as queries:
+            Heartbeat.objects.create(used_product = used_product, message = 'OK', detail = '')
+        self.assertFalse([query for query in queries.captured_queries if query['sql'].startswith('UPDATE "customers_customerstats"')])
+
+        duplicate = UsedSoftwareProduct.objects.create(location = location, product = SoftwareProduct.objects.get(), version = '1.0')
+        UsedSoftwareProduct.objects.filter(id = used_product.id).delete()
+        self.assertEqual(CustomerStats.objects.get(customer = customer).missing_heartbeats, 1)
+
+        Heartbeat.objects.create(
+            used_product = UsedSoftwareProduct.objects.create(location = location, product = SoftwareProduct.objects.get(), version = '1.0'),
+            message      = 'OK',
+            detail       = '',
+        )
+        self.assertTrue(UsedSoftwareProductController.reconcile(customer = customer.id).status)
+        self.assertEqual(UsedSoftwareProduct.objects.filter(location = location).get().id, duplicate.id)
+        self.assertEqual(CustomerStats.objects.get(customer = customer).missing_heartbeats, 0)
+        self.assertEqual(CustomerStatsController.update(), 0)
+
+
+class LocationsNearbyTest(TestCase):
+
+    def test_nearby_and_region(self):
+        customer = create_customer_licenses(location_count = 0)
+        Postcode.objects.create(postcode = '10115', city = 'Berlin', latitude = 52.532, longitude = 13.385)
+        Postcode.objects.create(postcode = '14467', city = 'Potsdam', latitude = 52.399, longitude = 13.058)
+        Postcode.objects.create(postcode = '80331', city = 'München', latitude = 48.135, longitude = 11.573)
+        for postcode in ['D-10115', '14467', '80331', '10999']:
+            Location.objects.create(
+                name = postcode, email_address = 'a@example.com', phone_number = '0', street = 'Straße',
+                house_number = '1', postcode = postcode, city = 'Stadt', customer = customer,
+            )
+        UsedSoftwareProduct.objects.create(location = Location.objects.get(name = '14467'), product = SoftwareProduct.objects.get(), version = '1.0')
+
+        nearby = LocationController.get_locations_nearby('10115', radius = 50)['locations']
+        self.assertEqual([location['name'] for location in nearby], ['D-10115', '14467'])
+        self.assertEqual(nearby[0]['distance'], 0)
+        missing = LocationController.get_locations_nearby('10115', radius = 50, missing_heartbeats = True)['locations']
+        self.assertEqual([location['name'] for location in missing], ['14467'])
+        region = LocationController.get_locations_nearby('10115', radius = 0)['locations']
+        self.assertEqual({location['name'] for location in region}, {'D-10115', '10999'})
+        self.assertFalse(LocationController.get_locations_nearby('99999', radius = 50)['status'])
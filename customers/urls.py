@@ -5,6 +5,7 @@ urlpatterns = [
     path('', views.index, name='index'),
     path('list/', views.customer_list, name='customers_list'),
     path('<int:id>/', views.customer, name='customer'),
+    path('<int:id>/tree/', views.customer_tree, name='customer_tree'),
     path('<int:customer_id>/locations/create/', views.create_location, name='locations_create'),
     path('<int:customer_id>/locations/edit/<int:id>/', views.edit_location, name='locations_edit'),
     path('save-location/', views.save_location, name='locations_save'),
@@ -12,8 +13,13 @@ urlpatterns = [
     path('create/', views.create, name='customers_create'),
     path('edit/<int:id>/', views.edit, name = 'customers_edit'),
     path('save/', views.save, name='customers_save'),
+    path('import/', views.import_customers, name='customers_import'),
     path('delete/<int:id>/', views.delete, name ='customers_delete'),
+    path('delete/progress/', views.delete_progress, name ='customers_delete_progress'),
+    path('nearby/', views.nearby, name ='locations_nearby'),
+    path('nearby/locations/', views.nearby_locations, name ='locations_nearby_locations'),
     path('contact-persons/', views.contact_persons, name ='contact_persons'),
+    path('contact-persons/responsible/', views.responsible_contacts, name ='contact_persons_responsible'),
     path('<int:customer_id>/locations/<int:location_id>/contact_persons/create', views.create_contact_person, name='contact_persons_create'),
     path('<int:customer_id>/locations/<int:location_id>/contact_persons/edit/<int:id>', views.edit_contact_person, name='contact_persons_edit'),
     path('save-contact-person/', views.save_contact_person, name='contact_persons_save'),
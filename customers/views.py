@@ -1,9 +1,12 @@
 from django.shortcuts import render, redirect
 from django.core.handlers.wsgi import WSGIRequest
-from django.http import HttpResponse, HttpResponseRedirect,JsonResponse
+from django.http import HttpResponse, HttpResponseNotModified, HttpResponseRedirect,JsonResponse
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
 from heartbeat.controllers import HeartbeatController
-from customers.controllers import CustomerController, ContactPersonController
+from customers.controllers import CustomerController, CustomerImportController, ContactPersonController
 from .controllers import LocationController
+from management_portal.constants import NEARBY_RADIUS
 import json
 
 
@@ -33,11 +36,9 @@ def customer_list(request: WSGIRequest) -> HttpResponse:
     message      = request.COOKIES.get('customer_status_message')
     heartbeats   = HeartbeatController.read()
     customer_list = CustomerController.get_customers_for_each_letter()
-    customers    = CustomerController.read()
     context      = {
         'heartbeats'    : heartbeats,
         'customer_list' : customer_list,
-        'customers'     : customers,
         'status'        : status,
         'message'       : message,
     }
@@ -73,11 +74,10 @@ def customer(request: WSGIRequest, id: int = 0):
     message     = request.COOKIES.get('customer_status_message')
     heartbeats  = HeartbeatController.read()
 
-    customer    = CustomerController.get_customer_by_id(id = id)
-    locations   = LocationController.get_locations_by_customer(customer_id = id)
+    customer    = CustomerController.get_customer_detail(id = id)
     context     = {
         'heartbeats': heartbeats,
-        'locations' : locations,
+        'locations' : customer.locations.all(),
         'customer'  : customer,
         'status'    : status,
         'message'   : message,
@@ -89,6 +89,35 @@ def customer(request: WSGIRequest, id: int = 0):
 
     return response
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def customer_tree(request: WSGIRequest, id: int) -> HttpResponse:
+    """
+    When the customer tree is called by an integration.
+    Returns the customer with its locations, contact persons, licenses and used products with heartbeat status as JSON.
+    With 'fields' only the given fields are returned, e.g. '?fields=name,locations.name,locations.used_products.valid'.
+    If the client already has the current tree it gets an empty response with status 304.
+
+    Parameters:
+    request (WSGIRequest): get request of the integration
+    id      (int)        : id of the customer
+
+    Returns:
+    HttpResponse: customer tree as JSON
+    """
+    tree = CustomerController.get_tree_response(id = id, fields = request.GET.get('fields', ''))
+    if not tree:
+        return JsonResponse({'message': 'Der Kunde wurde nicht gefunden.'}, status = 404)
+
+    if request.headers.get('If-None-Match') == tree['etag']:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(tree['body'], content_type = 'application/json')
+    response['ETag']          = tree['etag']
+    response['Cache-Control'] = 'private, no-cache'
+
+    return response
+
 def create(request: WSGIRequest) -> HttpResponse:
     """
     When the customer create is called. Renders the form to create a customer.
@@ -159,6 +188,35 @@ def save(request: WSGIRequest) -> JsonResponse:
 
     return response
 
+def import_customers(request: WSGIRequest) -> JsonResponse:
+    """
+    When the customer import is called as an ajax request with an uploaded CSV or JSON file.
+    Imports the customers, locations and contact persons of the file and returns the status with the errors per row.
+
+    Parameters:
+    request (WSGIRequest): ajax import request
+
+    Returns:
+    JsonResponse: import status
+    """
+    response = JsonResponse({})
+    if request.is_ajax() and request.method == 'POST' and request.user.is_authenticated:
+        file = request.FILES.get('file')
+        if not file:
+            response = JsonResponse({'status': False, 'message': 'Bitte Datei auswählen.', 'errors': []})
+        else:
+            try:
+                rows = CustomerImportController.read_rows(file = file, filename = file.name)
+            except:
+                rows = None
+
+            if rows is None:
+                response = JsonResponse({'status': False, 'message': 'Die Datei konnte nicht gelesen werden.', 'errors': []})
+            else:
+                response = JsonResponse(CustomerImportController.run(rows = rows))
+
+    return response
+
 def delete(request: WSGIRequest, id: int = 0) -> HttpResponseRedirect:
     """
     When the customer delete is called. Deletes the customer with the given id.
@@ -178,6 +236,68 @@ def delete(request: WSGIRequest, id: int = 0) -> HttpResponseRedirect:
 
     return response
 
+def delete_progress(request: WSGIRequest) -> JsonResponse:
+    """
+    When the delete progress is called as an ajax request by the customer list.
+    Returns the deleted customers which are still purged in the background and the progress of the purge.
+
+    Parameters:
+    request (WSGIRequest): ajax request
+
+    Returns:
+    JsonResponse: deleted customers with progress
+    """
+    response = JsonResponse({})
+    if request.is_ajax():
+        response = JsonResponse({'customers': CustomerController.get_delete_progress()})
+
+    return response
+
+def nearby(request: WSGIRequest) -> HttpResponse:
+    """
+    When the regional location search is called. Renders the search form.
+    The locations are loaded by an ajax request.
+
+    Parameters:
+    request (WSGIRequest): url request of the user
+
+    Returns:
+    HttpResponse: regional location search
+    """
+    heartbeats = HeartbeatController.read()
+    context    = {
+        'title'     : 'Standorte in der Nähe',
+        'heartbeats': heartbeats,
+        'radius'    : NEARBY_RADIUS,
+    }
+    return render(request, 'customers/nearby.html', context)
+
+def nearby_locations(request: WSGIRequest) -> JsonResponse:
+    """
+    When the regional location search is called as an ajax request.
+    Returns the locations within the radius around a postcode or in the region of the postcode.
+
+    Parameters:
+    request (WSGIRequest): ajax request
+
+    Returns:
+    JsonResponse: status, message and locations
+    """
+    response = JsonResponse({})
+    if request.is_ajax():
+        try:
+            radius = max(int(request.GET.get('radius', NEARBY_RADIUS)), 0)
+        except ValueError:
+            radius = NEARBY_RADIUS
+        result   = LocationController.get_locations_nearby(
+            postcode           = request.GET.get('postcode', ''),
+            radius             = radius,
+            missing_heartbeats = request.GET.get('missing_heartbeats', '') == 'true',
+        )
+        response = JsonResponse(result)
+
+    return response
+
 def create_location(request: WSGIRequest, customer_id: int = 0) -> HttpResponse:
     """
     When the location create is called. Renders the form to create a location.
@@ -314,6 +434,26 @@ def contact_persons(request: WSGIRequest) -> JsonResponse:
 
     return response
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def responsible_contacts(request: WSGIRequest) -> JsonResponse:
+    """
+    When the responsible contact persons are called by an integration or an ajax request.
+    Returns the contact persons responsible for the given used products, e.g. '?used_products=1,2,3'.
+
+    Parameters:
+    request (WSGIRequest): get request
+
+    Returns:
+    JsonResponse: contact persons per used product id
+    """
+    try:
+        used_products = [int(id) for id in request.GET.get('used_products', '').split(',') if id.strip()]
+    except ValueError:
+        return JsonResponse({'message': 'Ungültige Produkt-IDs.'}, status = 400)
+
+    return JsonResponse({'contacts': ContactPersonController.get_responsible_contacts(used_products = used_products)})
+
 def create_contact_person(request: WSGIRequest, location_id: int = 0, customer_id: int = 0) -> HttpResponse:
     """
     When the contact person create is called. Renders the form to create a contact person.
@@ -1,8 +1,8 @@
 from .models import Heartbeat
-from django.db.models import Max
+from django.db.models import OuterRef, Subquery
 from datetime import datetime, timezone
-from licenses.models import UsedSoftwareProduct, SoftwareProduct
-from customers.models import Location
+from licenses.models import UsedSoftwareProduct
+from customers.controllers import ContactPersonController
 from management_portal.constants import LIMIT, DATETIME_TYPE, HEARTBEAT_DURATION
 
 class HeartbeatController:
@@ -12,25 +12,31 @@ class HeartbeatController:
     """
 
     @staticmethod
-    def read(limit: int = LIMIT) -> list:
+    def read(limit: int = LIMIT, with_contacts: bool = False) -> list:
         """
         Returns heartbeats including information about product, location and if a heartbeat is missing.
+        Product, location and customer are loaded by a join, the latest heartbeats by one more query.
 
         Parameters:
-        limit (int): Maximum number of objects to load (default: 1000)
+        limit         (int) : Maximum number of objects to load (default: 1000)
+        with_contacts (bool): if the contact persons responsible for the product at the location should be loaded as 'contacts'
 
         Returns:
         list: Heartbeats
         """
-        used_products = UsedSoftwareProduct.objects.all()[:limit]
+        latest_heartbeats = Heartbeat.objects.filter(used_product = OuterRef('pk')).order_by('-last_received', '-id')
+        used_products     = list(UsedSoftwareProduct.objects.filter(location__customer__deleted__isnull = True).select_related(
+            'product', 'location__customer',
+        ).annotate(
+            heartbeat_id = Subquery(latest_heartbeats.values('id')[:1]),
+        )[:limit])
+        heartbeats        = Heartbeat.objects.in_bulk([used_product.heartbeat_id for used_product in used_products if used_product.heartbeat_id])
+        current_date      = datetime.now(timezone.utc)
 
         for used_product in used_products:
-            heartbeats            = Heartbeat.objects.filter(used_product_id = used_product.id)
-            last_received_max     = heartbeats.aggregate(Max('last_received'))
-
-            try:
-                used_product.heartbeat     = Heartbeat.objects.get(used_product_id = used_product.id, last_received = last_received_max['last_received__max'])
-                duration                   = datetime.now(timezone.utc) - used_product.heartbeat.last_received
+            used_product.heartbeat = heartbeats.get(used_product.heartbeat_id)
+            if used_product.heartbeat:
+                duration                   = current_date - used_product.heartbeat.last_received
                 used_product.last_received = used_product.heartbeat.last_received.strftime(DATETIME_TYPE)
                 if duration > HEARTBEAT_DURATION:
                     used_product.valid = 0
@@ -38,12 +44,14 @@ class HeartbeatController:
                     used_product.valid = -1
                 else:
                     used_product.valid = 1
-            except:
+            else:
                 used_product.last_received = 'Noch nie'
                 used_product.valid         = 0
 
-            used_product.product   = SoftwareProduct.objects.get(used_product__id = used_product.id)
-            used_product.location  = Location.objects.get(used_product__id = used_product.id)
+        if with_contacts:
+            contacts = ContactPersonController.get_responsible_contacts([used_product.id for used_product in used_products])
+            for used_product in used_products:
+                used_product.contacts = contacts.get(used_product.id, [])
 
         return used_products
 
@@ -1,3 +1,33 @@
 from django.test import TestCase
 
-# Create your tests here.
+from customers.models import ContactPerson, Location
+from licenses.models import SoftwareProduct, UsedSoftwareProduct
+from licenses.tests import create_customer_licenses
+from .controllers import HeartbeatController
+from .models import Heartbeat
+
+
+class HeartbeatReadTest(TestCase):
+
+    def test_query_count_and_responsible_contacts(self):
+        customer = create_customer_licenses(location_count = 3)
+        product  = SoftwareProduct.objects.get()
+        other    = SoftwareProduct.objects.create(name = 'Anderes', category = 'Kategorie', version = '1.0')
+        for location in Location.objects.filter(customer = customer):
+            used_product = UsedSoftwareProduct.objects.create(location = location, product = product, version = '1.0')
+            Heartbeat.objects.create(used_product = used_product, message = 'KEY', detail = '')
+            person = ContactPerson.objects.create(
+                first_name = 'Erika', last_name = location.name, email_address = 'e@example.com', phone_number = '0', location = location,
+            )
+            person.product.add(product)
+            ContactPerson.objects.create(
+                first_name = 'Max', last_name = location.name, email_address = 'm@example.com', phone_number = '0', location = location,
+            ).product.add(other)
+
+        with self.assertNumQueries(3):
+            used_products = HeartbeatController.read(with_contacts = True)
+        self.assertEqual([used_product.valid for used_product in used_products], [1, 1, 1])
+        self.assertEqual(
+            [[contact['last_name'] for contact in used_product.contacts] for used_product in used_products],
+            [[used_product.location.name] for used_product in used_products],
+        )
@@ -31,7 +31,7 @@ def heartbeat_list(request: WSGIRequest) -> HttpResponse:
     Returns:
     HttpResponse: heartbeat list
     """
-    used_products = HeartbeatController.read()
+    used_products = HeartbeatController.read(with_contacts = True)
     count_missing = HeartbeatController.get_count_missing(used_products)
     context       = {
         'used_products' : used_products,
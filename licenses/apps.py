@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class LicensesConfig(AppConfig):
     name = 'licenses'
+
+    def ready(self):
+        from . import signals
@@ -1,10 +1,38 @@
-from .models import License, CustomerLicense, LocationLicense, SoftwareProduct, UsedSoftwareProduct, SoftwareModule
-from customers.models import Customer, Location
+from .models import License, CustomerLicense, LocationLicense, SoftwareProduct, UsedSoftwareProduct, SoftwareModule, ReplaceAcknowledgement, LicenseEvent, LicenseSigningKey, LicenseStatusCount, LicenseStatusSnapshot
+from customers.models import Customer, CustomerStats, Location
+from heartbeat.models import Heartbeat
 from datetime import datetime, timezone, timedelta
-from management_portal.constants import LIMIT, DATE_TYPE, DATE_TYPE_JS, LICENSE_EXPIRE_WARNING
+from django.core import signing
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import F, Q, Case, Count, Exists, IntegerField, Min, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, TruncMonth, TruncWeek
+from django.utils.timezone import is_naive, make_aware
+from management_portal.constants import (
+    LIMIT, DATE_TYPE, DATE_TYPE_JS, LICENSE_EXPIRE_WARNING, LICENSE_KEY_BYTES, LICENSE_ACK_SALT, LICENSE_HEARTBEAT_CACHE_TIMEOUT,
+    ROLLOVER_BATCH_SIZE, LICENSE_CALENDAR_RANGE, LICENSE_COLUMNS, LICENSE_PAGE_LENGTH, LICENSE_CURSOR_SALT,
+    LICENSE_SETTINGS_CACHE_TIMEOUT, LICENSE_EVENT_BATCH_SIZE, DATETIME_TYPE, LICENSE_TOKEN_LIFETIME, LICENSE_SIGNING_KID_CACHE_KEY, LICENSE_HISTORY_RANGE,
+    LICENSE_EXPORT_CHUNK_SIZE, HEARTBEAT_DURATION, CUSTOMER_INDEX_CACHE_KEY,
+)
 from management_portal.general import Status, SaveStatus
 from datetime import datetime, timezone, timedelta
+import atexit
+import base64
+import hashlib
+import hmac
 import json
+import logging
+import secrets
+import threading
+
+try:
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+    from cryptography.hazmat.primitives.serialization import Encoding, NoEncryption, PrivateFormat, PublicFormat
+except ImportError:
+    Ed25519PrivateKey = None
+
+logger = logging.getLogger(__name__)
 
 class LicenseController:
     """
@@ -23,15 +51,17 @@ class LicenseController:
         Returns:
         list: licenses
         """
-        licenses = License.objects.filter(replace_license__isnull = True).order_by('end_date')[:limit]
+        future_licenses = License.objects.filter(replace_license = OuterRef('pk')).values('end_date')[:1]
+        licenses        = LicenseController.get_active_licenses().filter(replace_license__isnull = True).annotate(
+            future_end_date = Subquery(future_licenses),
+        ).order_by('end_date')[:limit]
 
         for license in licenses:
             license.start_date = license.start_date.strftime(DATE_TYPE)
-            try:
-                future_license   = License.objects.get(replace_license = license.id)
-                license.end_date = future_license.end_date.strftime(DATE_TYPE)
+            if license.future_end_date:
+                license.end_date = license.future_end_date.strftime(DATE_TYPE)
                 license.valid    = 2
-            except:
+            else:
                 duration         = license.end_date - datetime.now(timezone.utc)
                 license.end_date = license.end_date.strftime(DATE_TYPE)
                 if (duration > LICENSE_EXPIRE_WARNING):
@@ -60,6 +90,202 @@ class LicenseController:
 
         return licenses
 
+    @staticmethod
+    def get_active_licenses():
+        """
+        Returns the licenses of customers which are not deleted.
+        Deleted customers are hidden at once, but their licenses are only purged in the background.
+
+        Returns:
+        QuerySet: licenses
+        """
+        return License.objects.filter(
+            customerlicense__customer__deleted__isnull           = True,
+            locationlicense__location__customer__deleted__isnull = True,
+        )
+
+    @staticmethod
+    def get_license_page(status: str = '', customer: int = 0, product: int = 0, expires_from: str = '',
+        expires_to: str = '', search: str = '', order: int = LICENSE_COLUMNS.index('end_date'),
+        descending: bool = False, start: int = 0, length: int = LICENSE_PAGE_LENGTH, after: str = '') -> dict:
+        """
+        Returns a page of the current licenses filtered, sorted and paged by the database.
+        Instead of an offset you can pass the cursor of the previous page's last license to page by keyset.
+
+        Parameters:
+        status       (str) : 'valid', 'expiring', 'expired' or 'renewed'
+        customer     (int) : id of the customer the licenses belong to
+        product      (int) : id of the software product the licenses are for
+        expires_from (str) : earliest end date of the licenses
+        expires_to   (str) : latest end date of the licenses
+        search       (str) : word to search in key, customer, location, product and module
+        order        (int) : index of the column to sort by (see LICENSE_COLUMNS)
+        descending   (bool): if sorted descending
+        start        (int) : offset of the page
+        length       (int) : amount of licenses of the page
+        after        (str) : cursor of the last license of the previous page
+
+        Returns:
+        dict: amount of all and filtered licenses, the licenses of the page and the cursor of the page's last license
+        """
+        current_date = datetime.now(timezone.utc)
+        total        = LicenseController.get_active_licenses().filter(replace_license__isnull = True).count()
+        licenses     = LicenseController.__filter_licenses(
+            status       = status,
+            customer     = customer,
+            product      = product,
+            expires_from = expires_from,
+            expires_to   = expires_to,
+            search       = search,
+        )
+        filtered = licenses.count()
+
+        field = LICENSE_COLUMNS[order] if 0 <= order < len(LICENSE_COLUMNS) and LICENSE_COLUMNS[order] else 'end_date'
+        if descending:
+            licenses = licenses.order_by(F(field).desc(nulls_last = True), '-id')
+        else:
+            licenses = licenses.order_by(F(field).asc(nulls_first = True), 'id')
+
+        if after:
+            try:
+                value, id = signing.loads(after, salt = LICENSE_CURSOR_SALT)
+                if field in ('start_date', 'end_date'):
+                    value = datetime.fromisoformat(value)
+                if value is None:
+                    # licenses without value are sorted first ascending and last descending
+                    if descending:
+                        licenses = licenses.filter(**{field + '__isnull': True, 'id__lt': id})
+                    else:
+                        licenses = licenses.filter(Q(**{field + '__isnull': False}) | Q(**{field + '__isnull': True, 'id__gt': id}))
+                elif descending:
+                    licenses = licenses.filter(
+                        Q(**{field + '__lt': value}) | Q(**{field: value, 'id__lt': id}) | Q(**{field + '__isnull': True})
+                    )
+                else:
+                    licenses = licenses.filter(Q(**{field + '__gt': value}) | Q(**{field: value, 'id__gt': id}))
+            except:
+                licenses = licenses.none()
+            start = 0
+
+        rows = []
+        for license in licenses.values(
+            'id', 'key', 'start_date', 'end_date', 'future_end_date', 'renewed', 'customer_name', 'location_name',
+            'customerlicense', 'module__name', 'module__product__name', field,
+        )[start:start + length]:
+            value = license[field]
+            rows.append({
+                'id'        : license['id'],
+                'key'       : license['key'],
+                'start_date': license['start_date'].strftime(DATE_TYPE),
+                'end_date'  : (license['future_end_date'] or license['end_date']).strftime(DATE_TYPE),
+                'valid'     : LicenseController.__get_validity(license['renewed'], license['end_date'], current_date),
+                'customer'  : license['customer_name'] or 'Nicht zugewiesen',
+                'location'  : license['location_name'] or ('Für alle gültig' if license['customerlicense'] else 'Nicht zugewiesen'),
+                'product'   : license['module__product__name'],
+                'module'    : license['module__name'],
+                'cursor'    : signing.dumps(
+                    [value.isoformat() if isinstance(value, datetime) else value, license['id']],
+                    salt = LICENSE_CURSOR_SALT,
+                ),
+            })
+
+        return {
+            'total'   : total,
+            'filtered': filtered,
+            'licenses': rows,
+            'next'    : rows[-1]['cursor'] if len(rows) == length else '',
+        }
+
+    @staticmethod
+    def export(status: str = '', customer: int = 0, product: int = 0,
+        expires_from: str = '', expires_to: str = '', search: str = ''):
+        """
+        Yields the current licenses with customer, location, product, module, dates and future license as rows for an export.
+        The first row is the header. The licenses are loaded in chunks by keyset, so only one chunk of licenses is kept in memory.
+
+        Parameters:
+        status       (str): 'valid', 'expiring', 'expired' or 'renewed'
+        customer     (int): id of the customer the licenses belong to
+        product      (int): id of the software product the licenses are for
+        expires_from (str): earliest end date of the licenses
+        expires_to   (str): latest end date of the licenses
+        search       (str): word to search in key, customer, location, product and module
+
+        Returns:
+        generator: rows as lists
+        """
+        statuses     = {
+            2 : 'Zukunftslizenz angelegt',
+            1 : 'Gültig',
+            0 : 'Läuft bald ab',
+            -1: 'Abgelaufen',
+        }
+        current_date = datetime.now(timezone.utc)
+        licenses     = LicenseController.__filter_licenses(
+            status       = status,
+            customer     = customer,
+            product      = product,
+            expires_from = expires_from,
+            expires_to   = expires_to,
+            search       = search,
+        ).select_related(
+            'module__product', 'locationlicense__location__customer', 'customerlicense__customer',
+        ).order_by('end_date', 'id')
+
+        yield [
+            'Kunde', 'Kundennummer', 'Standort', 'Produkt', 'Modul', 'Lizenzschlüssel', 'Details',
+            'Anfangsdatum', 'Enddatum', 'Status', 'Zukunftslizenz', 'Enddatum Zukunftslizenz',
+        ]
+        for license in LicenseController.__iterate_by_keyset(licenses = licenses):
+            if hasattr(license, 'locationlicense'):
+                location = license.locationlicense.location
+                customer = location.customer
+                location = location.name
+            elif hasattr(license, 'customerlicense'):
+                customer = license.customerlicense.customer
+                location = 'Für alle gültig'
+            else:
+                customer = None
+                location = 'Nicht zugewiesen'
+
+            yield [
+                customer.name if customer else 'Nicht zugewiesen',
+                customer.customer_number if customer else '',
+                location,
+                license.module.product.name,
+                license.module.name,
+                license.key,
+                license.detail,
+                license.start_date.strftime(DATE_TYPE),
+                license.end_date.strftime(DATE_TYPE),
+                statuses[LicenseController.__get_validity(license.renewed, license.end_date, current_date)],
+                license.future_key or '',
+                license.future_end_date.strftime(DATE_TYPE) if license.future_end_date else '',
+            ]
+
+    @staticmethod
+    def __iterate_by_keyset(licenses):
+        """
+        Yields the licenses ordered by end date and id in chunks of LICENSE_EXPORT_CHUNK_SIZE.
+        Each chunk is loaded by keyset after the last license of the previous chunk,
+        because the MySQL driver fetches the whole result of a query at once, even with 'iterator()'.
+
+        Parameters:
+        licenses (QuerySet): licenses ordered by end date and id
+
+        Returns:
+        generator: licenses
+        """
+        chunk = list(licenses[:LICENSE_EXPORT_CHUNK_SIZE])
+        while chunk:
+            yield from chunk
+            if len(chunk) < LICENSE_EXPORT_CHUNK_SIZE:
+                break
+            last  = chunk[-1]
+            chunk = list(licenses.filter(
+                Q(end_date__gt = last.end_date) | Q(end_date = last.end_date, id__gt = last.id),
+            )[:LICENSE_EXPORT_CHUNK_SIZE])
+
     @staticmethod
     def get_license_by_id(id: int, use_slash_dates: bool = False):
         """
@@ -280,30 +506,16 @@ class LicenseController:
             future_licenses = LocationLicense.objects.exclude(replace_license__isnull = True)
             for future_license in future_licenses:
                 future_license.delete()
-            try:
-                LicenseController.__delete_redundant_used_product(
-                    location = license.location,
-                    module   = license.module,
-                )
-            except:
-                pass
             license.delete()
+            UsedSoftwareProductController.reconcile(customer = license.location.customer_id)
         except:
             try:
                 license         = CustomerLicense.objects.get(license_ptr_id = id)
                 future_licenses = CustomerLicense.objects.exclude(replace_license__isnull = True)
                 for future_license in future_licenses:
                     future_license.delete()
-                locations = Location.objects.filter(customer = license.customer)
-                for location in locations:
-                    try:
-                        LicenseController.__delete_redundant_used_product(
-                            location = location,
-                            module   = license.module,
-                        )
-                    except:
-                        pass
                 license.delete()
+                UsedSoftwareProductController.reconcile(customer = license.customer_id)
             except:
                 status.set_unexpected('Die zu löschende wurde Lizenz nicht gefunden.')
 
@@ -336,270 +548,1330 @@ class LicenseController:
     def get_settings_information(id: int) -> dict:
         """
         Returns the information needed for the license settings.
-        This includes the current and the future license.
+        This includes the current and the future license, both loaded by a single query.
 
         Parameters:
         id (int): license id
 
         Returns:
-        dict: current and future license
+        dict: current and future license, 'None' if not existing
         """
         settings = {
-            'current': LicenseController.get_license_by_id(id = id, use_slash_dates = True),
-            'future' : LicenseController.get_future_license(id = id),
+            'current': None,
+            'future' : None,
         }
-        if settings['current']:
-            settings['current']           = settings['current'].__dict__
-            settings['current']['_state'] = ''
-            settings['current']           = json.dumps(settings['current'])
-        else:
-            settings['current'] = ''
-        if settings['future']:
-            settings['future']           = settings['future'].__dict__
-            settings['future']['_state'] = ''
-            settings['future']           = json.dumps(settings['future'])
-        else:
-            settings['future'] = ''
+        license  = LicenseController.get_active_licenses().filter(id = id).values(
+            'id', 'key', 'start_date', 'end_date',
+            'license__id', 'license__key', 'license__start_date', 'license__end_date',
+        ).first()
+        if license:
+            settings['current'] = {
+                'id'        : license['id'],
+                'key'       : license['key'],
+                'start_date': license['start_date'].strftime(DATE_TYPE),
+                'end_date'  : license['end_date'].strftime(DATE_TYPE),
+            }
+            if license['license__id']:
+                settings['future'] = {
+                    'id'        : license['license__id'],
+                    'key'       : license['license__key'],
+                    'start_date': license['license__start_date'].strftime(DATE_TYPE),
+                    'end_date'  : license['license__end_date'].strftime(DATE_TYPE),
+                }
 
         return settings
 
     @staticmethod
-    def get_future_license(id: int):
+    def get_settings_response(id: int) -> dict:
         """
-        Returns the future license to a given id.
-        Returns 'None', if no future license exists.
+        Returns the license settings encoded as JSON and its ETag.
+        The response is cached until the license or its future license changes.
 
         Parameters:
         id (int): license id
 
         Returns:
-        License: future license
-        """
-        try:
-            license = License.objects.get(replace_license__id = id)
-            license.stringify_dates(use_slash = True)
-            return license
-        except:
-            return None
+        dict: JSON body and ETag of the license settings
+        """
+        cache_key = LicenseController.get_settings_cache_key(id = id)
+        response  = cache.get(cache_key)
+        if response is None:
+            settings = LicenseController.get_settings_information(id = id)
+            body     = json.dumps(settings)
+            response = {
+                'body': body,
+                'etag': '"' + hashlib.md5(body.encode()).hexdigest() + '"',
+            }
+            if settings['current']:
+                cache.set(cache_key, response, LICENSE_SETTINGS_CACHE_TIMEOUT.total_seconds())
+
+        return response
 
     @staticmethod
-    def __check_validity(key: str, detail: str, start_date: str, end_date: str,
-        module: int, location: int, customer: int, id: int, replace_license: int) -> Status:
+    def get_settings_cache_key(id: int) -> str:
         """
-        Checks if all necessary attributes to save a license are set and valid.
+        Returns the cache key of the license settings.
 
         Parameters:
-        key             (str): license key
-        detail          (str): license details
-        start_date      (str): start date of the license
-        end_date        (str): end date of the license
-        module          (int): id of the belonging software module
-        location        (int): id of the belonging customer's location
-        customer        (int): id of the belonging customer
-        id              (int): license id if license should been edited
-        replace_license (int): license id of the license to replace
+        id (int): license id
 
         Returns:
-        Status: status
+        str: cache key
         """
-        status = Status()
-        if not len(key):
-            status.message = 'Bitte Lizenzschlüssel angeben.'
-        elif len(key) > 255:
-            status.message = 'Lizenzschlüssel darf maximal 255 Zeichen lang sein.'
-        elif not len(detail):
-            status.message = 'Bitte Details angeben.'
-        elif len(detail) > 2047:
-            status.message = 'Details dürfen maximal 2047 Zeichen lang sein.'
-        elif not len(start_date) and not replace_license:
-            status.message = 'Bitte Anfangsdatum angeben.'
-        elif not len(end_date):
-            status.message = 'Bitte Enddatum angeben.'
-        elif start_date >= end_date:
-            status.message = 'Enddatum muss später als Anfangsdatum sein.'
-        elif not module and not replace_license:
-            status.message = 'Bitte Modul angeben.'
-        elif customer and location:
-            status.message = 'Bitte nur Kunde ODER Standort zuweisen.'
-        elif not customer and not location and not replace_license:
-            status.message = 'Bitte Kunde oder Standort zuweisen.'
-        elif replace_license and (customer or location or module or start_date):
-            status.message = 'Bei ersetzender Lizenz bitte nicht Kunde, Standort, Modul oder Anfangsdatum zuweisen.'
-        else:
-            licenses = License.objects.all()
-            for license in licenses:
-                if key == license.key and not id == str(license.id):
-                    status.message = 'Dieser Lizenzschlüssel wird bereits verwendet.'
-                    break
-            if not len(status.message):
-                status.status = True
-        
-        return status
+        return 'license_settings_' + str(id)
 
     @staticmethod
-    def __check_foreign_keys(module: int, location: int, customer: int) -> SaveStatus:
+    def invalidate_customer_licenses(customer: int):
         """
-        Checks if foreign keys are valid and returns status including belonging objects.
+        Removes the cached states, tokens and settings of the licenses of a customer and recomputes the amounts of licenses per status.
+        It is called when the customer gets deleted, because its licenses are hidden at once, but only purged in the background.
 
         Parameters:
-        module      (int): id of the belonging software module
-        location    (int): id of the belonging customer's location
-        customer    (int): id of the belonging customer
+        customer (int): id of the deleted customer
+        """
+        licenses = License.objects.filter(
+            Q(customerlicense__customer_id = customer) | Q(locationlicense__location__customer_id = customer),
+        ).values_list('id', 'key', 'previous_key')
+        keys     = []
+        for id, key, previous_key in licenses:
+            keys.append(LicenseController.get_settings_cache_key(id = id))
+            for license_key in [key, previous_key]:
+                if license_key:
+                    keys.append(LicenseController.get_state_cache_key(key = license_key))
+                    keys.append(LicenseTokenController.get_token_cache_key(key = license_key))
+        cache.delete_many(keys)
+
+        LicenseController.update_status_counts()
+
+    @staticmethod
+    def get_status_counts() -> dict:
+        """
+        Returns the precomputed amount of current licenses per status.
+        The amounts are recomputed first if a license changed its status by time since the last computation.
 
         Returns:
-        SaveStatus: save status including instances
+        dict: amount of valid, expiring, expired and replaced licenses
         """
-        instances = {
-            'module'  : None,
-            'location': None,
-            'customer': None,
-        }
-        status = SaveStatus(instances = instances)
-        try:
-            status.instances['module'] = SoftwareModule.objects.get(id = module)
-        except:
-            status.message = 'Zugewiesenes Modul nicht gefunden.'
-    
-        if not len(status.message):
-            if location:
-                try:
-                    status.instances['location'] = Location.objects.get(id = location)
-                    status.status                = True
-                except:
-                    status.message               = 'Zugewiesenen Standort nicht gefunden.'
-            else:
-                try:
-                    status.instances['customer'] = Customer.objects.get(id = customer)
-                    status.status                = True
-                except:
-                    status.message               = 'Zugewiesenen Kunden nicht gefunden.'
+        counts = list(LicenseStatusCount.objects.values('status', 'count', 'valid_until'))
+        if len(counts) < len(LicenseStatusCount.STATUSES) or \
+            any(count['valid_until'] and count['valid_until'] <= datetime.now(timezone.utc) for count in counts):
+            return LicenseController.update_status_counts()
 
-        return status
+        return {count['status']: count['count'] for count in counts}
 
     @staticmethod
-    def __future_license(replace_license: int, key: str, detail: str, end_date: str, id: int = 0) -> Status:
+    def update_status_counts() -> dict:
         """
-        If the license to create should be replace another in the future.
-
-        Parameters:
-        replace_license (int): license id of the license to replace
-        key             (str): license key
-        detail          (str): license details
-        end_date        (str): end date of the license
-        id              (int): license id if license should been edited
+        Recomputes the amount of current licenses per status with a single query and stores them.
+        Replaced licenses are the ones with a future license.
 
         Returns:
-        Status: status
-        """
-        status = None
+        dict: amount of valid, expiring, expired and replaced licenses
+        """
+        current_date = datetime.now(timezone.utc)
+        warning_date = current_date + LICENSE_EXPIRE_WARNING
+        pending      = Q(license__isnull = True)
+        counts       = LicenseController.get_active_licenses().filter(replace_license__isnull = True).aggregate(
+            **LicenseController.__get_status_aggregates(current_date = current_date),
+            next_expiry   = Min('end_date', filter = pending & Q(end_date__gt = current_date)),
+            next_expiring = Min('end_date', filter = pending & Q(end_date__gt = warning_date)),
+        )
+        valid_until = min(
+            [date for date in [counts['next_expiry'], counts['next_expiring'] and counts['next_expiring'] - LICENSE_EXPIRE_WARNING] if date],
+            default = None,
+        )
 
-        if id:
-            status = LicenseController.__edit_future_license(
-                id              = id,
-                replace_license = replace_license,
-                key             = key,
-                detail          = detail,
-                end_date        = end_date,
-            )
-        else:
-            status = LicenseController.__create_future_license(
-                replace_license = replace_license,
-                key             = key,
-                detail          = detail,
-                end_date        = end_date,
-            )
+        with transaction.atomic():
+            for status in LicenseStatusCount.STATUSES:
+                LicenseStatusCount.objects.update_or_create(
+                    status   = status,
+                    defaults = {
+                        'count'      : counts[status],
+                        'valid_until': valid_until,
+                    },
+                )
 
-        return status
+        return {status: counts[status] for status in LicenseStatusCount.STATUSES}
 
     @staticmethod
-    def __create_future_license(replace_license: int, key: str, detail: str, end_date: str) -> Status:
+    def take_status_snapshot() -> int:
         """
-        If the license to create should be replace another in the future.
+        Stores the amount of current licenses per status of today for all licenses, per software product and per customer.
+        An existing snapshot of today gets replaced.
+
+        Returns:
+        int: amount of stored snapshots
+        """
+        current_date = datetime.now(timezone.utc)
+        statuses     = LicenseController.__get_status_aggregates(current_date = current_date)
+        licenses     = LicenseController.get_active_licenses().filter(replace_license__isnull = True)
+        groups       = [
+            (LicenseStatusSnapshot.TOTAL, [dict(licenses.aggregate(**statuses), object = 0)]),
+            (LicenseStatusSnapshot.PRODUCT, licenses.values(object = F('module__product_id')).annotate(**statuses)),
+            (LicenseStatusSnapshot.CUSTOMER, licenses.values(
+                object = Coalesce('customerlicense__customer_id', 'locationlicense__location__customer_id'),
+            ).annotate(**statuses)),
+        ]
+
+        snapshots = []
+        for dimension, counts in groups:
+            for count in counts:
+                if count['object'] is None:
+                    continue
+                snapshots.append(LicenseStatusSnapshot(
+                    date      = current_date.date(),
+                    dimension = dimension,
+                    object    = count['object'],
+                    valid     = count['valid'],
+                    expiring  = count['expiring'],
+                    expired   = count['expired'],
+                    replaced  = count['replaced'],
+                ))
+
+        with transaction.atomic():
+            LicenseStatusSnapshot.objects.filter(date = current_date.date()).delete()
+            LicenseStatusSnapshot.objects.bulk_create(snapshots)
+
+        return len(snapshots)
+
+    @staticmethod
+    def get_status_history(dimension: str = LicenseStatusSnapshot.TOTAL, object: int = 0, since: str = '', until: str = '') -> dict:
+        """
+        Returns the daily amount of licenses per status from the snapshots.
+        Without a time range the snapshots of the last LICENSE_HISTORY_RANGE are returned.
 
         Parameters:
-        replace_license (int): license id of the license to replace
-        key             (str): license key
-        detail          (str): license details
-        end_date        (str): end date of the license
+        dimension (str): 'total', 'product' or 'customer'
+        object    (int): id of the software product or customer
+        since     (str): first day
+        until     (str): last day
 
         Returns:
-        Status: create status
+        dict: days and amount of licenses per status and day
         """
-        status        = Status(True, 'Die Lizenz wurde erfolgreich angelegt.')
-        create_status = None
+        history = {'dates': []}
+        for status in LicenseStatusCount.STATUSES:
+            history[status] = []
         try:
-            create_status = LicenseController.__create_future_location_license(
-                replace_license = replace_license,
-                key             = key,
-                detail          = detail,
-                end_date        = end_date,
-            )
+            since = datetime.strptime(since, DATE_TYPE_JS).date() if since else (datetime.now(timezone.utc) - LICENSE_HISTORY_RANGE).date()
+            until = datetime.strptime(until, DATE_TYPE_JS).date() if until else datetime.now(timezone.utc).date()
         except:
-            try:
-                create_status = LicenseController.__create_future_customer_license(
-                    replace_license = replace_license,
-                    key             = key,
-                    detail          = detail,
-                    end_date        = end_date,
-                )
-            except:
-                status.set_unexpected('Zu ersetzende Lizenz nicht gefunden.')
-        
-        if create_status and not create_status.status:
-            status.set_unexpected(create_status.message)
+            return history
 
-        return status
+        snapshots = LicenseStatusSnapshot.objects.filter(
+            dimension = dimension,
+            object    = object if dimension != LicenseStatusSnapshot.TOTAL else 0,
+            date__gte = since,
+            date__lte = until,
+        ).order_by('date').values('date', *LicenseStatusCount.STATUSES)
+        for snapshot in snapshots:
+            history['dates'].append(snapshot['date'].strftime(DATE_TYPE))
+            for status in LicenseStatusCount.STATUSES:
+                history[status].append(snapshot[status])
+
+        return history
 
     @staticmethod
-    def __edit_future_license(id: int, replace_license: int, key: str, detail: str, end_date: str) -> Status:
+    def count_saved_license(license: License, created: bool):
         """
-        If the license to edit should be replace another in the future.
+        Adds the status changes caused by a saved license to the precomputed amounts of licenses per status.
+        The license itself changes its status if its end date or the license it replaces changed,
+        the replaced licenses change between replaced and their status by time.
+        Other changes don't touch the amounts at all.
 
         Parameters:
-        id              (int): license id of the license to edit
-        replace_license (int): license id of the license to replace
-        key             (str): license key
-        detail          (str): license details
-        end_date        (str): end date of the license
+        license (License): saved license
+        created (bool)   : if the license was created
+        """
+        current_date          = datetime.now(timezone.utc)
+        deltas                = {}
+        end_date              = LicenseController.__get_end_date(license.end_date)
+        replace_license       = license.replace_license_id
+        old_end_date          = end_date if created else LicenseController.__get_end_date(getattr(license, '_loaded_end_date', end_date))
+        old_replace_license   = None if created else getattr(license, '_loaded_replace_license_id', replace_license)
+        new_status, new_until = LicenseController.__get_date_status(end_date = end_date, current_date = current_date)
+        old_status, _         = LicenseController.__get_date_status(end_date = old_end_date, current_date = current_date)
+        until                 = None
+
+        if created:
+            if not replace_license:
+                deltas[new_status] = 1
+                until              = new_until
+        elif old_replace_license != replace_license or old_status != new_status:
+            if License.objects.filter(replace_license_id = license.id).exists():
+                old_status = new_status = LicenseStatusCount.REPLACED
+                new_until  = None
+            if not old_replace_license:
+                deltas[old_status] = deltas.get(old_status, 0) - 1
+            if not replace_license:
+                deltas[new_status] = deltas.get(new_status, 0) + 1
+                until              = new_until
+
+        if old_replace_license != replace_license:
+            for id, delta in [(old_replace_license, -1), (replace_license, 1)]:
+                replaced_until = LicenseController.__count_replaced_license(
+                    deltas       = deltas,
+                    id           = id,
+                    delta        = delta,
+                    exclude      = license.id,
+                    current_date = current_date,
+                )
+                until          = min([date for date in [until, replaced_until] if date], default = None)
 
-        Returns:
-        Status: edit status
+        LicenseController.__add_status_deltas(deltas = deltas, valid_until = until)
+
+    @staticmethod
+    def count_deleted_license(license: License, stored_licenses: list):
         """
-        status      = Status(True, 'Die Lizenz wurde erfolgreich aktualisiert.')
-        edit_status = None
-        try:
-            edit_status = LicenseController.__edit_future_location_license(
-                id              = id,
-                replace_license = replace_license,
-                key             = key,
-                detail          = detail,
-                end_date        = end_date,
+        Adds the status changes caused by a deleted license to the precomputed amounts of licenses per status.
+        The future licenses of the deleted license become current licenses, a replaced license gets its status by time again.
+
+        Parameters:
+        license         (License): deleted license
+        stored_licenses (list)   : id, end date and replaced license of the license and its future licenses before the deletion
+        """
+        current_date = datetime.now(timezone.utc)
+        deltas       = {}
+        until        = None
+        stored       = next((stored for stored in stored_licenses if stored['id'] == license.id), None)
+        if not stored:
+            return
+        future_licenses = [stored['id'] for stored in stored_licenses if stored['id'] != license.id]
+        # future licenses deleted together with the license don't become current licenses
+        end_dates       = list(License.objects.filter(id__in = future_licenses).values_list('end_date', flat = True)) if future_licenses else []
+
+        if not stored['replace_license_id']:
+            if future_licenses:
+                status = LicenseStatusCount.REPLACED
+            else:
+                status, _ = LicenseController.__get_date_status(end_date = stored['end_date'], current_date = current_date)
+            deltas[status] = -1
+        for end_date in end_dates:
+            status, status_until = LicenseController.__get_date_status(end_date = end_date, current_date = current_date)
+            deltas[status]       = deltas.get(status, 0) + 1
+            until                = min([date for date in [until, status_until] if date], default = None)
+        if stored['replace_license_id']:
+            replaced_until = LicenseController.__count_replaced_license(
+                deltas       = deltas,
+                id           = stored['replace_license_id'],
+                delta        = -1,
+                exclude      = license.id,
+                current_date = current_date,
             )
-        except:
-            try:
-                edit_status = LicenseController.__edit_future_customer_license(
-                    id              = id,
-                    replace_license = replace_license,
-                    key             = key,
-                    detail          = detail,
-                    end_date        = end_date,
-                )
-            except:
-                status.set_unexpected('Zu bearbeitende Lizenz nicht gefunden.')
-        
-        if edit_status and not edit_status.status:
-            status.set_unexpected(edit_status.message)
+            until          = min([date for date in [until, replaced_until] if date], default = None)
 
-        return status
+        LicenseController.__add_status_deltas(deltas = deltas, valid_until = until)
 
     @staticmethod
-    def __create_future_location_license(replace_license: int, key: str, detail: str, end_date: str) -> Status:
+    def get_stored_licenses(license: License) -> list:
         """
-        Creates the location license to replace.
+        Returns the stored id, end date and replaced license of a license and its future licenses.
+        It is called before a license gets deleted, because the deletion removes the reference of the future licenses to it.
 
         Parameters:
-        replace_license (int): license id of the license to replace
-        key             (str): license key
+        license (License): license to delete
+
+        Returns:
+        list: id, end date and replaced license of the license and its future licenses
+        """
+        return list(License.objects.filter(Q(id = license.id) | Q(replace_license_id = license.id)).values('id', 'end_date', 'replace_license_id'))
+
+    @staticmethod
+    def __count_replaced_license(deltas: dict, id: int, delta: int, exclude: int, current_date: datetime) -> datetime:
+        """
+        Adds the status change of a license which got (delta 1) or lost (delta -1) a future license to the deltas.
+        Its status only changes if it is a current license and has no other future license.
+
+        Parameters:
+        deltas       (dict)    : changes of the amounts per status
+        id           (int)     : id of the replaced license
+        delta        (int)     : 1 if the license got a future license, -1 if it lost one
+        exclude      (int)     : id of the future license which changed
+        current_date (datetime): date to compute the status at
+
+        Returns:
+        datetime: date the license changes its status by time if it lost its future license
+        """
+        if not id:
+            return None
+        replaced = License.objects.filter(id = id, replace_license__isnull = True).annotate(
+            future_licenses = Count('license', filter = ~Q(license__id = exclude)),
+        ).values('end_date', 'future_licenses').first()
+        if not replaced or replaced['future_licenses']:
+            return None
+
+        status, until                       = LicenseController.__get_date_status(end_date = replaced['end_date'], current_date = current_date)
+        deltas[status]                      = deltas.get(status, 0) - delta
+        deltas[LicenseStatusCount.REPLACED] = deltas.get(LicenseStatusCount.REPLACED, 0) + delta
+
+        return until if delta < 0 else None
+
+    @staticmethod
+    def __add_status_deltas(deltas: dict, valid_until: datetime = None):
+        """
+        Adds the changes of the amounts of licenses per status to the precomputed amounts with a single query.
+        The date when the first license changes its status by time is moved forward if a changed license changes earlier.
+
+        Parameters:
+        deltas      (dict)    : changes of the amounts per status
+        valid_until (datetime): date the changed licenses change their status by time
+        """
+        deltas = {status: delta for status, delta in deltas.items() if delta}
+        if not deltas:
+            return
+
+        updates = {
+            'count': F('count') + Case(
+                *[When(status = status, then = Value(delta)) for status, delta in deltas.items()],
+                default      = Value(0),
+                output_field = IntegerField(),
+            ),
+        }
+        if valid_until:
+            updates['valid_until'] = Case(
+                When(Q(valid_until__isnull = True) | Q(valid_until__gt = valid_until), then = Value(valid_until)),
+                default = F('valid_until'),
+            )
+        LicenseStatusCount.objects.filter(status__in = deltas).update(**updates)
+
+    @staticmethod
+    def __get_date_status(end_date: datetime, current_date: datetime) -> tuple:
+        """
+        Returns the status of a current license without future license and the date it changes by time.
+
+        Parameters:
+        end_date     (datetime): end date of the license
+        current_date (datetime): date to compute the status at
+
+        Returns:
+        tuple: status and date of the next change, 'None' if the license is expired
+        """
+        if end_date > current_date + LICENSE_EXPIRE_WARNING:
+            return LicenseStatusCount.VALID, end_date - LICENSE_EXPIRE_WARNING
+        if end_date > current_date:
+            return LicenseStatusCount.EXPIRING, end_date
+
+        return LicenseStatusCount.EXPIRED, None
+
+    @staticmethod
+    def __get_end_date(end_date) -> datetime:
+        """
+        Returns the end date of a license as aware datetime. Before saving it may be set as string or naive datetime.
+
+        Parameters:
+        end_date (str|datetime): end date of the license
+
+        Returns:
+        datetime: end date
+        """
+        end_date = License._meta.get_field('end_date').to_python(end_date)
+
+        return make_aware(end_date) if is_naive(end_date) else end_date
+
+    @staticmethod
+    def __get_status_aggregates(current_date: datetime) -> dict:
+        """
+        Returns the aggregates counting current licenses per status.
+        Replaced licenses are the ones with a future license.
+
+        Parameters:
+        current_date (datetime): date to compute the status at
+
+        Returns:
+        dict: aggregates for valid, expiring, expired and replaced licenses
+        """
+        warning_date = current_date + LICENSE_EXPIRE_WARNING
+        pending      = Q(license__isnull = True)
+
+        return {
+            'valid'   : Count('id', distinct = True, filter = pending & Q(end_date__gt = warning_date)),
+            'expiring': Count('id', distinct = True, filter = pending & Q(end_date__gt = current_date, end_date__lte = warning_date)),
+            'expired' : Count('id', distinct = True, filter = pending & Q(end_date__lte = current_date)),
+            'replaced': Count('id', distinct = True, filter = ~pending),
+        }
+
+    @staticmethod
+    def get_future_license(id: int):
+        """
+        Returns the future license to a given id.
+        Returns 'None', if no future license exists.
+
+        Parameters:
+        id (int): license id
+
+        Returns:
+        License: future license
+        """
+        try:
+            license = License.objects.get(replace_license__id = id)
+            license.stringify_dates(use_slash = True)
+            return license
+        except:
+            return None
+
+    @staticmethod
+    def get_license_state(key: str) -> dict:
+        """
+        Returns the state of the license with the given key which is needed to answer the customer's license script.
+        This includes the status and end date of the license and the key of its future license if it's expired.
+        Returns an empty dictionary, if no license exists.
+
+        The state is cached until it changes by time (license gets expiring or expired).
+        Saving or deleting a license removes it from the cache.
+
+        Parameters:
+        key (str): license key
+
+        Returns:
+        dict: status, end date and future license key
+        """
+        cache_key = LicenseController.get_state_cache_key(key = key)
+        state     = cache.get(cache_key)
+        if state is not None:
+            return state
+
+        state   = {}
+        timeout = LICENSE_HEARTBEAT_CACHE_TIMEOUT
+        license = LicenseController.get_active_licenses().filter(key = key).values('id', 'end_date').first()
+        if not license:
+            # the license was already replaced by its future license on the server
+            license = LicenseController.get_active_licenses().filter(previous_key = key).values('key', 'start_date').first()
+            if license:
+                state = {
+                    'status'  : 'expired',
+                    'end_date': license['start_date'].strftime(DATE_TYPE_JS),
+                    'key'     : license['key'],
+                    'exist'   : True,
+                }
+                license = None
+        if license:
+            duration = license['end_date'] - datetime.now(timezone.utc)
+            state    = {
+                'status'  : 'expired',
+                'end_date': license['end_date'].strftime(DATE_TYPE_JS),
+                'key'     : '',
+                'exist'   : False,
+            }
+            if duration > LICENSE_EXPIRE_WARNING:
+                state['status'] = 'valid'
+                timeout         = min(timeout, duration - LICENSE_EXPIRE_WARNING)
+            elif duration > timedelta(seconds = 0):
+                state['status'] = 'expiring'
+                timeout         = min(timeout, duration)
+            else:
+                future_key = License.objects.filter(replace_license_id = license['id']).values_list('key', flat = True).first()
+                if future_key:
+                    state['key']   = future_key
+                    state['exist'] = True
+
+        cache.set(cache_key, state, max(timeout.total_seconds(), 1))
+
+        return state
+
+    @staticmethod
+    def get_state_cache_key(key: str) -> str:
+        """
+        Returns the cache key of the state of the license with the given key.
+
+        Parameters:
+        key (str): license key
+
+        Returns:
+        str: cache key
+        """
+        return 'license_state_' + hashlib.sha256(key.encode()).hexdigest()
+
+    @staticmethod
+    def check_license(key: str, ack: str = '', location: int = 0) -> dict:
+        """
+        Checks the license with the given key for the customer's license script in a single request.
+        If the license is expired and has a future license, the key of it is returned together with an acknowledgement token.
+        The script sends this token with its next check, after it switched to the future license,
+        to let the future license replace the old one.
+
+        Parameters:
+        key      (str): license key
+        ack      (str): acknowledgement token of the previous check
+        location (int): id of the customer's location the script runs at
+
+        Returns:
+        dict: license status, future license key, acknowledgement token and license token
+        """
+        acknowledged = False
+        if ack:
+            try:
+                keys = signing.loads(ack, salt = LICENSE_ACK_SALT)
+                if keys['new'] == key:
+                    acknowledged = LicenseController.replace_with_future_license(
+                        old_key  = keys['old'],
+                        new_key  = keys['new'],
+                        location = location,
+                    ).status
+            except:
+                pass
+
+        state   = LicenseController.get_license_state(key = key)
+        context = {
+            'version'     : 2,
+            'found'       : bool(state),
+            'status'      : state.get('status', ''),
+            'end_date'    : state.get('end_date', ''),
+            'key'         : state.get('key', ''),
+            'exist'       : state.get('exist', False),
+            'ack'         : '',
+            'acknowledged': acknowledged,
+        }
+        if context['exist']:
+            context['ack'] = signing.dumps({'old': key, 'new': context['key']}, salt = LICENSE_ACK_SALT)
+        try:
+            context['token'] = LicenseTokenController.issue(key = context['key'] if context['exist'] else key)
+        except Exception:
+            logger.exception('The license token could not be issued.')
+            context['token'] = ''
+
+        return context
+
+    @staticmethod
+    def replace_with_future_license(old_key: str, new_key: str, location: int = 0) -> Status:
+        """
+        Replaces the license with the old key by its future license with the new key.
+        A location license is replaced at once. A customer license is only replaced when all locations
+        of the customer have acknowledged the future license. Passing the acknowledging location
+        makes repeated acknowledgements of the same location count only once.
+
+        Parameters:
+        old_key  (str): key of the license to replace
+        new_key  (str): key of the future license
+        location (int): id of the customer's location which acknowledges the future license
+
+        Returns:
+        Status: replace status
+        """
+        status = Status(True, 'Die Lizenz wurde erfolgreich ersetzt.')
+        if License.objects.filter(key = new_key, previous_key = old_key).exists():
+            status.message = 'Die Lizenz wurde bereits ersetzt.'
+            return status
+
+        try:
+            with transaction.atomic():
+                new_license = LocationLicense.objects.select_for_update().get(key = new_key)
+                old_license = LocationLicense.objects.select_for_update().get(key = old_key)
+                LicenseController.__replace_license(
+                    old_license = old_license,
+                    new_license = new_license,
+                )
+        except:
+            try:
+                with transaction.atomic():
+                    new_license = CustomerLicense.objects.select_for_update().get(key = new_key)
+                    counted     = True
+                    if location and Location.objects.filter(id = location, customer_id = new_license.customer_id).exists():
+                        _, counted = ReplaceAcknowledgement.objects.get_or_create(
+                            license_id  = new_license.id,
+                            location_id = location,
+                        )
+                    if counted:
+                        CustomerLicense.objects.filter(license_ptr_id = new_license.id).update(replace_count = F('replace_count') + 1)
+                        new_license.refresh_from_db(fields = ['replace_count'])
+
+                    total_count = Location.objects.filter(customer_id = new_license.customer_id).count()
+                    if new_license.replace_count >= total_count:
+                        old_license = CustomerLicense.objects.select_for_update().get(key = old_key)
+                        LicenseController.__replace_license(
+                            old_license = old_license,
+                            new_license = new_license,
+                        )
+                    else:
+                        status.message = 'Die Ersetzung wurde für ' + str(new_license.replace_count) + ' von ' + str(total_count) + ' Standorten bestätigt.'
+            except:
+                status.set_unexpected('Die zu ersetzende Lizenz wurde nicht gefunden.')
+
+        return status
+
+    @staticmethod
+    def rollover(batch_size: int = ROLLOVER_BATCH_SIZE) -> dict:
+        """
+        Replaces all expired licenses by their future licenses on the server without waiting for the customer's license script.
+        The replaced key is kept as previous key, so scripts still using it get the key of the future license.
+        The licenses are replaced in batches, each in its own transaction.
+        A failing batch is rolled back, logged and skipped, the following batches are still replaced.
+
+        Parameters:
+        batch_size (int): amount of licenses to replace per transaction
+
+        Returns:
+        dict: amount of replaced licenses and of licenses in failed batches
+        """
+        count        = 0
+        failed       = set()
+        current_date = datetime.now(timezone.utc)
+        while True:
+            ids = list(LicenseController.get_active_licenses().filter(
+                end_date__lt            = current_date,
+                replace_license__isnull = True,
+                license__isnull         = False,
+            ).exclude(id__in = failed).order_by('end_date').values_list('id', flat = True).distinct()[:batch_size])
+            if not ids:
+                break
+
+            keys = []
+            try:
+                with transaction.atomic():
+                    old_licenses = License.objects.select_for_update().in_bulk(ids)
+                    new_licenses = License.objects.select_for_update().filter(replace_license_id__in = ids).order_by('start_date')
+                    for new_license in new_licenses:
+                        old_license = old_licenses.pop(new_license.replace_license_id, None)
+                        if old_license:
+                            LicenseController.__replace_license(
+                                old_license = old_license,
+                                new_license = new_license,
+                            )
+                            keys.append(old_license.key)
+                    CustomerLicense.objects.filter(license_ptr_id__in = ids).update(replace_count = 0)
+            except Exception:
+                logger.exception('Rollover of the licenses %s failed.', ids)
+                failed.update(ids)
+                continue
+
+            # precompute the answers of the license heartbeat for the promoted licenses
+            for key in keys:
+                LicenseController.get_license_state(key)
+            count += len(keys)
+
+        return {
+            'replaced': count,
+            'failed'  : len(failed),
+        }
+
+    @staticmethod
+    def get_license_conflict(module: int, customer: int, location: int = 0) -> str:
+        """
+        Checks if a license conflicting with a location-module- or customer-module-combination already exists.
+        A location license conflicts with a location license of the same location and a customer license of the location's customer.
+        A customer license conflicts with a customer license of the same customer, location licenses get replaced by it.
+        Both kinds of conflicts are checked by a single query.
+
+        Parameters:
+        module   (int): id of the software module
+        customer (int): id of the customer
+        location (int): id of the location, 0 for a customer license
+
+        Returns:
+        str: error message, empty if there is no conflict
+        """
+        existing = License.objects.filter(module_id = module).filter(
+            Q(customerlicense__customer_id = customer) | Q(locationlicense__location_id = location)
+        ).values_list('customerlicense__customer_id', flat = True)
+
+        message = ''
+        for license_customer in existing:
+            if license_customer:
+                return 'Es existiert bereits eine Kundenlizenz, die diese Standort-Modul-Kombination abdeckt.'
+            elif location:
+                message = 'Es existiert bereits eine Standortlizenz für diese Standort-Modul-Kombination.'
+
+        return message
+
+    @staticmethod
+    def get_licenses_to_renew(customer: int = 0, product: int = 0,
+        expires_from: str = '', expires_to: str = '', limit: int = LIMIT) -> list:
+        """
+        Returns the current licenses which don't have a future license yet.
+        They can be filtered by customer, software product and an expiry window.
+
+        Parameters:
+        customer     (int): id of the customer the licenses belong to
+        product      (int): id of the software product the licenses are for
+        expires_from (str): earliest end date of the licenses
+        expires_to   (str): latest end date of the licenses
+        limit        (int): Maximum number of objects to load (default: 1000)
+
+        Returns:
+        list: licenses to renew
+        """
+        licenses = LicenseController.get_active_licenses().filter(replace_license__isnull = True, license__isnull = True)
+        if customer:
+            licenses = licenses.filter(
+                Q(locationlicense__location__customer_id = customer) | Q(customerlicense__customer_id = customer)
+            )
+        if product:
+            licenses = licenses.filter(module__product_id = product)
+        # an invalid date is ignored like an empty one
+        try:
+            if expires_from:
+                licenses = licenses.filter(end_date__gte = LicenseController.__parse_date(expires_from))
+        except (ValueError, IndexError):
+            pass
+        try:
+            if expires_to:
+                licenses = licenses.filter(end_date__lt = LicenseController.__parse_date(expires_to) + timedelta(days = 1))
+        except (ValueError, IndexError):
+            pass
+
+        return LicenseController.__get_license_rows(licenses.order_by('end_date')[:limit])
+
+    @staticmethod
+    def get_expiry_calendar(period: str = 'month', expires_from: str = '', expires_to: str = '') -> list:
+        """
+        Returns the amount of current licenses expiring per week or month.
+        The licenses are grouped by the database, so only the buckets have to be loaded.
+        Without an expiry window the buckets of the next year are returned.
+
+        Parameters:
+        period       (str): 'week' or 'month'
+        expires_from (str): earliest end date of the licenses
+        expires_to   (str): latest end date of the licenses
+
+        Returns:
+        list: buckets with start date, label, amount of licenses and amount of renewed licenses
+        """
+        try:
+            start = LicenseController.__parse_date(expires_from) if expires_from else datetime.now(timezone.utc)
+            end   = LicenseController.__parse_date(expires_to) + timedelta(days = 1) if expires_to else start + LICENSE_CALENDAR_RANGE
+        except:
+            return []
+
+        trunc   = TruncWeek if period == 'week' else TruncMonth
+        buckets = LicenseController.get_active_licenses().filter(
+            replace_license__isnull = True,
+            end_date__gte           = start,
+            end_date__lt            = end,
+        ).annotate(bucket = trunc('end_date')).values('bucket').annotate(
+            count   = Count('id', distinct = True),
+            renewed = Count('license', distinct = True),
+        ).order_by('bucket')
+
+        calendar = []
+        for bucket in buckets:
+            calendar.append({
+                'start'  : bucket['bucket'].strftime(DATE_TYPE_JS),
+                'label'  : bucket['bucket'].strftime('KW %V/%G' if period == 'week' else '%m/%Y'),
+                'count'  : bucket['count'],
+                'renewed': bucket['renewed'],
+                'open'   : bucket['count'] - bucket['renewed'],
+            })
+
+        return calendar
+
+    @staticmethod
+    def get_expiry_bucket(start: str, period: str = 'month', limit: int = LIMIT) -> list:
+        """
+        Returns the current licenses expiring in the week or month starting at the given date.
+
+        Parameters:
+        start  (str): start date of the bucket
+        period (str): 'week' or 'month'
+        limit  (int): Maximum number of objects to load (default: 1000)
+
+        Returns:
+        list: licenses of the bucket
+        """
+        try:
+            start = LicenseController.__parse_date(start)
+        except:
+            return []
+
+        if period == 'week':
+            end = start + timedelta(weeks = 1)
+        else:
+            end = (start.replace(day = 1) + timedelta(days = 32)).replace(day = 1)
+        licenses = LicenseController.get_active_licenses().filter(
+            replace_license__isnull = True,
+            end_date__gte           = start,
+            end_date__lt            = end,
+        ).annotate(
+            renewed = Exists(License.objects.filter(replace_license = OuterRef('pk'))),
+        ).order_by('end_date')[:limit]
+
+        return LicenseController.__get_license_rows(licenses)
+
+    @staticmethod
+    def renew(ids: list, keys: list, end_date: str, detail: str = '') -> Status:
+        """
+        Creates future licenses for many licenses at once.
+        Every future license gets the given end date and the key at the same position as its license id.
+        If no key is given a new one gets generated. All future licenses are written in one transaction.
+
+        Parameters:
+        ids      (list): ids of the licenses to renew
+        keys     (list): keys of the future licenses in the order of the ids
+        end_date (str) : end date of the future licenses
+        detail   (str) : details of the future licenses (default: details of the renewed licenses)
+
+        Returns:
+        Status: renew status
+        """
+        status = Status()
+        # ids and keys are filtered as pairs, so an invalid id doesn't shift the following keys to other licenses
+        keys   = [key.strip() for key in keys][:len(ids)]
+        keys  += [''] * (len(ids) - len(keys))
+        pairs  = [(int(id), key) for id, key in zip(ids, keys) if str(id).isdigit()]
+        ids    = [id for id, key in pairs]
+        keys   = [key for id, key in pairs]
+        given  = [key for key in keys if key]
+
+        if not len(ids):
+            status.message = 'Bitte mindestens eine Lizenz auswählen.'
+        elif not len(end_date):
+            status.message = 'Bitte Enddatum angeben.'
+        elif len(detail) > 2047:
+            status.message = 'Details dürfen maximal 2047 Zeichen lang sein.'
+        elif any(len(key) > 255 for key in given):
+            status.message = 'Lizenzschlüssel darf maximal 255 Zeichen lang sein.'
+        elif not len(given) == len(set(given)) or not len(ids) == len(set(ids)):
+            status.message = 'Jeder Lizenzschlüssel darf nur einmal angegeben werden.'
+        else:
+            status.status = True
+
+        if status.status:
+            licenses = License.objects.select_related('locationlicense', 'customerlicense').filter(
+                id__in                  = ids,
+                replace_license__isnull = True,
+                license__isnull         = True,
+            ).in_bulk()
+            keys     = [key or LicenseController.__generate_key() for key in keys]
+            used     = License.objects.filter(key__in = keys).values_list('key', flat = True).first()
+            try:
+                end_date = LicenseController.__parse_date(end_date)
+            except:
+                end_date = None
+
+            if not end_date:
+                status.set_unexpected('Bitte gültiges Enddatum angeben.')
+            elif not len(licenses) == len(ids):
+                status.set_unexpected('Mindestens eine Lizenz wurde nicht gefunden oder hat bereits eine Zukunftslizenz.')
+            elif any(license.end_date >= end_date for license in licenses.values()):
+                status.set_unexpected('Enddatum muss später als das Enddatum aller zu verlängernden Lizenzen sein.')
+            elif used:
+                status.set_unexpected('Der Lizenzschlüssel "' + used + '" wird bereits verwendet.')
+
+        if status.status:
+            try:
+                with transaction.atomic():
+                    for id, key in zip(ids, keys):
+                        LicenseController.__renew_license(
+                            old_license = licenses[id],
+                            key         = key,
+                            detail      = detail,
+                            end_date    = end_date,
+                        )
+                status.message = str(len(ids)) + ' Zukunftslizenzen wurden erfolgreich angelegt.'
+            except:
+                status.set_unexpected()
+
+        return status
+
+    @staticmethod
+    def __get_license_rows(licenses) -> list:
+        """
+        Loads the given licenses with their module, product, location and customer names as a single query.
+
+        Parameters:
+        licenses (QuerySet): licenses to load
+
+        Returns:
+        list: licenses as dictionaries
+        """
+        fields = [
+            'id', 'key', 'end_date', 'module__name', 'module__product__name', 'locationlicense__location__name',
+            'locationlicense__location__customer__name', 'customerlicense__customer__name',
+        ]
+        if 'renewed' in licenses.query.annotations:
+            fields.append('renewed')
+
+        rows = []
+        for license in licenses.values(*fields):
+            rows.append({
+                'id'      : license['id'],
+                'key'     : license['key'],
+                'end_date': license['end_date'].strftime(DATE_TYPE),
+                'module'  : license['module__name'],
+                'product' : license['module__product__name'],
+                'location': license['locationlicense__location__name'] or 'Für alle gültig',
+                'customer': license['locationlicense__location__customer__name'] or license['customerlicense__customer__name'],
+                'renewed' : license.get('renewed', False),
+            })
+
+        return rows
+
+    @staticmethod
+    def __get_validity(renewed: bool, end_date: datetime, current_date: datetime) -> int:
+        """
+        Returns the validity of a license as shown in the license list.
+
+        Parameters:
+        renewed      (bool)    : if a future license exists
+        end_date     (datetime): end date of the license
+        current_date (datetime): date to compute the validity at
+
+        Returns:
+        int: 2 if renewed, 1 if valid, 0 if expiring soon and -1 if expired
+        """
+        if renewed:
+            return 2
+        elif end_date - current_date > LICENSE_EXPIRE_WARNING:
+            return 1
+        elif end_date > current_date:
+            return 0
+
+        return -1
+
+    @staticmethod
+    def __filter_licenses(status: str = '', customer: int = 0, product: int = 0,
+        expires_from: str = '', expires_to: str = '', search: str = ''):
+        """
+        Returns the current licenses filtered by the database.
+        They are annotated with customer and location name, if they are renewed and the key and end date of the future license.
+
+        Parameters:
+        status       (str): 'valid', 'expiring', 'expired' or 'renewed'
+        customer     (int): id of the customer the licenses belong to
+        product      (int): id of the software product the licenses are for
+        expires_from (str): earliest end date of the licenses
+        expires_to   (str): latest end date of the licenses
+        search       (str): word to search in key, customer, location, product and module
+
+        Returns:
+        QuerySet: filtered licenses
+        """
+        current_date    = datetime.now(timezone.utc)
+        future_licenses = License.objects.filter(replace_license = OuterRef('pk'))
+        licenses        = LicenseController.get_active_licenses().filter(replace_license__isnull = True)
+        licenses        = licenses.annotate(
+            customer_name   = Coalesce('locationlicense__location__customer__name', 'customerlicense__customer__name'),
+            location_name   = F('locationlicense__location__name'),
+            renewed         = Exists(future_licenses),
+            future_key      = Subquery(future_licenses.values('key')[:1]),
+            future_end_date = Subquery(future_licenses.values('end_date')[:1]),
+        )
+
+        if status == 'renewed':
+            licenses = licenses.filter(renewed = True)
+        elif status == 'valid':
+            licenses = licenses.filter(renewed = False, end_date__gt = current_date + LICENSE_EXPIRE_WARNING)
+        elif status == 'expiring':
+            licenses = licenses.filter(
+                renewed       = False,
+                end_date__gt  = current_date,
+                end_date__lte = current_date + LICENSE_EXPIRE_WARNING,
+            )
+        elif status == 'expired':
+            licenses = licenses.filter(renewed = False, end_date__lte = current_date)
+        if customer:
+            licenses = licenses.filter(
+                Q(locationlicense__location__customer_id = customer) | Q(customerlicense__customer_id = customer)
+            )
+        if product:
+            licenses = licenses.filter(module__product_id = product)
+        try:
+            if expires_from:
+                licenses = licenses.filter(end_date__gte = LicenseController.__parse_date(expires_from))
+            if expires_to:
+                licenses = licenses.filter(end_date__lt = LicenseController.__parse_date(expires_to) + timedelta(days = 1))
+        except:
+            licenses = licenses.none()
+        if search:
+            licenses = licenses.filter(
+                Q(key__icontains = search) |
+                Q(customer_name__icontains = search) |
+                Q(location_name__icontains = search) |
+                Q(module__name__icontains = search) |
+                Q(module__product__name__icontains = search)
+            )
+
+        return licenses
+
+    @staticmethod
+    def __renew_license(old_license: License, key: str, detail: str, end_date: datetime):
+        """
+        Creates the location or customer license to replace the given license.
+
+        Parameters:
+        old_license (License) : license to replace
+        key         (str)     : license key
+        detail      (str)     : license details (default: details of the license to replace)
+        end_date    (datetime): end date of the license
+        """
+        attributes = {
+            'key'            : key,
+            'detail'         : detail or old_license.detail,
+            'start_date'     : old_license.end_date,
+            'end_date'       : end_date,
+            'module_id'      : old_license.module_id,
+            'replace_license': old_license,
+        }
+        if hasattr(old_license, 'locationlicense'):
+            new_license = LocationLicense(location_id = old_license.locationlicense.location_id, **attributes)
+        else:
+            new_license = CustomerLicense(customer_id = old_license.customerlicense.customer_id, **attributes)
+        new_license.save()
+
+    @staticmethod
+    def __replace_license(old_license: License, new_license: License):
+        """
+        Takes over key, details and dates of the future license into the license to replace.
+        The replaced key is kept as previous key. After that the future license gets deleted.
+
+        Parameters:
+        old_license (License): license to replace
+        new_license (License): future license
+        """
+        old_license.previous_key = old_license.key
+        old_license.key          = new_license.key
+        old_license.detail       = new_license.detail
+        old_license.start_date   = new_license.start_date
+        old_license.end_date     = new_license.end_date
+        new_license.delete()
+        old_license.save()
+
+    @staticmethod
+    def __generate_key() -> str:
+        """
+        Generates a new random license key.
+
+        Returns:
+        str: license key
+        """
+        return secrets.token_hex(LICENSE_KEY_BYTES).upper()
+
+    @staticmethod
+    def __parse_date(date_string: str) -> datetime:
+        """
+        Parses a date given as string (YYYY-MM-DD) to a datetime at midnight (UTC).
+
+        Parameters:
+        date_string (str): date as string
+
+        Returns:
+        datetime: date
+        """
+        date_parts = date_string.split('-')
+        return datetime(
+            int(date_parts[0]),
+            int(date_parts[1]),
+            int(date_parts[2]),
+            0, 0, 0,
+            tzinfo=timezone.utc,
+        )
+
+    @staticmethod
+    def __check_validity(key: str, detail: str, start_date: str, end_date: str,
+        module: int, location: int, customer: int, id: int, replace_license: int) -> Status:
+        """
+        Checks if all necessary attributes to save a license are set and valid.
+
+        Parameters:
+        key             (str): license key
+        detail          (str): license details
+        start_date      (str): start date of the license
+        end_date        (str): end date of the license
+        module          (int): id of the belonging software module
+        location        (int): id of the belonging customer's location
+        customer        (int): id of the belonging customer
+        id              (int): license id if license should been edited
+        replace_license (int): license id of the license to replace
+
+        Returns:
+        Status: status
+        """
+        status = Status()
+        if not len(key):
+            status.message = 'Bitte Lizenzschlüssel angeben.'
+        elif len(key) > 255:
+            status.message = 'Lizenzschlüssel darf maximal 255 Zeichen lang sein.'
+        elif not len(detail):
+            status.message = 'Bitte Details angeben.'
+        elif len(detail) > 2047:
+            status.message = 'Details dürfen maximal 2047 Zeichen lang sein.'
+        elif not len(start_date) and not replace_license:
+            status.message = 'Bitte Anfangsdatum angeben.'
+        elif not len(end_date):
+            status.message = 'Bitte Enddatum angeben.'
+        elif start_date >= end_date:
+            status.message = 'Enddatum muss später als Anfangsdatum sein.'
+        elif not module and not replace_license:
+            status.message = 'Bitte Modul angeben.'
+        elif customer and location:
+            status.message = 'Bitte nur Kunde ODER Standort zuweisen.'
+        elif not customer and not location and not replace_license:
+            status.message = 'Bitte Kunde oder Standort zuweisen.'
+        elif replace_license and (customer or location or module or start_date):
+            status.message = 'Bei ersetzender Lizenz bitte nicht Kunde, Standort, Modul oder Anfangsdatum zuweisen.'
+        else:
+            licenses = License.objects.all()
+            for license in licenses:
+                if key == license.key and not id == str(license.id):
+                    status.message = 'Dieser Lizenzschlüssel wird bereits verwendet.'
+                    break
+            if not len(status.message):
+                status.status = True
+        
+        return status
+
+    @staticmethod
+    def __check_foreign_keys(module: int, location: int, customer: int) -> SaveStatus:
+        """
+        Checks if foreign keys are valid and returns status including belonging objects.
+
+        Parameters:
+        module      (int): id of the belonging software module
+        location    (int): id of the belonging customer's location
+        customer    (int): id of the belonging customer
+
+        Returns:
+        SaveStatus: save status including instances
+        """
+        instances = {
+            'module'  : None,
+            'location': None,
+            'customer': None,
+        }
+        status = SaveStatus(instances = instances)
+        try:
+            status.instances['module'] = SoftwareModule.objects.get(id = module)
+        except:
+            status.message = 'Zugewiesenes Modul nicht gefunden.'
+    
+        if not len(status.message):
+            if location:
+                try:
+                    status.instances['location'] = Location.objects.get(id = location)
+                    status.status                = True
+                except:
+                    status.message               = 'Zugewiesenen Standort nicht gefunden.'
+            else:
+                try:
+                    status.instances['customer'] = Customer.objects.get(id = customer)
+                    status.status                = True
+                except:
+                    status.message               = 'Zugewiesenen Kunden nicht gefunden.'
+
+        return status
+
+    @staticmethod
+    def __future_license(replace_license: int, key: str, detail: str, end_date: str, id: int = 0) -> Status:
+        """
+        If the license to create should be replace another in the future.
+
+        Parameters:
+        replace_license (int): license id of the license to replace
+        key             (str): license key
+        detail          (str): license details
+        end_date        (str): end date of the license
+        id              (int): license id if license should been edited
+
+        Returns:
+        Status: status
+        """
+        status = None
+
+        if id:
+            status = LicenseController.__edit_future_license(
+                id              = id,
+                replace_license = replace_license,
+                key             = key,
+                detail          = detail,
+                end_date        = end_date,
+            )
+        else:
+            status = LicenseController.__create_future_license(
+                replace_license = replace_license,
+                key             = key,
+                detail          = detail,
+                end_date        = end_date,
+            )
+
+        return status
+
+    @staticmethod
+    def __create_future_license(replace_license: int, key: str, detail: str, end_date: str) -> Status:
+        """
+        If the license to create should be replace another in the future.
+
+        Parameters:
+        replace_license (int): license id of the license to replace
+        key             (str): license key
+        detail          (str): license details
+        end_date        (str): end date of the license
+
+        Returns:
+        Status: create status
+        """
+        status        = Status(True, 'Die Lizenz wurde erfolgreich angelegt.')
+        create_status = None
+        try:
+            create_status = LicenseController.__create_future_location_license(
+                replace_license = replace_license,
+                key             = key,
+                detail          = detail,
+                end_date        = end_date,
+            )
+        except:
+            try:
+                create_status = LicenseController.__create_future_customer_license(
+                    replace_license = replace_license,
+                    key             = key,
+                    detail          = detail,
+                    end_date        = end_date,
+                )
+            except:
+                status.set_unexpected('Zu ersetzende Lizenz nicht gefunden.')
+        
+        if create_status and not create_status.status:
+            status.set_unexpected(create_status.message)
+
+        return status
+
+    @staticmethod
+    def __edit_future_license(id: int, replace_license: int, key: str, detail: str, end_date: str) -> Status:
+        """
+        If the license to edit should be replace another in the future.
+
+        Parameters:
+        id              (int): license id of the license to edit
+        replace_license (int): license id of the license to replace
+        key             (str): license key
+        detail          (str): license details
+        end_date        (str): end date of the license
+
+        Returns:
+        Status: edit status
+        """
+        status      = Status(True, 'Die Lizenz wurde erfolgreich aktualisiert.')
+        edit_status = None
+        try:
+            edit_status = LicenseController.__edit_future_location_license(
+                id              = id,
+                replace_license = replace_license,
+                key             = key,
+                detail          = detail,
+                end_date        = end_date,
+            )
+        except:
+            try:
+                edit_status = LicenseController.__edit_future_customer_license(
+                    id              = id,
+                    replace_license = replace_license,
+                    key             = key,
+                    detail          = detail,
+                    end_date        = end_date,
+                )
+            except:
+                status.set_unexpected('Zu bearbeitende Lizenz nicht gefunden.')
+        
+        if edit_status and not edit_status.status:
+            status.set_unexpected(edit_status.message)
+
+        return status
+
+    @staticmethod
+    def __create_future_location_license(replace_license: int, key: str, detail: str, end_date: str) -> Status:
+        """
+        Creates the location license to replace.
+
+        Parameters:
+        replace_license (int): license id of the license to replace
+        key             (str): license key
         detail          (str): license details
         end_date        (str): end date of the license
 
@@ -757,15 +2029,7 @@ class LicenseController:
         Returns:
         bool: if valid
         """
-        end_date = datetime.now(timezone.utc)
-        date_parts = end_date_string.split('-')
-        end_date = datetime(
-            int(date_parts[0]),
-            int(date_parts[1]),
-            int(date_parts[2]),
-            0, 0, 0,
-            tzinfo=timezone.utc,
-        )
+        end_date   = LicenseController.__parse_date(end_date_string)
         difference = end_date - start_date
         return difference > timedelta(0)
 
@@ -786,200 +2050,86 @@ class LicenseController:
         Returns:
         Status: create status
         """
-        status = LicenseController.__check_license_duplicate_for_location(
-            location = location,
-            module   = module,
-        )
-        if status.status:
-            license = LocationLicense(
-                key         = key,
-                detail      = detail,
-                start_date  = start_date,
-                end_date    = end_date,
-                module      = module,
-                location    = location,
-            )
-            status = LicenseController.__create_used_product(
-                location = location,
-                module   = module,
-            )
-            if status.status:
-                license.save()
-
-        return status
-
-    @staticmethod
-    def __create_customer_license(key: str, detail: str,
-        start_date: str, end_date: str, module, customer) -> Status:
-        """
-        Creates a customer license and belonging used software products.
-        Redundant location licenses will be removed.
-
-        Parameters:
-        key         (str)           : license key
-        detail      (str)           : license details
-        start_date  (str)           : start date of the license
-        end_date    (str)           : end date of the license
-        module      (SoftwareModule): belonging software module
-        customer    (Customer)      : belonging customer
-
-        Returns:
-        Status: create status
-        """
-        status = LicenseController.__check_license_duplicate_for_customer(
-            customer = customer,
-            module   = module,
-        )
-        if status.status:
-            license = CustomerLicense(
-                key         = key,
-                detail      = detail,
-                start_date  = start_date,
-                end_date    = end_date,
-                module      = module,
-                customer    = customer,
-            )
-            status = LicenseController.__create_used_products_for_customer(
-                customer = customer,
-                module   = module,
-            )
-            if status.status:
-                license.save()
-
-        return status
-
-    @staticmethod
-    def __check_license_duplicate_for_location(location, module) -> Status:
-        """
-        Checks if a license already existing for a location-module-combination.
-
-        Parameters:
-        location (Location)      : customer's location
-        module   (SoftwareModule): software module
-
-        Returns:
-        Status: status
-        """
-        status = Status()
-        try:
-            LocationLicense.objects.get(
-                module   = module,
-                location = location,
-            )
-            status.message = 'Es existiert bereits eine Standortlizenz für diese Standort-Modul-Kombination.'
-        except:
-            status = LicenseController.__check_customer_license_duplicate(
-                customer = location.customer,
-                module   = module,
-            )
-        
-        return status
-
-    @staticmethod
-    def __check_license_duplicate_for_customer(customer, module) -> Status:
-        """
-        Checks if a license already existing for a customer-module-combination.
-        If location licenses get redundant by the customer license they will be deleted.
-
-        Parameters:
-        customer (Customer)      : customer
-        module   (SoftwareModule): software module
-
-        Returns:
-        Status: status
-        """
-        status = Status()
-        status = LicenseController.__check_customer_license_duplicate(
-            customer = customer,
+        status = LicenseController.__check_license_duplicate(
             module   = module,
+            customer = location.customer,
+            location = location,
         )
         if status.status:
-            locations = Location.objects.filter(customer = customer)
-            for location in locations:
-                try:
-                    license = LocationLicense.objects.get(
-                        location = location,
-                        module   = module,
-                    )
-                    license.delete()
-                    status.message = 'Deleted'
-                except:
-                    continue
-
-        return status
-
-    @staticmethod
-    def __check_customer_license_duplicate(customer, module) -> Status:
-        """
-        Checks if a customer license already existing for a customer-module-combination.
-
-        Parameters:
-        customer (Customer)      : customer
-        module   (SoftwareModule): software module
-
-        Returns:
-        Status: status
-        """
-        status = Status()
-        try:
-            CustomerLicense.objects.get(
-                module   = module,
-                customer = customer,
+            license = LocationLicense(
+                key         = key,
+                detail      = detail,
+                start_date  = start_date,
+                end_date    = end_date,
+                module      = module,
+                location    = location,
             )
-            status.message = 'Es existiert bereits eine Kundenlizenz, die diese Standort-Modul-Kombination abdeckt.'
-        except:
-            status.status = True
+            license.save()
+            status = UsedSoftwareProductController.reconcile(customer = location.customer_id)
 
         return status
 
     @staticmethod
-    def __create_used_product(location, module) -> Status:
+    def __create_customer_license(key: str, detail: str,
+        start_date: str, end_date: str, module, customer) -> Status:
         """
-        Creates a used product for the given location if it doesn't exist already.
+        Creates a customer license and belonging used software products.
+        Redundant location licenses will be removed.
 
         Parameters:
-        location (Location)     : location of the used product
-        module  (SoftwareModule): software module
+        key         (str)           : license key
+        detail      (str)           : license details
+        start_date  (str)           : start date of the license
+        end_date    (str)           : end date of the license
+        module      (SoftwareModule): belonging software module
+        customer    (Customer)      : belonging customer
 
         Returns:
-        Status: status
+        Status: create status
         """
-        status = Status(True)
-        try:
-            UsedSoftwareProduct.objects.get(
-                location = location,
-                product  = module.product,
+        status = LicenseController.__check_license_duplicate(
+            module   = module,
+            customer = customer,
+        )
+        if status.status:
+            # location licenses get redundant by the customer license
+            LocationLicense.objects.filter(location__customer = customer, module = module).delete()
+            license = CustomerLicense(
+                key         = key,
+                detail      = detail,
+                start_date  = start_date,
+                end_date    = end_date,
+                module      = module,
+                customer    = customer,
             )
-        except:
-            try:
-                used_product = UsedSoftwareProduct(
-                    version  = module.product.version,
-                    location = location,
-                    product  = module.product,
-                )
-                used_product.save()
-            except:
-                status = False
+            license.save()
+            status = UsedSoftwareProductController.reconcile(customer = customer.id)
 
         return status
 
     @staticmethod
-    def __create_used_products_for_customer(customer, module) -> Status:
+    def __check_license_duplicate(module, customer, location = None) -> Status:
         """
-        Creates used products for all location of the given customer if them doesn't exist already.
+        Checks if a license already existing for a location-module- or customer-module-combination.
+        Pass a location to check a location license, otherwise a customer license is checked.
 
         Parameters:
-        customer (Customer)       : customer the used products should be created for
-        product  (SoftwareProduct): the software product the used software product is
+        module   (SoftwareModule): software module
+        customer (Customer)      : customer
+        location (Location)      : customer's location
+
+        Returns:
+        Status: status
         """
-        status    = Status(True)
-        locations = Location.objects.filter(customer = customer)
-        for location in locations:
-            status = LicenseController.__create_used_product(
-                location = location,
-                module   = module,
-            )
-        
+        status  = Status(True)
+        message = LicenseController.get_license_conflict(
+            module   = module.id,
+            customer = customer.id,
+            location = location.id if location else 0,
+        )
+        if message:
+            status = Status(False, message)
+
         return status
 
     @staticmethod
@@ -1003,16 +2153,10 @@ class LicenseController:
         Returns:
         Status: edit status
         """
-        status = Status(True)
         location_license = LocationLicense.objects.get(license_ptr_id = id)
+        customers        = {location_license.location.customer_id}
         if location:
-            if not location_license.location == location:
-                used_product = UsedSoftwareProduct.objects.get(
-                    location = location,
-                    product  = module.product,
-                )
-                used_product.location = location
-                used_product.save()
+            customers.add(location.customer_id)
             location_license.key         = key
             location_license.detail      = detail
             location_license.start_date  = start_date
@@ -1030,15 +2174,11 @@ class LicenseController:
                 module      = module,
                 customer    = customer,
             )
-            up_status = LicenseController.__create_used_products_for_customer(
-                customer = customer,
-                module   = module,
-            )
-            if up_status:
-                location_license.delete()
-                customer_license.save()
+            customers.add(customer.id)
+            location_license.delete()
+            customer_license.save()
 
-        return status
+        return UsedSoftwareProductController.reconcile_customers(customers)
 
     @staticmethod
     def __edit_customer_license(id: int, key: str, detail: str,
@@ -1061,22 +2201,17 @@ class LicenseController:
         Returns:
         Status: edit status
         """
-        status = Status(True)
         customer_license = CustomerLicense.objects.get(license_ptr_id = id)
+        customers        = {customer_license.customer_id}
         if customer:
-            if not customer_license.customer == customer:
-                status = LicenseController.__delete_used_products_for_customer(
-                    customer = customer,
-                    module   = module,
-                )
-            if status.status:
-                customer_license.key         = key
-                customer_license.detail      = detail
-                customer_license.start_date  = start_date
-                customer_license.end_date    = end_date
-                customer_license.module      = module
-                customer_license.customer    = customer
-                customer_license.save()
+            customers.add(customer.id)
+            customer_license.key         = key
+            customer_license.detail      = detail
+            customer_license.start_date  = start_date
+            customer_license.end_date    = end_date
+            customer_license.module      = module
+            customer_license.customer    = customer
+            customer_license.save()
         else:
             location_license = LocationLicense(
                 id          = id,
@@ -1087,79 +2222,11 @@ class LicenseController:
                 module      = module,
                 location    = location,
             )
-            status = LicenseController.__delete_used_products_for_customer(
-                customer         = location.customer,
-                module           = module,
-                location_to_keep = location,
-            )
-            if status.status:
-                customer_license.delete()
-                location_license.save()
-        
-        return status
-
-    @staticmethod
-    def __delete_used_products_for_customer(customer, module, location_to_keep = None) -> Status:
-        """
-        Deletes the used products for the customers.
-        You can optionally pass a location to keep.
-
-        Parameters:
-        customer         (Customer)      : customer the used products should be deleted
-        module           (SoftwareModule): software module
-        location_to_keep (Location)      : location to keep
-
-        Returns:
-        Status: delete status
-        """
-        status        = Status(True)
-        location_kept = False
-        locations     = Location.objects.filter(customer = customer)
-        for location in locations:
-            if location_to_keep and location_to_keep == location:
-                location_kept = True
-                continue
-            try:
-                used_product = UsedSoftwareProduct.objects.get(
-                    location = location,
-                    product  = module.product,
-                )
-                used_product.delete()
-            except:
-                status.status = False
-                break
-        if status.status and location_to_keep and not location_kept:
-            status = LicenseController.__create_used_product(
-                location = location_to_keep,
-                module   = module,
-            )
-
-        return status
-
-    @staticmethod
-    def __delete_redundant_used_product(location, module):
-        """
-        Deletes the used product of the given location-module-combination if it's redundant.
+            customers.add(location.customer_id)
+            customer_license.delete()
+            location_license.save()
 
-        Parameters:
-        location (Location)      : customer's location
-        module   (SoftwareModule): software module
-        """
-        location_licenses = LocationLicense.objects.filter(
-            location = location,
-            module   = module,
-        )
-        customer_licenses = CustomerLicense.objects.filter(
-            customer = location.customer,
-            module   = module,
-        )
-        amount = len(location_licenses) + len(customer_licenses)
-        if amount < 2:
-            used_product = UsedSoftwareProduct.objects.get(
-                location = location,
-                product  = module.product,
-            )
-            used_product.delete()
+        return UsedSoftwareProductController.reconcile_customers(customers)
 
 
 class SoftwareProductController:
@@ -1187,6 +2254,19 @@ class SoftwareProductController:
 
         return list(products)
 
+    @staticmethod
+    def get_product_names(limit: int = LIMIT) -> list:
+        """
+        Returns all software product names as list.
+
+        Parameters:
+        limit (int): Maximum number of objects to load (default: 1000)
+
+        Returns:
+        list: software product names
+        """
+        return list(SoftwareProduct.objects.all()[:limit].values('id', 'name'))
+
 
 class SoftwareModuleController:
     """
@@ -1225,3 +2305,462 @@ class SoftwareModuleController:
             modules = SoftwareModule.objects.filter(name__iexact = word).values('id', 'name', 'product__name')
 
         return list(modules)
+
+
+class UsedSoftwareProductController:
+    """
+    The 'UsedSoftwareProductController' manages the used software product model.
+    The used software products are derived from the location and customer licenses.
+    """
+
+    @staticmethod
+    def reconcile(customer: int = 0) -> Status:
+        """
+        Creates the missing and deletes the redundant used software products.
+        The needed location-product-combinations are loaded by a single query of all location and customer licenses.
+        Duplicates of a combination are deleted too, their heartbeats are moved to the used product which is kept.
+        Pass a customer id to reconcile only the customer's locations, otherwise all used software products are reconciled.
+
+        Parameters:
+        customer (int): id of the customer to reconcile
+
+        Returns:
+        Status: reconcile status
+        """
+        status            = Status(True, 'Die genutzten Softwareprodukte wurden erfolgreich abgeglichen.')
+        location_licenses = LocationLicense.objects.filter(replace_license__isnull = True)
+        customer_licenses = CustomerLicense.objects.filter(
+            replace_license__isnull    = True,
+            customer__location__isnull = False,
+        )
+        used_products     = UsedSoftwareProduct.objects.all()
+        if customer:
+            location_licenses = location_licenses.filter(location__customer = customer)
+            customer_licenses = customer_licenses.filter(customer = customer)
+            used_products     = used_products.filter(location__customer = customer)
+
+        needed = set(location_licenses.values_list('location_id', 'module__product_id').union(
+            customer_licenses.values_list('customer__location__id', 'module__product_id'),
+        ))
+        existing   = {}
+        redundant  = []
+        duplicates = {}
+        locations  = {}
+        for id, location, product in used_products.values_list('id', 'location_id', 'product_id').order_by('id'):
+            locations[id] = location
+            if (location, product) not in needed:
+                redundant.append(id)
+            elif (location, product) in existing:
+                duplicates[id] = existing[(location, product)]
+            else:
+                existing[(location, product)] = id
+
+        missing  = needed - set(existing)
+        versions = dict(SoftwareProduct.objects.filter(
+            id__in = {product for location, product in missing},
+        ).values_list('id', 'version'))
+
+        # created used products have no heartbeat yet, deleted duplicates count as missing after their heartbeats got moved,
+        # so the missing heartbeats are corrected by the duplicates which had a recent one and the used products they are moved to
+        missing_heartbeats = {}
+        for location, product in missing:
+            missing_heartbeats[location] = missing_heartbeats.get(location, 0) + 1
+        if duplicates:
+            recent = set(Heartbeat.objects.filter(
+                used_product_id__in = set(duplicates) | set(duplicates.values()),
+                last_received__gte  = datetime.now(timezone.utc) - HEARTBEAT_DURATION,
+            ).values_list('used_product_id', flat = True))
+            for id in {duplicates[duplicate] for duplicate in recent & set(duplicates)} - recent:
+                missing_heartbeats[locations[id]] = missing_heartbeats.get(locations[id], 0) - 1
+            for duplicate in recent & set(duplicates):
+                missing_heartbeats[locations[duplicate]] = missing_heartbeats.get(locations[duplicate], 0) + 1
+        try:
+            with transaction.atomic():
+                # the heartbeats of duplicates are kept by moving them to the used product which stays
+                if duplicates:
+                    Heartbeat.objects.filter(used_product_id__in = duplicates).update(used_product_id = Case(
+                        *[When(used_product_id = duplicate, then = Value(id)) for duplicate, id in duplicates.items()],
+                        output_field = IntegerField(),
+                    ))
+                UsedSoftwareProduct.objects.filter(id__in = redundant + list(duplicates)).delete()
+                UsedSoftwareProduct.objects.bulk_create([
+                    UsedSoftwareProduct(
+                        version     = versions[product],
+                        location_id = location,
+                        product_id  = product,
+                    ) for location, product in missing
+                ])
+                if missing:
+                    Customer.objects.filter(
+                        location__in = {location for location, product in missing},
+                    ).update(revision = F('revision') + 1)
+                UsedSoftwareProductController.__add_missing_heartbeats(missing_heartbeats)
+        except:
+            status.set_unexpected()
+
+        return status
+
+    @staticmethod
+    def __add_missing_heartbeats(deltas: dict):
+        """
+        Adds changed amounts of missing heartbeats to the counts of the customers of the given locations.
+        The used products created by 'bulk_create' send no signals, so their customers can't be counted by them.
+
+        Parameters:
+        deltas (dict): change of the amount of missing heartbeats by location id
+        """
+        customers = {}
+        for location, customer in Location.objects.filter(id__in = [location for location, delta in deltas.items() if delta]).values_list('id', 'customer_id'):
+            customers[customer] = customers.get(customer, 0) + deltas[location]
+
+        by_delta = {}
+        for customer, delta in customers.items():
+            if delta:
+                by_delta.setdefault(delta, []).append(customer)
+        for delta, ids in by_delta.items():
+            CustomerStats.objects.filter(customer_id__in = ids).update(missing_heartbeats = F('missing_heartbeats') + delta)
+        if by_delta:
+            cache.delete(CUSTOMER_INDEX_CACHE_KEY)
+
+    @staticmethod
+    def reconcile_customers(customers: set) -> Status:
+        """
+        Reconciles the used software products of all given customers.
+
+        Parameters:
+        customers (set): ids of the customers to reconcile
+
+        Returns:
+        Status: reconcile status
+        """
+        status = Status(True)
+        for customer in customers:
+            if customer:
+                status = UsedSoftwareProductController.reconcile(customer = customer)
+                if not status.status:
+                    break
+
+        return status
+
+
+class LicenseEventController:
+    """
+    The 'LicenseEventController' manages the journal of license changes.
+    The events are collected in a buffer after the transaction of the change was committed and written in batches:
+    When the buffer is full, at the end of every request and when the process exits.
+    """
+    _buffer = []
+    _lock   = threading.Lock()
+    _local  = threading.local()
+
+    @staticmethod
+    def set_user(user):
+        """
+        Sets the user who is changing licenses in the current thread.
+
+        Parameters:
+        user (User): current user, 'None' to reset
+        """
+        LicenseEventController._local.user = user if user and user.is_authenticated else None
+
+    @staticmethod
+    def record(action: str, license: License):
+        """
+        Records a change of a license.
+        The event is written once the current transaction is committed.
+
+        Parameters:
+        action  (str)    : 'created', 'changed' or 'deleted'
+        license (License): changed license
+        """
+        if hasattr(license, 'customer_id'):
+            customer = license.customer_id
+        elif hasattr(license, 'location_id'):
+            customer = Location.objects.filter(id = license.location_id).values_list('customer_id', flat = True).first()
+        else:
+            customer = License.objects.filter(id = license.id).values_list(
+                Coalesce('customerlicense__customer_id', 'locationlicense__location__customer_id'),
+                flat = True,
+            ).first()
+        event = LicenseEvent(
+            created  = datetime.now(timezone.utc),
+            action   = action,
+            license  = license.id,
+            customer = customer,
+            key      = license.key,
+            end_date = license.end_date,
+            user     = getattr(LicenseEventController._local, 'user', None),
+        )
+        transaction.on_commit(lambda: LicenseEventController.__add(event))
+
+    @staticmethod
+    def record_purged(customer: int, licenses: list):
+        """
+        Records the deletion of licenses of a purged customer at once.
+        The events are written once the current transaction is committed.
+
+        Parameters:
+        customer (int) : id of the purged customer
+        licenses (list): id, key and end date of the purged licenses
+        """
+        created = datetime.now(timezone.utc)
+        events  = [LicenseEvent(
+            created  = created,
+            action   = LicenseEvent.DELETED,
+            license  = license['id'],
+            customer = customer,
+            key      = license['key'],
+            end_date = license['end_date'],
+        ) for license in licenses]
+        transaction.on_commit(lambda: [LicenseEventController.__add(event) for event in events])
+
+    @staticmethod
+    def flush():
+        """
+        Writes all buffered events.
+        If they can't be written, the error is logged and the events are kept in the buffer to be written with the next flush.
+        """
+        with LicenseEventController._lock:
+            events                         = LicenseEventController._buffer
+            LicenseEventController._buffer = []
+        if events:
+            try:
+                LicenseEvent.objects.bulk_create(events, batch_size = LICENSE_EVENT_BATCH_SIZE)
+            except Exception:
+                logger.exception('%s license events could not be written, they are kept for the next flush.', len(events))
+                with LicenseEventController._lock:
+                    LicenseEventController._buffer = events + LicenseEventController._buffer
+
+    @staticmethod
+    def read(license: int = 0, customer: int = 0, since: str = '', until: str = '', limit: int = LIMIT) -> list:
+        """
+        Returns the latest events filtered by license, customer and time range.
+
+        Parameters:
+        license  (int): id of the license
+        customer (int): id of the customer
+        since    (str): earliest date of the events
+        until    (str): latest date of the events
+        limit    (int): Maximum number of objects to load (default: 1000)
+
+        Returns:
+        list: events
+        """
+        events = LicenseEvent.objects.all()
+        if license:
+            events = events.filter(license = license)
+        if customer:
+            events = events.filter(customer = customer)
+        try:
+            if since:
+                events = events.filter(created__gte = datetime.strptime(since, DATE_TYPE_JS).replace(tzinfo = timezone.utc))
+            if until:
+                events = events.filter(created__lt = datetime.strptime(until, DATE_TYPE_JS).replace(tzinfo = timezone.utc) + timedelta(days = 1))
+        except:
+            return []
+
+        journal = []
+        for event in events.order_by('-created', '-id').values(
+            'created', 'action', 'license', 'customer', 'key', 'end_date', 'user__username',
+        )[:limit]:
+            journal.append({
+                'created' : event['created'].strftime(DATETIME_TYPE),
+                'action'  : event['action'],
+                'license' : event['license'],
+                'customer': event['customer'],
+                'key'     : event['key'],
+                'end_date': event['end_date'].strftime(DATE_TYPE),
+                'user'    : event['user__username'] or '',
+            })
+
+        return journal
+
+    @staticmethod
+    def __add(event: LicenseEvent):
+        """
+        Adds an event to the buffer and writes the buffer if it is full.
+
+        Parameters:
+        event (LicenseEvent): event to add
+        """
+        with LicenseEventController._lock:
+            LicenseEventController._buffer.append(event)
+            full = len(LicenseEventController._buffer) >= LICENSE_EVENT_BATCH_SIZE
+        if full:
+            LicenseEventController.flush()
+
+
+atexit.register(LicenseEventController.flush)
+
+
+class LicenseTokenController:
+    """
+    The 'LicenseTokenController' issues signed license tokens the customer's license script can verify offline.
+    A token consists of the base64 encoded header, payload and signature, separated by dots.
+    With the optional package 'cryptography' the tokens are signed with Ed25519 and verified with the published public keys.
+    Without it they are signed with HMAC-SHA256, which the license script can't verify, so it contacts the management portal every time.
+    """
+
+    @staticmethod
+    def issue(key: str) -> str:
+        """
+        Issues a token for the license with the given key.
+        The token expires with the license, but at the latest after LICENSE_TOKEN_LIFETIME.
+        It is cached for half of its lifetime, so the script always gets a token which is valid for a while,
+        and reissued earlier when the signing key was rotated. Saving or deleting the license removes it from the cache.
+
+        Parameters:
+        key (str): license key
+
+        Returns:
+        str: token, empty if the license doesn't exist or is expired
+        """
+        cache_key = LicenseTokenController.get_token_cache_key(key = key)
+        cached    = cache.get(cache_key)
+        if cached is not None and (not cached['token'] or cached['kid'] == cache.get(LICENSE_SIGNING_KID_CACHE_KEY)):
+            return cached['token']
+
+        license = LicenseController.get_active_licenses().filter(key = key).values(
+            'key', 'module_id', 'start_date', 'end_date', 'customerlicense__customer_id', 'locationlicense__location_id',
+        ).first()
+        current_date = datetime.now(timezone.utc)
+        if not license or license['end_date'] <= current_date:
+            cache.set(cache_key, {'token': '', 'kid': ''}, LICENSE_HEARTBEAT_CACHE_TIMEOUT.total_seconds())
+            return ''
+
+        signing_key = LicenseTokenController.get_signing_key()
+        expires     = min(license['end_date'], current_date + LICENSE_TOKEN_LIFETIME)
+        header      = {
+            'alg': signing_key.algorithm,
+            'kid': signing_key.kid,
+        }
+        payload     = {
+            'key'     : license['key'],
+            'module'  : license['module_id'],
+            'customer': license['customerlicense__customer_id'],
+            'location': license['locationlicense__location_id'],
+            'start'   : int(license['start_date'].timestamp()),
+            'end'     : int(license['end_date'].timestamp()),
+            'iat'     : int(current_date.timestamp()),
+            'exp'     : int(expires.timestamp()),
+        }
+        message     = LicenseTokenController.__encode(json.dumps(header).encode()) + '.' + \
+            LicenseTokenController.__encode(json.dumps(payload).encode())
+        token       = message + '.' + LicenseTokenController.__encode(LicenseTokenController.__sign(signing_key, message.encode()))
+
+        cache.set(cache_key, {'token': token, 'kid': signing_key.kid}, max((expires - current_date).total_seconds() / 2, 1))
+
+        return token
+
+    @staticmethod
+    def get_token_cache_key(key: str) -> str:
+        """
+        Returns the cache key of the token of the license with the given key.
+
+        Parameters:
+        key (str): license key
+
+        Returns:
+        str: cache key
+        """
+        return 'license_token_' + hashlib.sha256(key.encode()).hexdigest()
+
+    @staticmethod
+    def get_signing_key() -> LicenseSigningKey:
+        """
+        Returns the key new tokens are signed with. Creates one if none exists.
+        With the package 'cryptography' only Ed25519 keys are used, without it only HMAC keys.
+        A process without the package must not replace an active Ed25519 key the other processes sign with,
+        so it raises an error instead of creating a HMAC key.
+
+        Returns:
+        LicenseSigningKey: newest active signing key of the usable algorithm
+        """
+        algorithm    = LicenseSigningKey.EDDSA if Ed25519PrivateKey else LicenseSigningKey.HS256
+        signing_keys = LicenseSigningKey.objects.filter(retired__isnull = True).order_by('-created', '-id')
+        signing_key  = signing_keys.filter(algorithm = algorithm).first()
+        if not signing_key:
+            if algorithm == LicenseSigningKey.HS256 and signing_keys.filter(algorithm = LicenseSigningKey.EDDSA).exists():
+                logger.error('License tokens are signed with Ed25519, but the package cryptography is not installed in this process.')
+                raise ImproperlyConfigured('The package cryptography is required to sign license tokens with Ed25519.')
+            signing_key = LicenseTokenController.rotate()
+        cache.set(LICENSE_SIGNING_KID_CACHE_KEY, signing_key.kid, LICENSE_HEARTBEAT_CACHE_TIMEOUT.total_seconds())
+
+        return signing_key
+
+    @staticmethod
+    def get_public_keys() -> list:
+        """
+        Returns the public keys to verify tokens with.
+        Retired keys are included until all tokens signed with them expired.
+
+        Returns:
+        list: key id, algorithm and public key of all keys
+        """
+        keys = LicenseSigningKey.objects.filter(
+            Q(retired__isnull = True) | Q(retired__gt = datetime.now(timezone.utc) - LICENSE_TOKEN_LIFETIME),
+        ).order_by('-created', '-id').values('kid', 'algorithm', 'public')
+
+        return list(keys)
+
+    @staticmethod
+    def rotate() -> LicenseSigningKey:
+        """
+        Creates a new signing key and retires the previous ones of the same algorithm.
+        Keys of the other algorithm are kept, a process can't use them anyway.
+
+        Returns:
+        LicenseSigningKey: new signing key
+        """
+        if Ed25519PrivateKey:
+            private_key = Ed25519PrivateKey.generate()
+            algorithm   = LicenseSigningKey.EDDSA
+            private     = private_key.private_bytes(Encoding.Raw, PrivateFormat.Raw, NoEncryption())
+            public      = base64.b64encode(private_key.public_key().public_bytes(Encoding.Raw, PublicFormat.Raw)).decode()
+        else:
+            algorithm   = LicenseSigningKey.HS256
+            private     = secrets.token_bytes(32)
+            public      = ''
+
+        with transaction.atomic():
+            LicenseSigningKey.objects.filter(retired__isnull = True, algorithm = algorithm).update(retired = datetime.now(timezone.utc))
+            signing_key = LicenseSigningKey.objects.create(
+                kid       = secrets.token_hex(8),
+                algorithm = algorithm,
+                private   = base64.b64encode(private).decode(),
+                public    = public,
+            )
+        cache.set(LICENSE_SIGNING_KID_CACHE_KEY, signing_key.kid, LICENSE_HEARTBEAT_CACHE_TIMEOUT.total_seconds())
+
+        return signing_key
+
+    @staticmethod
+    def __sign(signing_key: LicenseSigningKey, message: bytes) -> bytes:
+        """
+        Signs a message with the given signing key.
+
+        Parameters:
+        signing_key (LicenseSigningKey): key to sign with
+        message     (bytes)            : message to sign
+
+        Returns:
+        bytes: signature
+        """
+        private = base64.b64decode(signing_key.private)
+        if signing_key.algorithm == LicenseSigningKey.EDDSA:
+            return Ed25519PrivateKey.from_private_bytes(private).sign(message)
+
+        return hmac.new(private, message, hashlib.sha256).digest()
+
+    @staticmethod
+    def __encode(data: bytes) -> str:
+        """
+        Encodes data as base64 for URLs without padding.
+
+        Parameters:
+        data (bytes): data to encode
+
+        Returns:
+        str: encoded data
+        """
+        return base64.urlsafe_b64encode(data).decode().rstrip('=')
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from licenses.controllers import UsedSoftwareProductController
+
+class Command(BaseCommand):
+    """
+    Creates the missing and deletes the redundant used software products of all or a single customer.
+    """
+    help = 'Creates the missing and deletes the redundant used software products.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--customer',
+            type    = int,
+            default = 0,
+            help    = 'Id of the customer to reconcile',
+        )
+
+    def handle(self, *args, **options):
+        status = UsedSoftwareProductController.reconcile(customer = options['customer'])
+        self.stdout.write(status.message)
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from licenses.controllers import LicenseController
+from management_portal.constants import ROLLOVER_BATCH_SIZE
+
+class Command(BaseCommand):
+    """
+    Replaces all expired licenses by their future licenses.
+    Should be executed periodically, e.g. once an hour by cron.
+    """
+    help = 'Replaces all expired licenses by their future licenses.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type    = int,
+            default = ROLLOVER_BATCH_SIZE,
+            help    = 'Amount of licenses to replace per transaction',
+        )
+
+    def handle(self, *args, **options):
+        result = LicenseController.rollover(batch_size = options['batch_size'])
+        self.stdout.write('{} Lizenzen wurden ersetzt.'.format(result['replaced']))
+        if result['failed']:
+            raise CommandError('{} Lizenzen konnten nicht ersetzt werden, siehe Log.'.format(result['failed']))
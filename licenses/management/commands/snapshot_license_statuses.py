@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from licenses.controllers import LicenseController
+
+class Command(BaseCommand):
+    """
+    Stores the amount of licenses per status of today for the license history on the homepage.
+    Should be executed once a day by cron.
+    """
+    help = 'Stores the amount of licenses per status of today.'
+
+    def handle(self, *args, **options):
+        count = LicenseController.take_status_snapshot()
+        self.stdout.write('{} Snapshots wurden gespeichert.'.format(count))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from licenses.controllers import LicenseController
+
+class Command(BaseCommand):
+    """
+    Recomputes the amount of licenses per status shown on the homepage.
+    Should be executed periodically, e.g. once a day by cron, so licenses expiring by time are counted.
+    """
+    help = 'Recomputes the amount of licenses per status.'
+
+    def handle(self, *args, **options):
+        counts = LicenseController.update_status_counts()
+        for status, count in counts.items():
+            self.stdout.write('{}: {}'.format(status, count))
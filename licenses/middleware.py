@@ -0,0 +1,20 @@
+from .controllers import LicenseEventController
+
+
+class LicenseEventMiddleware:
+    """
+    Remembers the user of the request for the license journal and writes the buffered license events after the request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        LicenseEventController.set_user(getattr(request, 'user', None))
+        try:
+            response = self.get_response(request)
+        finally:
+            LicenseEventController.set_user(None)
+            LicenseEventController.flush()
+
+        return response
@@ -0,0 +1,27 @@
+# Generated by Django 3.1.14 on 2026-10-18 22:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0003_auto_20201215_1118'),
+        ('licenses', '0005_customerlicense_replace_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReplaceAcknowledgement',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('acknowledged', models.DateTimeField(auto_now_add=True)),
+                ('license', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='replace_acknowledgements', related_query_name='replace_acknowledgement', to='licenses.customerlicense')),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='replace_acknowledgements', related_query_name='replace_acknowledgement', to='customers.location')),
+            ],
+            options={
+                'unique_together': {('license', 'location')},
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.1.14 on 2026-10-18 22:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('licenses', '0006_replaceacknowledgement'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='license',
+            name='previous_key',
+            field=models.CharField(db_index=True, max_length=255, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='license',
+            index=models.Index(fields=['end_date'], name='licenses_li_end_dat_5f3c83_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 3.1.14 on 2026-10-18 22:16
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('licenses', '0007_license_previous_key_end_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LicenseEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField()),
+                ('action', models.CharField(max_length=16)),
+                ('license', models.IntegerField()),
+                ('customer', models.IntegerField(null=True)),
+                ('key', models.CharField(max_length=255)),
+                ('end_date', models.DateTimeField()),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='license_events', related_query_name='license_event', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='licenseevent',
+            index=models.Index(fields=['license', 'created'], name='licenses_li_license_d47840_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='licenseevent',
+            index=models.Index(fields=['customer', 'created'], name='licenses_li_custome_9720dd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='licenseevent',
+            index=models.Index(fields=['created'], name='licenses_li_created_9eb5b8_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.1.14 on 2026-10-18 22:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('licenses', '0008_license_event'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LicenseSigningKey',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kid', models.CharField(max_length=32, unique=True)),
+                ('algorithm', models.CharField(max_length=8)),
+                ('private', models.CharField(max_length=255)),
+                ('public', models.CharField(blank=True, max_length=255)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('retired', models.DateTimeField(null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.1.14 on 2026-10-18 22:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('licenses', '0009_license_signing_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LicenseStatusCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(max_length=16, unique=True)),
+                ('count', models.IntegerField(default=0)),
+                ('valid_until', models.DateTimeField(null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.1.14 on 2026-10-18 22:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('licenses', '0010_license_status_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LicenseStatusSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('dimension', models.CharField(max_length=16)),
+                ('object', models.IntegerField(default=0)),
+                ('valid', models.IntegerField(default=0)),
+                ('expiring', models.IntegerField(default=0)),
+                ('expired', models.IntegerField(default=0)),
+                ('replaced', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('dimension', 'object', 'date')},
+            },
+        ),
+    ]
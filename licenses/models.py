@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 from management_portal.constants import LIMIT, DATE_TYPE, DATE_TYPE_JS, LICENSE_EXPIRE_WARNING
 
@@ -13,6 +14,7 @@ class License(models.Model):
     end_date        (datetime): The end date of the license
     module          (int)     : Foreign key for the software module the license is for
     replace_license (int)     : Foreign key for the license this one should replace in the future
+    previous_key    (str)     : The key of the license which was replaced by this one on the server
     """
     key             = models.CharField(max_length = 255, unique = True)
     detail          = models.CharField(max_length = 2047)
@@ -32,6 +34,34 @@ class License(models.Model):
         related_query_name  = 'license',
         null                = True,
     )
+    previous_key    = models.CharField(max_length = 255, null = True, db_index = True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields = ['end_date']),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Remembers the key, end date and replaced license a license was loaded with,
+        because their cached information and precomputed status gets outdated by a change too.
+        """
+        license                            = super().from_db(db, field_names, values)
+        license._loaded_key                = license.__dict__.get('key')
+        license._loaded_end_date           = license.__dict__.get('end_date')
+        license._loaded_replace_license_id = license.__dict__.get('replace_license_id')
+
+        return license
+
+    def save(self, *args, **kwargs):
+        """
+        Saves the license and remembers the saved values as the loaded ones, so a later save is compared with them.
+        """
+        super().save(*args, **kwargs)
+        self._loaded_key                = self.key
+        self._loaded_end_date           = self.end_date
+        self._loaded_replace_license_id = self.replace_license_id
 
     def stringify_dates(self, use_slash: bool = False):
         """
@@ -149,3 +179,143 @@ class SoftwareModule(models.Model):
 
     def __str__(self):
         return self.name
+
+class ReplaceAcknowledgement(models.Model):
+    """
+    The model 'ReplaceAcknowledgement' records that a customer's location has switched to the future customer license.
+    Every location can acknowledge a future license only once.
+
+    Attributes:
+    acknowledged (datetime): The date when the location acknowledged the replacement
+    license      (int)     : Foreign key for the future customer license
+    location     (int)     : Foreign key for the customer's location which acknowledged the replacement
+    """
+    acknowledged = models.DateTimeField(auto_now_add = True)
+    license      = models.ForeignKey(
+        to                  = 'CustomerLicense',
+        on_delete           = models.CASCADE,
+        related_name        = 'replace_acknowledgements',
+        related_query_name  = 'replace_acknowledgement',
+        null                = False,
+    )
+    location     = models.ForeignKey(
+        to                  = 'customers.Location',
+        on_delete           = models.CASCADE,
+        related_name        = 'replace_acknowledgements',
+        related_query_name  = 'replace_acknowledgement',
+        null                = False,
+    )
+
+    class Meta:
+        unique_together = ('license', 'location')
+
+class LicenseEvent(models.Model):
+    """
+    The model 'LicenseEvent' is an entry of the append-only journal of license changes.
+    License and customer are stored as plain ids, so the events are kept after the license or customer got deleted.
+
+    Attributes:
+    created  (datetime): The date when the license was changed
+    action   (str)     : The change: 'created', 'changed' or 'deleted'
+    license  (int)     : The id of the changed license
+    customer (int)     : The id of the customer the license belongs to
+    key      (str)     : The key of the license after the change
+    end_date (datetime): The end date of the license after the change
+    user     (int)     : Foreign key for the user who changed the license
+    """
+    CREATED = 'created'
+    CHANGED = 'changed'
+    DELETED = 'deleted'
+
+    created  = models.DateTimeField()
+    action   = models.CharField(max_length = 16)
+    license  = models.IntegerField()
+    customer = models.IntegerField(null = True)
+    key      = models.CharField(max_length = 255)
+    end_date = models.DateTimeField()
+    user     = models.ForeignKey(
+        to                  = settings.AUTH_USER_MODEL,
+        on_delete           = models.SET_NULL,
+        related_name        = 'license_events',
+        related_query_name  = 'license_event',
+        null                = True,
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields = ['license', 'created']),
+            models.Index(fields = ['customer', 'created']),
+            models.Index(fields = ['created']),
+        ]
+
+class LicenseSigningKey(models.Model):
+    """
+    The model 'LicenseSigningKey' is a key the license tokens are signed with.
+    Only the newest active key signs new tokens, retired keys are still published until their tokens expired.
+
+    Attributes:
+    kid       (str)     : The public identifier of the key
+    algorithm (str)     : The signature algorithm: 'EdDSA' (Ed25519) or 'HS256' (HMAC-SHA256)
+    private   (str)     : The private key or HMAC secret, base64 encoded
+    public    (str)     : The public key, base64 encoded (empty for HMAC)
+    created   (datetime): The date when the key was created
+    retired   (datetime): The date when the key was replaced by a newer one
+    """
+    EDDSA = 'EdDSA'
+    HS256 = 'HS256'
+
+    kid       = models.CharField(max_length = 32, unique = True)
+    algorithm = models.CharField(max_length = 8)
+    private   = models.CharField(max_length = 255)
+    public    = models.CharField(max_length = 255, blank = True)
+    created   = models.DateTimeField(auto_now_add = True)
+    retired   = models.DateTimeField(null = True)
+
+class LicenseStatusCount(models.Model):
+    """
+    The model 'LicenseStatusCount' is the precomputed amount of current licenses with a status.
+    License changes are added to it as they happen, it is recomputed when the status of a license changes by time.
+
+    Attributes:
+    status      (str)     : The status: 'valid', 'expiring', 'expired' or 'replaced'
+    count       (int)     : The amount of current licenses with the status
+    valid_until (datetime): The date when the first license changes its status by time
+    """
+    VALID    = 'valid'
+    EXPIRING = 'expiring'
+    EXPIRED  = 'expired'
+    REPLACED = 'replaced'
+    STATUSES = [VALID, EXPIRING, EXPIRED, REPLACED]
+
+    status      = models.CharField(max_length = 16, unique = True)
+    count       = models.IntegerField(default = 0)
+    valid_until = models.DateTimeField(null = True)
+
+class LicenseStatusSnapshot(models.Model):
+    """
+    The model 'LicenseStatusSnapshot' is the amount of current licenses per status at a day.
+    There is a snapshot for all licenses and one per software product and per customer.
+
+    Attributes:
+    date      (date): The day of the snapshot
+    dimension (str) : What the licenses are grouped by: 'total', 'product' or 'customer'
+    object    (int) : The id of the software product or customer, 0 for all licenses
+    valid     (int) : The amount of valid licenses
+    expiring  (int) : The amount of licenses expiring soon
+    expired   (int) : The amount of expired licenses
+    replaced  (int) : The amount of licenses with a future license
+    """
+    TOTAL    = 'total'
+    PRODUCT  = 'product'
+    CUSTOMER = 'customer'
+
+    date      = models.DateField()
+    dimension = models.CharField(max_length = 16)
+    object    = models.IntegerField(default = 0)
+    valid     = models.IntegerField(default = 0)
+    expiring  = models.IntegerField(default = 0)
+    expired   = models.IntegerField(default = 0)
+    replaced  = models.IntegerField(default = 0)
+
+    class Meta:
+        unique_together = ('dimension', 'object', 'date')
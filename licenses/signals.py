@@ -0,0 +1,127 @@
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from management_portal.general import PurgeState
+from .controllers import LicenseController, LicenseEventController, LicenseTokenController
+from .models import CustomerLicense, License, LicenseEvent, LocationLicense
+
+
+@receiver([post_save, post_delete], sender = License)
+@receiver([post_save, post_delete], sender = CustomerLicense)
+@receiver([post_save, post_delete], sender = LocationLicense)
+def invalidate_license_state(sender, instance, **kwargs):
+    """
+    Removes the cached states and tokens of a saved or deleted license, of the key it was loaded with and of the license it replaces.
+    Licenses are also saved as 'License' (e.g. by the rollover), so the parent model is connected as well.
+
+    Parameters:
+    sender   (type)   : model class of the saved or deleted instance
+    instance (License): saved or deleted license
+    """
+    if PurgeState.is_purging():
+        return
+    keys = [instance.key, getattr(instance, '_loaded_key', None)]
+    if instance.replace_license_id:
+        if License.replace_license.is_cached(instance):
+            keys.append(instance.replace_license.key)
+        else:
+            keys.append(License.objects.filter(id = instance.replace_license_id).values_list('key', flat = True).first())
+
+    keys = [key for key in keys if key]
+    cache.delete_many(
+        [LicenseController.get_state_cache_key(key = key) for key in keys] +
+        [LicenseTokenController.get_token_cache_key(key = key) for key in keys]
+    )
+
+@receiver([post_save, post_delete], sender = License)
+@receiver([post_save, post_delete], sender = CustomerLicense)
+@receiver([post_save, post_delete], sender = LocationLicense)
+def invalidate_license_settings(sender, instance, **kwargs):
+    """
+    Removes the cached settings of a saved or deleted license and of the licenses it replaces or replaced when it was loaded.
+
+    Parameters:
+    sender   (type)   : model class of the saved or deleted instance
+    instance (License): saved or deleted license
+    """
+    if PurgeState.is_purging():
+        return
+    ids = {instance.id, instance.replace_license_id, getattr(instance, '_loaded_replace_license_id', None)}
+    cache.delete_many([LicenseController.get_settings_cache_key(id = id) for id in ids if id])
+
+@receiver(post_save, sender = License)
+@receiver(post_save, sender = CustomerLicense)
+@receiver(post_save, sender = LocationLicense)
+def record_license_save(sender, instance, created, **kwargs):
+    """
+    Records the creation or change of a license in the license journal.
+
+    Parameters:
+    sender   (type)   : model class of the saved instance
+    instance (License): saved license
+    created  (bool)   : if the license was created
+    """
+    LicenseEventController.record(
+        action  = LicenseEvent.CREATED if created else LicenseEvent.CHANGED,
+        license = instance,
+    )
+
+@receiver(post_delete, sender = CustomerLicense)
+@receiver(post_delete, sender = LocationLicense)
+def record_license_delete(sender, instance, **kwargs):
+    """
+    Records the deletion of a license in the license journal.
+    The deletion of a customer or location license also deletes its parent license, which is not connected, so it isn't recorded twice.
+    Licenses of purged customers are recorded by the purge in bulk.
+
+    Parameters:
+    sender   (type)   : model class of the deleted instance
+    instance (License): deleted license
+    """
+    if PurgeState.is_purging():
+        return
+    LicenseEventController.record(
+        action  = LicenseEvent.DELETED,
+        license = instance,
+    )
+
+@receiver(post_save, sender = License)
+@receiver(post_save, sender = CustomerLicense)
+@receiver(post_save, sender = LocationLicense)
+def count_license_save(sender, instance, created, **kwargs):
+    """
+    Adds the status changes caused by a saved license to the precomputed amounts of licenses per status.
+
+    Parameters:
+    sender   (type)   : model class of the saved instance
+    instance (License): saved license
+    created  (bool)   : if the license was created
+    """
+    LicenseController.count_saved_license(license = instance, created = created)
+
+@receiver(pre_delete, sender = License)
+def remember_stored_licenses(sender, instance, **kwargs):
+    """
+    Remembers the stored license and its future licenses before it gets deleted, because the deletion removes their reference to it.
+    Every deleted license also deletes its parent license, so only the parent model is connected.
+
+    Parameters:
+    sender   (type)   : model class of the deleted instance
+    instance (License): deleted license
+    """
+    if PurgeState.is_purging():
+        return
+    instance._stored_licenses = LicenseController.get_stored_licenses(license = instance)
+
+@receiver(post_delete, sender = License)
+def count_license_delete(sender, instance, **kwargs):
+    """
+    Adds the status changes caused by a deleted license to the precomputed amounts of licenses per status.
+
+    Parameters:
+    sender   (type)   : model class of the deleted instance
+    instance (License): deleted license
+    """
+    if PurgeState.is_purging():
+        return
+    LicenseController.count_deleted_license(license = instance, stored_licenses = getattr(instance, '_stored_licenses', []))
@@ -1,3 +1,480 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DatabaseError, connection
+from django.test import Client, TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from datetime import datetime, timezone
+from threading import Thread
+from unittest import mock, skipIf
+import base64
+import io
+import json
 
-# Create your tests here.
+try:
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+except ImportError:
+    Ed25519PublicKey = None
+
+from customers.controllers import CustomerController
+from customers.models import Customer, Location
+from management_portal.constants import LICENSE_COLUMNS
+from heartbeat.models import Heartbeat
+from .controllers import LicenseController, LicenseEventController, LicenseTokenController, UsedSoftwareProductController
+from .models import CustomerLicense, License, LicenseEvent, LicenseSigningKey, LicenseStatusCount, LicenseStatusSnapshot, LocationLicense, ReplaceAcknowledgement, SoftwareModule, SoftwareProduct, UsedSoftwareProduct
+
+
+def create_customer_licenses(location_count: int) -> Customer:
+    """
+    Creates a customer with the given amount of locations, a customer license and its future license.
+
+    Parameters:
+    location_count (int): amount of locations to create
+
+    Returns:
+    Customer: customer
+    """
+    customer = Customer.objects.create(customer_number = '1', name = 'Kunde')
+    for i in range(location_count):
+        Location.objects.create(
+            name          = 'Standort ' + str(i),
+            email_address = 'standort@example.com',
+            phone_number  = '0123',
+            street        = 'Straße',
+            house_number  = str(i),
+            postcode      = '12345',
+            city          = 'Stadt',
+            customer      = customer,
+        )
+    product     = SoftwareProduct.objects.create(name = 'Produkt', category = 'Kategorie', version = '1.0')
+    module      = SoftwareModule.objects.create(name = 'Modul', product = product)
+    old_license = CustomerLicense.objects.create(
+        key        = 'OLD',
+        detail     = 'Alte Lizenz',
+        start_date = datetime(2020, 1, 1, tzinfo = timezone.utc),
+        end_date   = datetime(2021, 1, 1, tzinfo = timezone.utc),
+        module     = module,
+        customer   = customer,
+    )
+    CustomerLicense.objects.create(
+        key             = 'NEW',
+        detail          = 'Neue Lizenz',
+        start_date      = datetime(2021, 1, 1, tzinfo = timezone.utc),
+        end_date        = datetime(2022, 1, 1, tzinfo = timezone.utc),
+        module          = module,
+        customer        = customer,
+        replace_license = old_license,
+    )
+
+    return customer
+
+
+def create_location_license(location: Location, key: str, end_date: datetime, replace_license: License = None) -> LocationLicense:
+    """
+    Creates a location license for the module of the product 'Produkt'.
+
+    Parameters:
+    location        (Location): location the license belongs to
+    key             (str)     : license key
+    end_date        (datetime): end date of the license
+    replace_license (License) : license the new license replaces in the future
+
+    Returns:
+    LocationLicense: location license
+    """
+    return LocationLicense.objects.create(
+        key             = key,
+        detail          = 'Standortlizenz',
+        start_date      = datetime(2020, 1, 1, tzinfo = timezone.utc),
+        end_date        = end_date,
+        module          = SoftwareModule.objects.get(product__name = 'Produkt'),
+        location        = location,
+        replace_license = replace_license,
+    )
+
+
+class LicenseConflictTest(TestCase):
+
+    def test_existing_combinations(self):
+        customer  = create_customer_licenses(location_count = 2)
+        locations = list(Location.objects.filter(customer = customer).values_list('id', flat = True))
+        module    = SoftwareModule.objects.get().id
+        other     = SoftwareModule.objects.create(name = 'Anderes Modul', product = SoftwareProduct.objects.get()).id
+        LocationLicense.objects.create(
+            key         = 'ANDERES',
+            detail      = 'Standortlizenz',
+            start_date  = datetime(2020, 1, 1, tzinfo = timezone.utc),
+            end_date    = datetime(2099, 1, 1, tzinfo = timezone.utc),
+            module_id   = other,
+            location_id = locations[0],
+        )
+
+        with self.assertNumQueries(1):
+            self.assertIn('Kundenlizenz', LicenseController.get_license_conflict(module = module, customer = customer.id, location = locations[0]))
+        self.assertIn('Standortlizenz', LicenseController.get_license_conflict(module = other, customer = customer.id, location = locations[0]))
+        self.assertEqual(LicenseController.get_license_conflict(module = other, customer = customer.id, location = locations[1]), '')
+        self.assertEqual(LicenseController.get_license_conflict(module = other, customer = customer.id), '')
+
+
+class ExpiryCalendarTest(TestCase):
+
+    def test_buckets_and_bucket_licenses(self):
+        location = Location.objects.get(customer = create_customer_licenses(location_count = 1))
+        renewed  = create_location_license(location, 'MARCH-1', datetime(2030, 3, 5, tzinfo = timezone.utc))
+        create_location_license(location, 'MARCH-1-NEXT', datetime(2031, 3, 5, tzinfo = timezone.utc), replace_license = renewed)
+        create_location_license(location, 'MARCH-2', datetime(2030, 3, 20, tzinfo = timezone.utc))
+        create_location_license(location, 'APRIL', datetime(2030, 4, 10, tzinfo = timezone.utc))
+
+        buckets = LicenseController.get_expiry_calendar(period = 'month', expires_from = '2030-01-01', expires_to = '2030-12-31')
+        self.assertEqual(
+            [(bucket['label'], bucket['count'], bucket['renewed'], bucket['open']) for bucket in buckets],
+            [('03/2030', 2, 1, 1), ('04/2030', 1, 0, 1)],
+        )
+        licenses = LicenseController.get_expiry_bucket(start = buckets[0]['start'], period = 'month')
+        self.assertEqual([(license['key'], license['renewed']) for license in licenses], [('MARCH-1', True), ('MARCH-2', False)])
+        self.assertEqual(LicenseController.get_expiry_calendar(expires_from = 'abc'), [])
+
+
+class LicensePageTest(TestCase):
+
+    def setUp(self):
+        location = Location.objects.get(customer = create_customer_licenses(location_count = 1))
+        for day, key in [(5, 'E'), (1, 'A'), (3, 'C'), (3, 'D'), (2, 'B')]:
+            create_location_license(location, key, datetime(2030, 1, day, tzinfo = timezone.utc))
+
+    def get_keys_by_cursor(self, **kwargs) -> list:
+        keys  = []
+        after = ''
+        while True:
+            page   = LicenseController.get_license_page(length = 2, after = after, **kwargs)
+            keys  += [license['key'] for license in page['licenses']]
+            after  = page['next']
+            if not after:
+                return keys
+
+    def test_cursor_pages_match_ordering(self):
+        self.assertEqual(self.get_keys_by_cursor(status = 'valid'), ['A', 'B', 'C', 'D', 'E'])
+        self.assertEqual(self.get_keys_by_cursor(status = 'valid', descending = True), ['E', 'D', 'C', 'B', 'A'])
+        self.assertEqual(self.get_keys_by_cursor(status = 'valid', order = LICENSE_COLUMNS.index('key'), descending = True), ['E', 'D', 'C', 'B', 'A'])
+
+    def test_filters_and_tampered_cursor(self):
+        page = LicenseController.get_license_page(status = 'renewed')
+        self.assertEqual((page['total'], page['filtered']), (6, 1))
+        self.assertEqual(page['licenses'][0]['key'], 'OLD')
+        self.assertEqual(LicenseController.get_license_page(search = 'c', expires_from = '2030-01-02')['filtered'], 1)
+        self.assertEqual(LicenseController.get_license_page(after = 'tampered')['licenses'], [])
+
+    def test_export_pages_by_keyset(self):
+        with mock.patch('licenses.controllers.LICENSE_EXPORT_CHUNK_SIZE', 2):
+            rows = list(LicenseController.export(status = 'valid'))
+        self.assertEqual([row[5] for row in rows[1:]], ['A', 'B', 'C', 'D', 'E'])
+
+
+class LicenseSettingsTest(TestCase):
+
+    def test_etag_and_not_modified(self):
+        create_customer_licenses(location_count = 1)
+        license = CustomerLicense.objects.get(key = 'OLD')
+        client  = Client()
+        url     = reverse('licenses_settings')
+
+        response = client.get(url, {'id': license.id}, HTTP_X_REQUESTED_WITH = 'XMLHttpRequest')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['future']['key'], 'NEW')
+        etag = response['ETag']
+        self.assertEqual(client.get(url, {'id': license.id}, HTTP_X_REQUESTED_WITH = 'XMLHttpRequest', HTTP_IF_NONE_MATCH = etag).status_code, 304)
+
+        future     = CustomerLicense.objects.get(key = 'NEW')
+        future.key = 'NEWER'
+        future.save()
+        response   = client.get(url, {'id': license.id}, HTTP_X_REQUESTED_WITH = 'XMLHttpRequest', HTTP_IF_NONE_MATCH = etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['future']['key'], 'NEWER')
+
+
+class LicenseStatusSnapshotTest(TestCase):
+
+    def test_snapshot_replaced_per_day_and_history(self):
+        customer = create_customer_licenses(location_count = 1)
+        create_location_license(Location.objects.get(customer = customer), 'VALID', datetime(2030, 1, 1, tzinfo = timezone.utc))
+
+        self.assertEqual(LicenseController.take_status_snapshot(), 3)
+        self.assertEqual(LicenseController.take_status_snapshot(), 3)
+        self.assertEqual(LicenseStatusSnapshot.objects.count(), 3)
+
+        history = LicenseController.get_status_history()
+        self.assertEqual((len(history['dates']), history['valid'], history['replaced'], history['expired']), (1, [1], [1], [0]))
+        history = LicenseController.get_status_history(dimension = LicenseStatusSnapshot.CUSTOMER, object = customer.id)
+        self.assertEqual((history['valid'], history['replaced']), ([1], [1]))
+        self.assertEqual(LicenseController.get_status_history(since = 'abc')['dates'], [])
+
+
+class LicenseStatusCountTest(TestCase):
+
+    def assertCountsCurrent(self):
+        counts = dict(LicenseStatusCount.objects.values_list('status', 'count'))
+        self.assertEqual(counts, LicenseController.update_status_counts())
+
+    def test_changes_are_counted_without_recomputation(self):
+        customer = create_customer_licenses(location_count = 1)
+        location = Location.objects.get(customer = customer)
+        LicenseController.update_status_counts()
+
+        valid = create_location_license(location, 'VALID', datetime(2099, 1, 1, tzinfo = timezone.utc))
+        self.assertCountsCurrent()
+        future = create_location_license(location, 'FUTURE', datetime(2100, 1, 1, tzinfo = timezone.utc), replace_license = valid)
+        self.assertEqual(LicenseController.get_status_counts()['replaced'], 2)
+        self.assertCountsCurrent()
+
+        valid.end_date = datetime(2020, 6, 1, tzinfo = timezone.utc)
+        valid.save()
+        valid.delete()
+        self.assertEqual(LicenseController.get_status_counts()['valid'], 1)
+        self.assertCountsCurrent()
+        future.delete()
+
+        self.assertTrue(LicenseController.replace_with_future_license('OLD', 'NEW').status)
+        self.assertEqual(LicenseController.get_status_counts(), {'valid': 0, 'expiring': 0, 'expired': 1, 'replaced': 0})
+        self.assertCountsCurrent()
+
+
+class LicenseEventFlushTest(TestCase):
+
+    def test_failed_flush_keeps_events(self):
+        event = LicenseEvent(created = datetime.now(timezone.utc), action = LicenseEvent.CREATED, license = 1, key = 'KEY', end_date = datetime.now(timezone.utc))
+        LicenseEventController._buffer = [event]
+
+        with mock.patch.object(LicenseEvent.objects, 'bulk_create', side_effect = DatabaseError('broken')), \
+            self.assertLogs('licenses.controllers', level = 'ERROR'):
+            LicenseEventController.flush()
+        self.assertEqual(LicenseEventController._buffer, [event])
+
+        LicenseEventController.flush()
+        self.assertEqual(LicenseEventController._buffer, [])
+        self.assertEqual(LicenseEvent.objects.get().key, 'KEY')
+
+
+class ReplaceWithFutureLicenseTest(TestCase):
+
+    def setUp(self):
+        self.customer  = create_customer_licenses(location_count = 3)
+        self.locations = list(Location.objects.filter(customer = self.customer).values_list('id', flat = True))
+
+    def test_duplicate_acknowledgements_count_once(self):
+        for _ in range(3):
+            LicenseController.replace_with_future_license('OLD', 'NEW', self.locations[0])
+
+        self.assertEqual(CustomerLicense.objects.get(key = 'NEW').replace_count, 1)
+        self.assertEqual(ReplaceAcknowledgement.objects.count(), 1)
+        self.assertTrue(License.objects.filter(key = 'OLD').exists())
+
+    def test_replacement_after_all_locations(self):
+        for location in self.locations:
+            LicenseController.replace_with_future_license('OLD', 'NEW', location)
+
+        self.assertEqual(License.objects.count(), 1)
+        self.assertEqual(License.objects.get().key, 'NEW')
+        self.assertEqual(ReplaceAcknowledgement.objects.count(), 0)
+
+    def test_acknowledgements_without_location(self):
+        for _ in self.locations:
+            LicenseController.replace_with_future_license('OLD', 'NEW')
+
+        self.assertEqual(License.objects.get().key, 'NEW')
+
+
+class RolloverTest(TestCase):
+
+    def test_rollover_keeps_previous_key(self):
+        create_customer_licenses(location_count = 2)
+
+        self.assertEqual(LicenseController.rollover(), {'replaced': 1, 'failed': 0})
+        self.assertEqual(License.objects.get().key, 'NEW')
+        self.assertEqual(LicenseController.get_license_state('OLD')['key'], 'NEW')
+        self.assertTrue(LicenseController.replace_with_future_license('OLD', 'NEW').status)
+
+    def test_failing_batch_is_reported(self):
+        create_customer_licenses(location_count = 1)
+
+        with mock.patch.object(LicenseController, '_LicenseController__replace_license', side_effect = Exception('broken')), \
+            self.assertLogs('licenses.controllers', level = 'ERROR'):
+            self.assertEqual(LicenseController.rollover(), {'replaced': 0, 'failed': 1})
+            with self.assertRaises(CommandError):
+                call_command('rollover_licenses', stdout = io.StringIO())
+        self.assertEqual(License.objects.count(), 2)
+
+
+class ReconcileUsedProductsTest(TestCase):
+
+    def test_reconcile_creates_and_deletes(self):
+        customer = create_customer_licenses(location_count = 2)
+        location = Location.objects.filter(customer = customer).first()
+        product  = SoftwareProduct.objects.create(name = 'Alt', category = 'Kategorie', version = '0.1')
+        UsedSoftwareProduct.objects.create(location = location, product = product, version = '0.1')
+
+        self.assertTrue(UsedSoftwareProductController.reconcile(customer = customer.id).status)
+        self.assertEqual(
+            set(UsedSoftwareProduct.objects.values_list('location__customer', 'product__name')),
+            {(customer.id, 'Produkt')},
+        )
+        self.assertEqual(UsedSoftwareProduct.objects.count(), 2)
+
+    def test_reconcile_keeps_heartbeats_of_duplicates(self):
+        customer   = create_customer_licenses(location_count = 1)
+        location   = Location.objects.get(customer = customer)
+        product    = SoftwareProduct.objects.get()
+        kept       = UsedSoftwareProduct.objects.create(location = location, product = product, version = '1.0')
+        duplicate  = UsedSoftwareProduct.objects.create(location = location, product = product, version = '1.0')
+        Heartbeat.objects.create(used_product = kept, message = 'OLD', detail = '')
+        Heartbeat.objects.create(used_product = duplicate, message = 'OLD', detail = '')
+
+        self.assertTrue(UsedSoftwareProductController.reconcile(customer = customer.id).status)
+        self.assertEqual(list(UsedSoftwareProduct.objects.values_list('id', flat = True)), [kept.id])
+        self.assertEqual(Heartbeat.objects.filter(used_product = kept).count(), 2)
+
+
+class RenewTest(TestCase):
+
+    def test_renew_keeps_keys_with_their_licenses(self):
+        create_customer_licenses(location_count = 1)
+        CustomerLicense.objects.get(key = 'NEW').delete()
+        license = License.objects.get(key = 'OLD')
+
+        status = LicenseController.renew(ids = ['x', str(license.id)], keys = ['WRONG', 'RENEWED'], end_date = '2030-01-01')
+        self.assertTrue(status.status)
+        self.assertEqual(License.objects.get(replace_license = license).key, 'RENEWED')
+        self.assertFalse(License.objects.filter(key = 'WRONG').exists())
+
+    def test_invalid_expiry_filter_is_ignored(self):
+        create_customer_licenses(location_count = 1)
+        CustomerLicense.objects.get(key = 'NEW').delete()
+
+        licenses = LicenseController.get_licenses_to_renew(expires_from = 'abc', expires_to = '2021')
+        self.assertEqual([license['key'] for license in licenses], ['OLD'])
+
+
+class LicenseHeartbeatTest(TestCase):
+
+    def test_check_and_acknowledge_in_next_check(self):
+        customer = create_customer_licenses(location_count = 1)
+        location = Location.objects.get(customer = customer)
+        client   = Client()
+
+        result = client.post(reverse('licenses_heartbeat_v2'), {'key': 'OLD\n', 'location': location.id}).json()
+        self.assertEqual((result['found'], result['status'], result['key'], result['exist']), (True, 'expired', 'NEW', True))
+        self.assertTrue(result['ack'])
+        self.assertFalse(result['acknowledged'])
+
+        result = client.post(reverse('licenses_heartbeat_v2'), {'key': 'NEW', 'ack': result['ack'], 'location': location.id}).json()
+        self.assertTrue(result['acknowledged'])
+        self.assertEqual(License.objects.get().key, 'NEW')
+        self.assertEqual(License.objects.get().previous_key, 'OLD')
+
+    def test_forged_ack_is_ignored(self):
+        create_customer_licenses(location_count = 1)
+
+        result = LicenseController.check_license(key = 'NEW', ack = 'forged')
+        self.assertFalse(result['acknowledged'])
+        self.assertEqual(License.objects.count(), 2)
+        self.assertEqual(LicenseController.check_license(key = 'UNKNOWN')['found'], False)
+
+    def test_deleted_customer_key_is_invalid(self):
+        customer = create_customer_licenses(location_count = 1)
+        create_location_license(Location.objects.get(customer = customer), 'VALID', datetime(2099, 1, 1, tzinfo = timezone.utc))
+        self.assertEqual(LicenseController.check_license(key = 'VALID')['status'], 'valid')
+
+        self.assertTrue(CustomerController.delete(id = customer.id).status)
+        result = LicenseController.check_license(key = 'VALID')
+        self.assertEqual((result['found'], result['token']), (False, ''))
+        self.assertEqual(LicenseController.get_status_counts(), {'valid': 0, 'expiring': 0, 'expired': 0, 'replaced': 0})
+        self.assertEqual(LicenseController.get_license_page()['total'], 0)
+
+
+class LicenseStateCacheTest(TestCase):
+
+    def test_changed_key_invalidates_loaded_key(self):
+        create_customer_licenses(location_count = 1)
+        self.assertEqual(LicenseController.get_license_state('OLD')['key'], 'NEW')
+
+        license     = CustomerLicense.objects.get(key = 'OLD')
+        license.key = 'RENAMED'
+        with CaptureQueriesContext(connection) as queries:
+            license.save(update_fields = ['key'])
+        self.assertFalse([query for query in queries.captured_queries if query['sql'].startswith('SELECT')])
+        self.assertEqual(LicenseController.get_license_state('OLD'), {})
+        self.assertEqual(LicenseController.get_license_state('RENAMED')['key'], 'NEW')
+
+
+class LicenseTokenTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        customer = create_customer_licenses(location_count = 1)
+        create_location_license(Location.objects.get(customer = customer), 'VALID', datetime(2099, 1, 1, tzinfo = timezone.utc))
+
+    @staticmethod
+    def decode(data: str) -> bytes:
+        return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+    @skipIf(Ed25519PublicKey is None, 'cryptography is not installed')
+    def test_token_is_signed_with_published_key(self):
+        token                      = LicenseTokenController.issue(key = 'VALID')
+        header, payload, signature = token.split('.')
+        header                     = json.loads(self.decode(header))
+        public_key                 = {key['kid']: key for key in LicenseTokenController.get_public_keys()}[header['kid']]
+
+        self.assertEqual(header['alg'], LicenseSigningKey.EDDSA)
+        Ed25519PublicKey.from_public_bytes(base64.b64decode(public_key['public'])).verify(
+            self.decode(signature), (token.rsplit('.', 1)[0]).encode(),
+        )
+        self.assertEqual(json.loads(self.decode(payload))['key'], 'VALID')
+        self.assertEqual(LicenseTokenController.issue(key = 'OLD'), '')
+
+    def test_token_is_cached_until_rotation(self):
+        token = LicenseTokenController.issue(key = 'VALID')
+        with self.assertNumQueries(0):
+            self.assertEqual(LicenseTokenController.issue(key = 'VALID'), token)
+
+        old_key = LicenseTokenController.get_signing_key()
+        new_key = LicenseTokenController.rotate()
+        self.assertIsNotNone(LicenseSigningKey.objects.get(kid = old_key.kid).retired)
+        self.assertEqual([key['kid'] for key in LicenseTokenController.get_public_keys()], [new_key.kid, old_key.kid])
+        self.assertEqual(json.loads(self.decode(LicenseTokenController.issue(key = 'VALID').split('.')[0]))['kid'], new_key.kid)
+
+    def test_hmac_is_used_without_cryptography(self):
+        with mock.patch('licenses.controllers.Ed25519PrivateKey', None):
+            result = LicenseController.check_license(key = 'VALID')
+        header = json.loads(self.decode(result['token'].split('.')[0]))
+        self.assertEqual(header['alg'], LicenseSigningKey.HS256)
+        self.assertEqual(LicenseSigningKey.objects.get(kid = header['kid']).algorithm, LicenseSigningKey.HS256)
+
+    def test_eddsa_key_stays_active_without_cryptography(self):
+        eddsa = LicenseSigningKey.objects.create(kid = 'eddsa', algorithm = LicenseSigningKey.EDDSA, private = '', public = '')
+        with mock.patch('licenses.controllers.Ed25519PrivateKey', None), self.assertLogs('licenses.controllers', level = 'ERROR'):
+            result = LicenseController.check_license(key = 'VALID')
+        self.assertEqual((result['found'], result['token']), (True, ''))
+        self.assertEqual(list(LicenseSigningKey.objects.filter(retired__isnull = True).values_list('kid', flat = True)), [eddsa.kid])
+
+
+class ConcurrentReplaceWithFutureLicenseTest(TransactionTestCase):
+
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_concurrent_acknowledgements(self):
+        customer  = create_customer_licenses(location_count = 20)
+        locations = list(Location.objects.filter(customer = customer).values_list('id', flat = True))
+
+        def acknowledge(location: int):
+            try:
+                LicenseController.replace_with_future_license('OLD', 'NEW', location)
+            finally:
+                connection.close()
+
+        threads = [Thread(target = acknowledge, args = (location,)) for location in locations + locations]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(License.objects.count(), 1)
+        self.assertEqual(License.objects.get().key, 'NEW')
@@ -4,13 +4,24 @@ from . import views
 urlpatterns = [
     path('', views.index, name = 'index'),
     path('list/', views.licenses_list, name = 'licenses_list'),
+    path('list/data/', views.licenses_data, name = 'licenses_data'),
+    path('export/', views.export, name = 'licenses_export'),
     path('create/', views.create, name = 'licenses_create'),
     path('edit/<int:id>/', views.edit, name = 'licenses_edit'),
     path('<int:old_license_id>/create/', views.create_replace_license, name = 'licenses_create_replace'),
     path('<int:old_license_id>/edit/<int:id>', views.edit_replace_license, name = 'licenses_edit_replace'),
+    path('renew/', views.renew, name = 'licenses_renew'),
+    path('renew/save/', views.renew_save, name = 'licenses_renew_save'),
+    path('calendar/', views.calendar, name = 'licenses_calendar'),
+    path('calendar/buckets/', views.calendar_buckets, name = 'licenses_calendar_buckets'),
+    path('calendar/bucket/', views.calendar_bucket, name = 'licenses_calendar_bucket'),
     path('save/', views.save, name = 'licenses_save'),
     path('delete/<int:id>/', views.delete, name = 'licenses_delete'),
     path('settings/', views.settings, name = 'licenses_settings'),
+    path('events/', views.events, name = 'licenses_events'),
     path('license-heartbeat', views.license_heartbeat, name="licenses_heartbeat"),
     path('license-heartbeat/save', views.license_heartbeat_save, name="licenses_heartbeat_save"),
+    path('v2/license-heartbeat', views.license_heartbeat_v2, name="licenses_heartbeat_v2"),
+    path('v2/license-keys', views.license_token_keys, name="licenses_token_keys"),
+    path('v2/license-keys/rotate', views.license_token_keys_rotate, name="licenses_token_keys_rotate"),
 ]
@@ -1,16 +1,18 @@
 from django.shortcuts import render, redirect
 from django.core.handlers.wsgi import WSGIRequest
-from django.http import HttpResponse, HttpResponseRedirect, JsonResponse
+from django.http import HttpResponse, HttpResponseNotModified, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from datetime import datetime, timezone
 from rest_framework.decorators import api_view
 
-from customers.models import Location
 from heartbeat.controllers import HeartbeatController
 from heartbeat.models import Heartbeat
-from .controllers import LicenseController, SoftwareModuleController
+from .controllers import LicenseController, LicenseEventController, LicenseTokenController, SoftwareModuleController, SoftwareProductController
 from customers.controllers import CustomerController, LocationController
-from .models import LocationLicense, UsedSoftwareProduct, CustomerLicense, License
+from .models import UsedSoftwareProduct
+from management_portal.constants import LIMIT, LICENSE_COLUMNS, LICENSE_PAGE_LENGTH
+import csv
 import json
+import zlib
 
 
 def index(request: WSGIRequest) -> HttpResponseRedirect:
@@ -28,6 +30,7 @@ def index(request: WSGIRequest) -> HttpResponseRedirect:
 def licenses_list(request: WSGIRequest) -> HttpResponse:
     """
     When the license list is called. Renders the license list.
+    The licenses are loaded page by page from the license data.
 
     Parameters:
     request (WSGIRequest): url request of the user
@@ -38,10 +41,12 @@ def licenses_list(request: WSGIRequest) -> HttpResponse:
     status     = request.COOKIES.get('license_status_status')
     message    = request.COOKIES.get('license_status_message')
     heartbeats = HeartbeatController.read()
-    licenses   = LicenseController.read()
+    customers  = CustomerController.get_customer_names()
+    products   = SoftwareProductController.get_product_names()
     context    = {
         'heartbeats': heartbeats,
-        'licenses'  : licenses,
+        'customers' : customers,
+        'products'  : products,
         'status'    : status,
         'message'   : message,
     }
@@ -52,6 +57,108 @@ def licenses_list(request: WSGIRequest) -> HttpResponse:
 
     return response
 
+def licenses_data(request: WSGIRequest) -> JsonResponse:
+    """
+    When the license data is called as an ajax request by the data table of the license list.
+    Returns a filtered, sorted page of the licenses in the format of the DataTables server-side processing.
+    Additionally the licenses can be filtered by status, customer, product and expiry window.
+    By sending the cursor 'after' instead of 'start' the licenses are paged by keyset.
+
+    Parameters:
+    request (WSGIRequest): ajax request
+
+    Returns:
+    JsonResponse: page of licenses
+    """
+    response = JsonResponse({})
+    if request.is_ajax():
+        draw     = request.GET.get('draw', '0')
+        start    = request.GET.get('start', '0')
+        length   = request.GET.get('length', '')
+        order    = request.GET.get('order[0][column]', '')
+        customer = request.GET.get('customer', '')
+        product  = request.GET.get('product', '')
+
+        page     = LicenseController.get_license_page(
+            status       = request.GET.get('status', ''),
+            customer     = int(customer) if customer.isdigit() else 0,
+            product      = int(product) if product.isdigit() else 0,
+            expires_from = request.GET.get('expires_from', ''),
+            expires_to   = request.GET.get('expires_to', ''),
+            search       = request.GET.get('search[value]', ''),
+            order        = int(order) if order.isdigit() else LICENSE_COLUMNS.index('end_date'),
+            descending   = request.GET.get('order[0][dir]', '') == 'desc',
+            start        = int(start) if start.isdigit() else 0,
+            length       = min(int(length), LIMIT) if length.isdigit() and int(length) > 0 else LICENSE_PAGE_LENGTH,
+            after        = request.GET.get('after', ''),
+        )
+        response = JsonResponse({
+            'draw'           : int(draw) if draw.isdigit() else 0,
+            'recordsTotal'   : page['total'],
+            'recordsFiltered': page['filtered'],
+            'data'           : page['licenses'],
+            'next'           : page['next'],
+        })
+
+    return response
+
+class Echo:
+    """
+    Pseudo buffer which returns the written value instead of storing it, so the csv writer can be streamed.
+    """
+    def write(self, value: str) -> str:
+        return value
+
+def export(request: WSGIRequest) -> HttpResponse:
+    """
+    When the license export is called. Streams the current licenses as csv file, filtered like the license list.
+    With 'gzip=1' the file is compressed while streaming.
+
+    Parameters:
+    request (WSGIRequest): url request of the user
+
+    Returns:
+    HttpResponse: streamed csv file or redirect to login
+    """
+    if not request.user.is_authenticated:
+        return redirect('login')
+
+    customer = request.GET.get('customer', '')
+    product  = request.GET.get('product', '')
+    compress = request.GET.get('gzip', '') == '1'
+    writer   = csv.writer(Echo(), delimiter = ';')
+    rows     = LicenseController.export(
+        status       = request.GET.get('status', ''),
+        customer     = int(customer) if customer.isdigit() else 0,
+        product      = int(product) if product.isdigit() else 0,
+        expires_from = request.GET.get('expires_from', ''),
+        expires_to   = request.GET.get('expires_to', ''),
+        search       = request.GET.get('search', ''),
+    )
+
+    def stream():
+        yield '\ufeff'
+        for row in rows:
+            yield writer.writerow(row)
+
+    def stream_compressed():
+        compressor = zlib.compressobj(wbits = 31)
+        for line in stream():
+            chunk = compressor.compress(line.encode('utf-8'))
+            if chunk:
+                yield chunk
+        yield compressor.flush()
+
+    filename = 'lizenzen_' + datetime.now(timezone.utc).strftime('%Y-%m-%d') + '.csv'
+    if compress:
+        response = StreamingHttpResponse(stream_compressed(), content_type = 'application/gzip')
+        filename += '.gz'
+    else:
+        response = StreamingHttpResponse((line.encode('utf-8') for line in stream()), content_type = 'text/csv; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="' + filename + '"'
+
+    return response
+
 def create(request: WSGIRequest) -> HttpResponse:
     """
     When the license create is called. Renders the form to create a license.
@@ -156,6 +263,137 @@ def edit_replace_license(request: WSGIRequest, old_license_id: int = 0, id: int
     }
     return render(request, 'licenses/edit-replace.html', context)
 
+def renew(request: WSGIRequest) -> HttpResponse:
+    """
+    When the license renewal is called.
+    Renders the form to create future licenses for many licenses at once.
+    The licenses can be filtered by customer, product and expiry window.
+
+    Parameters:
+    request (WSGIRequest): url request of the user
+
+    Returns:
+    HttpResponse: form to renew licenses
+    """
+    customer     = request.GET.get('customer', '')
+    product      = request.GET.get('product', '')
+    expires_from = request.GET.get('expires_from', '')
+    expires_to   = request.GET.get('expires_to', '')
+
+    heartbeats = HeartbeatController.read()
+    licenses   = LicenseController.get_licenses_to_renew(
+        customer     = int(customer) if customer.isdigit() else 0,
+        product      = int(product) if product.isdigit() else 0,
+        expires_from = expires_from,
+        expires_to   = expires_to,
+    )
+    customers  = CustomerController.get_customer_names()
+    products   = SoftwareProductController.get_product_names()
+    context    = {
+        'title'       : 'Lizenzen verlängern',
+        'heartbeats'  : heartbeats,
+        'licenses'    : licenses,
+        'customers'   : customers,
+        'products'    : products,
+        'customer'    : customer,
+        'product'     : product,
+        'expires_from': expires_from,
+        'expires_to'  : expires_to,
+    }
+    return render(request, 'licenses/renew.html', context)
+
+def calendar(request: WSGIRequest) -> HttpResponse:
+    """
+    When the license calendar is called. Renders the timeline of expiring licenses.
+    The buckets and their licenses are loaded by ajax requests.
+
+    Parameters:
+    request (WSGIRequest): url request of the user
+
+    Returns:
+    HttpResponse: license calendar
+    """
+    heartbeats = HeartbeatController.read()
+    context    = {
+        'title'     : 'Lizenzkalender',
+        'heartbeats': heartbeats,
+    }
+    return render(request, 'licenses/calendar.html', context)
+
+def calendar_buckets(request: WSGIRequest) -> JsonResponse:
+    """
+    When the license calendar buckets are called as an ajax request.
+    Returns the amount of expiring licenses per week or month.
+
+    Parameters:
+    request (WSGIRequest): ajax request
+
+    Returns:
+    JsonResponse: buckets
+    """
+    response = JsonResponse({})
+    if request.is_ajax():
+        buckets  = LicenseController.get_expiry_calendar(
+            period       = request.GET.get('period', 'month'),
+            expires_from = request.GET.get('expires_from', ''),
+            expires_to   = request.GET.get('expires_to', ''),
+        )
+        response = JsonResponse({'buckets': buckets})
+
+    return response
+
+def calendar_bucket(request: WSGIRequest) -> JsonResponse:
+    """
+    When a license calendar bucket is called as an ajax request.
+    Returns the licenses expiring in the week or month.
+
+    Parameters:
+    request (WSGIRequest): ajax request
+
+    Returns:
+    JsonResponse: licenses of the bucket
+    """
+    response = JsonResponse({})
+    if request.is_ajax():
+        licenses = LicenseController.get_expiry_bucket(
+            start  = request.GET.get('start', ''),
+            period = request.GET.get('period', 'month'),
+        )
+        response = JsonResponse({'licenses': licenses})
+
+    return response
+
+def renew_save(request: WSGIRequest) -> JsonResponse:
+    """
+    When the license renewal save is called as an ajax request.
+    Creates the future licenses for all selected licenses and returns the status.
+
+    Parameters:
+    request (WSGIRequest): ajax save request
+
+    Returns:
+    JsonResponse: save status
+    """
+    response = JsonResponse({})
+    if request.is_ajax():
+        ids      = request.POST.getlist('ids[]')
+        keys     = request.POST.getlist('keys[]')
+        end_date = request.POST.get('end_date', '')
+        detail   = request.POST.get('detail', '')
+
+        status   = LicenseController.renew(
+            ids      = ids,
+            keys     = keys,
+            end_date = end_date,
+            detail   = detail,
+        )
+        response = JsonResponse(status.__dict__)
+        if status.status:
+            response.set_cookie('license_status_status' , status.status , 7)
+            response.set_cookie('license_status_message', status.message, 7)
+
+    return response
+
 def save(request: WSGIRequest) -> JsonResponse:
     """
     When the license save is called as an ajax request.
@@ -217,23 +455,55 @@ def delete(request: WSGIRequest, id: int = 0) -> HttpResponseRedirect:
 
     return response
 
-def settings(request: WSGIRequest) -> JsonResponse:
+def settings(request: WSGIRequest) -> HttpResponse:
     """
     When the license settings is called as an ajax request.
     Gets information about current and future license by current license id.
+    If the browser already has the current information it gets an empty response with status 304.
 
     Parameters:
     request (WSGIRequest): ajax request
 
     Returns:
-    JsonResponse: license information
+    HttpResponse: license information as JSON
     """
     response = JsonResponse({})
     if request.is_ajax():
-        id = request.POST.get('id', '')
+        id = request.GET.get('id', '')
+
+        settings = LicenseController.get_settings_response(id = int(id) if id.isdigit() else 0)
+        if request.headers.get('If-None-Match') == settings['etag']:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(settings['body'], content_type = 'application/json')
+        response['ETag']          = settings['etag']
+        response['Cache-Control'] = 'private, no-cache'
+
+    return response
+
+def events(request: WSGIRequest) -> JsonResponse:
+    """
+    When the license journal is called as an ajax request.
+    Returns the latest license changes, filtered by license, customer and time range.
 
-        licenses = LicenseController.get_settings_information(id = id)
-        response = JsonResponse(licenses)
+    Parameters:
+    request (WSGIRequest): ajax request
+
+    Returns:
+    JsonResponse: license events
+    """
+    response = JsonResponse({})
+    if request.is_ajax():
+        license  = request.GET.get('license', '')
+        customer = request.GET.get('customer', '')
+
+        events   = LicenseEventController.read(
+            license  = int(license) if license.isdigit() else 0,
+            customer = int(customer) if customer.isdigit() else 0,
+            since    = request.GET.get('since', ''),
+            until    = request.GET.get('until', ''),
+        )
+        response = JsonResponse({'events': events})
 
     return response
 
@@ -250,27 +520,42 @@ def license_heartbeat(request: WSGIRequest) -> JsonResponse:
     Returns:
     JsonResponse: new license key if needed
     """
-    key     = request.POST.get("key").replace('\n', '')
-    license = None
-
-    try:
-        license = License.objects.get(key = key)
-    except:
+    key   = request.POST.get("key").replace('\n', '')
+    state = LicenseController.get_license_state(key = key)
+    if not state:
         return JsonResponse({})
-    
-    current_date = datetime.now(timezone.utc)
-    context      = {
-        "key"    : '',
-        "exist"  : False,
+
+    context = {
+        "key"    : state['key'],
+        "exist"  : state['exist'],
     }
 
-    if license and (license.end_date < current_date):
-        try:
-            future_license    = License.objects.get(replace_license__key = license.key)
-            context['key']    = future_license.key
-            context['exist']  = True
-        except:
-            pass
+    return JsonResponse(context)
+
+@api_view(["POST"])
+def license_heartbeat_v2(request: WSGIRequest) -> JsonResponse:
+    """
+    This function should be triggered by a request from the customer's license script.
+    It checks if the license is (still) valid by given key and sends the status of it.
+    If a newer license is there it sends the key of it together with an acknowledgement token.
+    When the script sends this token with its next check, the newer license replaces the old one.
+    This way checking and replacing a license only needs one request a day.
+
+    Parameters:
+    request (WSGIRequest): post request from the license script
+
+    Returns:
+    JsonResponse: license status, new license key, acknowledgement token if needed and license token
+    """
+    key      = request.POST.get('key', '').replace('\n', '')
+    ack      = request.POST.get('ack', '').replace('\n', '')
+    location = request.POST.get('location', '').replace('\n', '')
+
+    context  = LicenseController.check_license(
+        key      = key,
+        ack      = ack,
+        location = int(location) if location.isdigit() else 0,
+    )
 
     return JsonResponse(context)
 
@@ -291,34 +576,49 @@ def license_heartbeat_save(request: WSGIRequest) -> JsonResponse:
     new_exists = request.POST.get('new_exists', '')
 
     if new_exists == "True":
-        new_key = request.POST.get('new', '').replace('\n', '')
-        old_key = request.POST.get('old', '').replace('\n', '')
-
-        try:
-            new_license                 = LocationLicense.objects.get(key = new_key)
-            old_license                 = LocationLicense.objects.get(key = old_key)
-            old_license.key             = new_license.key
-            old_license.detail          = new_license.detail
-            old_license.start_date      = new_license.start_date
-            old_license.end_date        = new_license.end_date
-            new_license.delete()
-            old_license.save()
-        except:
-            try:
-                new_license = CustomerLicense.objects.get(key = new_key)
-                new_license.replace_count += 1
-                total_count = len(Location.objects.filter(customer = new_license.customer))
-                if new_license.replace_count >= total_count:
-                    old_license                 = CustomerLicense.objects.get(key = old_key)
-                    old_license.key             = new_license.key
-                    old_license.detail          = new_license.detail
-                    old_license.start_date      = new_license.start_date
-                    old_license.end_date        = new_license.end_date
-                    new_license.delete()
-                    old_license.save()
-                else:
-                    new_license.save()
-            except:
-                pass
+        new_key  = request.POST.get('new', '').replace('\n', '')
+        old_key  = request.POST.get('old', '').replace('\n', '')
+        location = request.POST.get('location', '').replace('\n', '')
+
+        LicenseController.replace_with_future_license(
+            old_key  = old_key,
+            new_key  = new_key,
+            location = int(location) if location.isdigit() else 0,
+        )
 
     return JsonResponse({})
+
+@api_view(["GET"])
+def license_token_keys(request: WSGIRequest) -> JsonResponse:
+    """
+    This function should be triggered by a request from the customer's license script.
+    It sends the public keys the script verifies the license tokens with.
+
+    Parameters:
+    request (WSGIRequest): get request from the license script
+
+    Returns:
+    JsonResponse: key id, algorithm and public key of all keys
+    """
+    return JsonResponse({'keys': LicenseTokenController.get_public_keys()})
+
+def license_token_keys_rotate(request: WSGIRequest) -> JsonResponse:
+    """
+    When the key rotation is called as an ajax request by a staff user.
+    Creates a new key to sign license tokens with and retires the previous one.
+
+    Parameters:
+    request (WSGIRequest): ajax request
+
+    Returns:
+    JsonResponse: key id and algorithm of the new key
+    """
+    response = JsonResponse({})
+    if request.is_ajax() and request.method == 'POST' and request.user.is_staff:
+        signing_key = LicenseTokenController.rotate()
+        response    = JsonResponse({
+            'kid'      : signing_key.kid,
+            'algorithm': signing_key.algorithm,
+        })
+
+    return response
@@ -1,8 +1,36 @@
 from datetime import datetime, timezone, timedelta
 
-LIMIT                   = 1000
-DATE_TYPE               = '%Y/%m/%d'
-DATE_TYPE_JS            = '%Y-%m-%d'
-DATETIME_TYPE           = '%Y/%m/%d %H:%M:%S'
-HEARTBEAT_DURATION      = timedelta(days = 1, minutes = -45)
-LICENSE_EXPIRE_WARNING  = timedelta(weeks = 6)
+LIMIT                           = 1000
+DATE_TYPE                       = '%Y/%m/%d'
+DATE_TYPE_JS                    = '%Y-%m-%d'
+DATETIME_TYPE                   = '%Y/%m/%d %H:%M:%S'
+HEARTBEAT_DURATION              = timedelta(days = 1, minutes = -45)
+LICENSE_EXPIRE_WARNING          = timedelta(weeks = 6)
+LICENSE_KEY_BYTES               = 16
+LICENSE_ACK_SALT                = 'licenses.heartbeat.ack'
+LICENSE_HEARTBEAT_CACHE_TIMEOUT = timedelta(hours = 1)
+ROLLOVER_BATCH_SIZE             = 100
+LICENSE_CALENDAR_RANGE          = timedelta(days = 365)
+LICENSE_COLUMNS                 = ['', 'customer_name', 'location_name', 'module__product__name', 'module__name', 'key', 'start_date', 'end_date']
+LICENSE_PAGE_LENGTH             = 50
+LICENSE_CURSOR_SALT             = 'licenses.list.cursor'
+LICENSE_SETTINGS_CACHE_TIMEOUT  = timedelta(hours = 1)
+LICENSE_EVENT_BATCH_SIZE        = 100
+LICENSE_TOKEN_LIFETIME          = timedelta(days = 7)
+LICENSE_SIGNING_KID_CACHE_KEY   = 'license_signing_kid'
+LICENSE_HISTORY_RANGE           = timedelta(days = 90)
+LICENSE_EXPORT_CHUNK_SIZE       = 500
+CUSTOMER_INDEX_CACHE_KEY        = 'customers_for_each_letter'
+CUSTOMER_INDEX_CACHE_TIMEOUT    = timedelta(hours = 1)
+CUSTOMER_TREE_CACHE_TIMEOUT     = timedelta(hours = 1)
+CUSTOMER_IMPORT_COLUMNS         = ['customer_number', 'customer_name', 'location_name', 'location_email_address', 'location_phone_number', 'street', 'house_number', 'postcode', 'city', 'first_name', 'last_name', 'contact_email_address', 'contact_phone_number']
+CUSTOMER_IMPORT_BATCH_SIZE      = 500
+CUSTOMER_PURGE_BATCH_SIZE       = 500
+SEARCH_LIMIT                    = 100
+CONTACT_SEARCH_NGRAM_SIZE       = 2
+CONTACT_SEARCH_WORD_SIZE        = 3
+CUSTOMER_STATS_BATCH_SIZE       = 500
+POSTCODE_PREFIX_LENGTH          = 2
+POSTCODE_IMPORT_BATCH_SIZE      = 1000
+NEARBY_RADIUS                   = 50
+EARTH_RADIUS                    = 6371.0
@@ -1,3 +1,7 @@
+from contextlib import contextmanager
+from django.db.models import BooleanField, Func
+import threading
+
 class Status:
     """
     The class Status is there to check if any action was successful and which message should be sent.
@@ -51,3 +55,48 @@ class SaveStatus(Status):
     def __init__(self, status: bool = False, message: str = '', instances: dict = {}):
         super.__init__
         self.instances = instances
+
+
+class PurgeState:
+    """
+    The class PurgeState tells if deleted customers are purged in the current thread.
+    Receivers keeping caches, counts and revisions up to date skip the purged objects,
+    because everything belonging to a deleted customer is already hidden and excluded from them.
+    """
+    _local = threading.local()
+
+    @staticmethod
+    def is_purging() -> bool:
+        """
+        Returns if deleted customers are purged in the current thread.
+
+        Returns:
+        bool: if purging
+        """
+        return getattr(PurgeState._local, 'purging', False)
+
+    @staticmethod
+    @contextmanager
+    def purging():
+        """
+        Marks the current thread as purging deleted customers while the context is active.
+        """
+        PurgeState._local.purging = True
+        try:
+            yield
+        finally:
+            PurgeState._local.purging = False
+
+
+class Match(Func):
+    """
+    The class Match searches a column by its FULLTEXT index in boolean mode, e.g. Match(F('name'), Value('+"max"')).
+    It can be used as a filter and is only supported by MySQL.
+    """
+    output_field = BooleanField()
+
+    def as_sql(self, compiler, connection):
+        column, column_params = compiler.compile(self.source_expressions[0])
+        search, search_params = compiler.compile(self.source_expressions[1])
+
+        return 'MATCH (%s) AGAINST (%s IN BOOLEAN MODE)' % (column, search), column_params + search_params
@@ -6,6 +6,7 @@ urlpatterns = [
     path('admin/', admin.site.urls, name='admin'),
     path('', views.index, name='index'),
     path('home/', views.home, name='home'),
+    path('home/license-history/', views.license_history, name='home_license_history'),
     path('search/', views.search, name='search'),
     path('search-result/', views.search_result, name='search_result'),
     path('user/', include('user_management.urls'), name='user'),
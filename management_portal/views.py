@@ -35,9 +35,12 @@ def home(request: WSGIRequest) -> HttpResponse:
     HttpResponse: homepage
     """
     heartbeats       = HeartbeatController.read()
-    licenses         = LicenseController.read()
+    status_counts    = LicenseController.get_status_counts()
     heartbeats_count = HeartbeatController.get_counts(heartbeats)
-    licenses_count   = LicenseController.get_counts(licenses)
+    licenses_count   = {
+        'expired': status_counts['expired'],
+        'valid'  : status_counts['valid'] + status_counts['expiring'] + status_counts['replaced'],
+    }
     updates_count    = UpdateController.get_counts(heartbeats)
 
     context = {
@@ -48,6 +51,31 @@ def home(request: WSGIRequest) -> HttpResponse:
     }
     return render(request, 'home.html', context)
 
+def license_history(request: WSGIRequest) -> JsonResponse:
+    """
+    When the license history is called as an ajax request by the homepage.
+    Returns the daily amount of licenses per status of all licenses, a software product or a customer.
+
+    Parameters:
+    request (WSGIRequest): ajax request
+
+    Returns:
+    JsonResponse: days and amount of licenses per status and day
+    """
+    response = JsonResponse({})
+    if request.is_ajax():
+        object   = request.GET.get('object', '')
+
+        history  = LicenseController.get_status_history(
+            dimension = request.GET.get('dimension', 'total'),
+            object    = int(object) if object.isdigit() else 0,
+            since     = request.GET.get('since', ''),
+            until     = request.GET.get('until', ''),
+        )
+        response = JsonResponse(history)
+
+    return response
+
 def search(request: WSGIRequest) -> HttpResponse:
     """
     When the search is called. Renders the global search form.